@@ -0,0 +1,51 @@
+from fastapi import Depends, Request
+from ..services.container import ServiceContainer
+from ..services.ingestion_jobs import IngestionQueue
+from ..services.llm_service import LLMService
+from ..services.pdf_service import PDFService
+from ..services.search_service import SearchService
+from ..services.session_store import SessionStore
+
+
+async def get_services(request: Request) -> ServiceContainer:
+    """The application's service container
+
+    It is normally created by the lifespan. When the lifespan did not run
+    (e.g. a TestClient used outside a ``with`` block) it is created on
+    first use. Dependencies are async so that happens on the event loop,
+    never concurrently.
+    """
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        services = request.app.state.services = ServiceContainer()
+    return services
+
+
+async def get_pdf_service(
+    services: ServiceContainer = Depends(get_services),
+) -> PDFService:
+    return services.pdf_service
+
+
+async def get_llm_service(
+    services: ServiceContainer = Depends(get_services),
+) -> LLMService:
+    return services.llm_service
+
+
+async def get_search_service(
+    services: ServiceContainer = Depends(get_services),
+) -> SearchService:
+    return services.search_service
+
+
+async def get_ingestion_queue(
+    services: ServiceContainer = Depends(get_services),
+) -> IngestionQueue:
+    return services.ingestion_queue
+
+
+async def get_session_store(
+    services: ServiceContainer = Depends(get_services),
+) -> SessionStore:
+    return services.session_store
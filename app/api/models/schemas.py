@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Literal, Optional, Union
 from datetime import datetime
 
 
@@ -12,14 +12,116 @@ class PDFResponse(BaseModel):
     message: str = "PDF uploaded successfully"
 
 
+class PDFJobResponse(BaseModel):
+    pdf_id: str
+    job_id: str
+    filename: str
+    size: int
+    status: str = "queued"
+    message: str = "PDF accepted for processing"
+
+
+class PDFStatusResponse(BaseModel):
+    pdf_id: str
+    status: str = Field(
+        ..., description="One of queued, extracting, indexing, ready or failed"
+    )
+    error: Optional[str] = None
+    timings: Dict[str, float] = Field(
+        default_factory=dict, description="Seconds spent in each completed stage"
+    )
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class PDFDeleteResponse(BaseModel):
+    pdf_id: str
+    references_remaining: int
+    message: str = "PDF deleted successfully"
+
+
 class ChatRequest(BaseModel):
     message: str = Field(..., description="The message to ask about the PDF content")
+    retrieval_method: Optional[Literal["bm25", "dense"]] = Field(
+        None,
+        description="How to pick document excerpts; defaults to the server setting",
+    )
+    session_id: Optional[str] = Field(
+        None,
+        description="Conversation session to answer in and record the turn to",
+    )
 
 
 class ChatResponse(BaseModel):
     response: str
+    session_id: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
+class ChatSessionResponse(BaseModel):
+    session_id: str
+    pdf_id: str
+    turns: int = Field(..., description="Recent turns kept verbatim")
+    compactions: int = Field(
+        ..., description="Times older turns were folded into the summary"
+    )
+    history_tokens: int
+    summary_tokens: int
+    created_at: datetime
+    updated_at: datetime
+
+
+class BatchChatRequest(BaseModel):
+    messages: List[str] = Field(
+        ..., min_length=1, description="Questions to ask about the PDF content"
+    )
+    retrieval_method: Optional[Literal["bm25", "dense"]] = Field(
+        None,
+        description="How to pick document excerpts; defaults to the server setting",
+    )
+    stream: bool = Field(
+        False,
+        description="Send each answer as a server-sent event as soon as it is ready",
+    )
+
+
+class BatchChatResult(BaseModel):
+    index: int = Field(..., description="Position of the question in the request")
+    message: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+
+
+class BatchChatResponse(BaseModel):
+    pdf_id: str
+    results: List[BatchChatResult]
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1, description="The text to search for")
+    pdf_ids: Union[List[str], Literal["all"]] = Field(
+        "all", description='PDF ids to search, or "all" for the whole corpus'
+    )
+    top_k: int = Field(5, ge=1, le=100)
+    method: Optional[Literal["bm25", "dense"]] = Field(
+        None, description="Retrieval method; defaults to the server setting"
+    )
+
+
+class SearchResult(BaseModel):
+    pdf_id: str
+    chunk_id: int
+    score: float
+    text: str
+
+
+class SearchResponse(BaseModel):
+    query: str
+    documents_searched: int
+    results: List[SearchResult]
+
+
 class ErrorResponse(BaseModel):
     detail: str
@@ -2,9 +2,13 @@
 from fastapi import APIRouter
 from .pdf import router as pdf_router
 from .chat import router as chat_router
+from .search import router as search_router
+from .metrics import router as metrics_router
 
 router = APIRouter()
 
 # Include routers without api_v1 prefix (that's added in main.py)
 router.include_router(pdf_router)
 router.include_router(chat_router)
+router.include_router(search_router)
+router.include_router(metrics_router)
@@ -1,9 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from ..models.schemas import ChatRequest, ChatResponse
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from ..dependencies import get_llm_service, get_pdf_service, get_session_store
+from ..models.schemas import (
+    BatchChatRequest,
+    BatchChatResponse,
+    BatchChatResult,
+    ChatRequest,
+    ChatResponse,
+    ChatSessionResponse,
+)
+from ...core.config import get_settings
 from ...services.llm_service import LLMService
+from ...services.pdf_service import PDFService
+from ...services.session_store import SessionStore
 from ...core.logging import setup_logging
+from ...utils.chunking import estimate_tokens
 
 router = APIRouter()
+settings = get_settings()
 logger = setup_logging()
 
 
@@ -11,17 +29,263 @@ logger = setup_logging()
 async def chat_with_pdf(
     pdf_id: str,
     request: ChatRequest,
-    llm_service: LLMService = Depends(lambda: LLMService()),
+    llm_service: LLMService = Depends(get_llm_service),
 ):
     """
     Chat with a specific PDF document
     """
     try:
-        response = await llm_service.generate_response(pdf_id, request.message)
-        return ChatResponse(response=response)
+        session = _get_session(llm_service, pdf_id, request)
+        response = await llm_service.generate_response(
+            pdf_id, request.message, request.retrieval_method, session=session
+        )
+        return ChatResponse(response=response, session_id=request.session_id)
     except HTTPException as e:
         logger.error(f"HTTP error in chat endpoint: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/chat/{pdf_id}/stream")
+async def stream_chat_with_pdf(
+    pdf_id: str,
+    request: ChatRequest,
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+):
+    """
+    Chat with a specific PDF document, streaming the answer as server-sent
+    events: ``start``, then one ``token`` event per generated piece of
+    text, then ``done`` with timings and token counts (or ``error``)
+    """
+    started = time.perf_counter()
+    try:
+        # Fail with a normal HTTP error before any of the stream is sent
+        session = _get_session(llm_service, pdf_id, request)
+        tokens, details = await llm_service.open_answer_stream(
+            pdf_id, request.message, request.retrieval_method, session
+        )
+    except HTTPException as e:
+        logger.error(f"HTTP error in chat stream endpoint: {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        _chat_events(tokens, details, http_request, started),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _get_session(llm_service: LLMService, pdf_id: str, request: ChatRequest):
+    if request.session_id is None:
+        return None
+    return llm_service.session_store.get(request.session_id, pdf_id)
+
+
+@router.post("/chat/{pdf_id}/sessions", response_model=ChatSessionResponse)
+async def create_chat_session(
+    pdf_id: str,
+    pdf_service: PDFService = Depends(get_pdf_service),
+    session_store: SessionStore = Depends(get_session_store),
+):
+    """
+    Start a conversation about a specific PDF document
+
+    Pass the returned ``session_id`` with chat requests to ask follow-up
+    questions. Recent turns are kept verbatim and older ones are folded
+    into a running summary, so prompts stay the same size as it grows.
+    """
+    if not pdf_service.pdf_exists(pdf_id):
+        raise HTTPException(status_code=404, detail="PDF not found")
+    return session_store.create(pdf_id).to_dict()
+
+
+@router.get("/chat/sessions/{session_id}", response_model=ChatSessionResponse)
+async def get_chat_session(
+    session_id: str, session_store: SessionStore = Depends(get_session_store)
+):
+    """
+    Size and age of a conversation session
+    """
+    return session_store.get(session_id).to_dict()
+
+
+@router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(
+    session_id: str, session_store: SessionStore = Depends(get_session_store)
+):
+    """
+    End a conversation session, discarding its history
+    """
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return {"session_id": session_id, "message": "Chat session deleted"}
+
+
+@router.post("/chat/{pdf_id}/batch", response_model=BatchChatResponse)
+async def batch_chat_with_pdf(
+    pdf_id: str,
+    request: BatchChatRequest,
+    http_request: Request,
+    llm_service: LLMService = Depends(get_llm_service),
+):
+    """
+    Ask several questions about a specific PDF document in one request
+
+    The document is loaded once and the questions are answered concurrently
+    (up to BATCH_MAX_CONCURRENCY at a time). Results come back in question
+    order, or with ``stream`` set, as one ``result`` server-sent event per
+    question in completion order followed by ``done``. A failed question
+    gets an ``error`` in its result instead of failing the whole batch.
+    """
+    if len(request.messages) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.BATCH_MAX_QUESTIONS} questions per batch",
+        )
+    started = time.perf_counter()
+    try:
+        # Fail with a normal HTTP error (e.g. an unknown PDF) before answering
+        document = await llm_service.load_document(pdf_id, request.retrieval_method)
+    except HTTPException as e:
+        logger.error(f"HTTP error in batch chat endpoint: {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch chat endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    results = _batch_results(llm_service, pdf_id, request, document)
+    if request.stream:
+        return StreamingResponse(
+            _batch_events(results, http_request, started),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    ordered = sorted([result async for result in results], key=lambda r: r.index)
+    logger.info(
+        f"Answered batch of {len(ordered)} questions in "
+        f"{(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+    return BatchChatResponse(pdf_id=pdf_id, results=ordered)
+
+
+async def _batch_results(
+    llm_service: LLMService, pdf_id: str, request: BatchChatRequest, document: dict
+) -> AsyncIterator[BatchChatResult]:
+    answers = llm_service.answer_batch(
+        pdf_id, request.messages, request.retrieval_method, document
+    )
+    try:
+        async for index, result in answers:
+            yield BatchChatResult(
+                index=index, message=request.messages[index], **result
+            )
+    finally:
+        await answers.aclose()
+
+
+async def _batch_events(
+    results: AsyncIterator[BatchChatResult], http_request: Request, started: float
+) -> AsyncIterator[str]:
+    yield _sse("start", {})
+
+    succeeded = failed = 0
+    try:
+        async for result in results:
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling batch chat")
+                return
+            if result.error is None:
+                succeeded += 1
+            else:
+                failed += 1
+            yield _sse("result", result.model_dump())
+    finally:
+        # Cancels the questions still being answered
+        await results.aclose()
+
+    total_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Streamed batch of {succeeded + failed} answers in {total_ms:.0f}ms")
+    yield _sse(
+        "done",
+        {"total_ms": round(total_ms, 1), "succeeded": succeeded, "failed": failed},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _wait_for_disconnect(http_request: Request):
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(settings.STREAM_DISCONNECT_POLL_INTERVAL)
+
+
+async def _close_stream(tokens: AsyncIterator[str], pending: Optional[asyncio.Task]):
+    """Stop a pending read, then close the stream and so its upstream call"""
+    if pending is not None and not pending.done():
+        pending.cancel()
+        await asyncio.wait({pending})
+    await tokens.aclose()
+
+
+async def _chat_events(
+    tokens: AsyncIterator[str], details: dict, http_request: Request, started: float
+) -> AsyncIterator[str]:
+    # Flush the headers right away so clients see the stream open
+    yield _sse("start", {})
+
+    first_token_at = None
+    parts = []
+    # A side task notices a client that leaves while no token is coming, so
+    # a slow upstream call does not keep its call pool slot
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(http_request))
+    next_text = None
+    try:
+        while True:
+            next_text = asyncio.ensure_future(tokens.__anext__())
+            await asyncio.wait(
+                {next_text, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not next_text.done():
+                logger.info("Client disconnected, cancelling chat stream")
+                return
+            try:
+                text = next_text.result()
+            except StopAsyncIteration:
+                break
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        logger.error(f"Error streaming chat response: {str(e)}")
+        yield _sse("error", {"detail": "Error generating response"})
+        return
+    finally:
+        disconnected.cancel()
+        # Shielded so the upstream is released even if this is cancelled
+        await asyncio.shield(asyncio.ensure_future(_close_stream(tokens, next_text)))
+
+    finished = time.perf_counter()
+    ttfb_ms = ((first_token_at or finished) - started) * 1000
+    total_ms = (finished - started) * 1000
+    logger.info(
+        f"Streamed chat response: first token {ttfb_ms:.0f}ms, total {total_ms:.0f}ms"
+    )
+    yield _sse(
+        "done",
+        {
+            "time_to_first_token_ms": round(ttfb_ms, 1),
+            "total_ms": round(total_ms, 1),
+            # Approximate counts, about 4 characters per token
+            "completion_tokens": estimate_tokens("".join(parts)),
+            **details,
+        },
+    )
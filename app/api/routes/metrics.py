@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from ..dependencies import get_services
+from ...core.security import verify_api_key
+from ...services.container import ServiceContainer
+
+router = APIRouter()
+
+
+@router.get("/metrics", dependencies=[Depends(verify_api_key)])
+async def get_metrics(services: ServiceContainer = Depends(get_services)):
+    """Cache hit rates and model call counters of this worker"""
+    return services.get_metrics()
@@ -1,5 +1,13 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from ..models.schemas import PDFResponse
+from typing import Union
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Response
+from ..models.schemas import (
+    PDFResponse,
+    PDFJobResponse,
+    PDFStatusResponse,
+    PDFDeleteResponse,
+)
+from ..dependencies import get_ingestion_queue, get_pdf_service
+from ...services.ingestion_jobs import IngestionQueue
 from ...services.pdf_service import PDFService
 from ...core.security import verify_api_key, check_rate_limit
 from ...core.logging import setup_logging
@@ -10,20 +18,77 @@ logger = setup_logging()
 
 @router.post(
     "/pdf",
-    response_model=PDFResponse,
+    response_model=Union[PDFResponse, PDFJobResponse],
     dependencies=[Depends(verify_api_key), Depends(check_rate_limit)],
 )
 async def upload_pdf(
+    response: Response,
     file: UploadFile = File(...),
-    pdf_service: PDFService = Depends(lambda: PDFService()),
+    async_mode: bool = Query(
+        False, description="Return 202 right after upload and process in background"
+    ),
+    pdf_service: PDFService = Depends(get_pdf_service),
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue),
 ):
     """Upload a PDF file"""
     try:
-        pdf_info = await pdf_service.save_pdf(file)
-        return PDFResponse(**pdf_info)
+        if not async_mode:
+            pdf_info = await pdf_service.save_pdf(file)
+            return PDFResponse(**pdf_info)
+
+        upload, needs_ingestion = await pdf_service.receive_pdf(file)
+        if not needs_ingestion:
+            return PDFResponse(**upload)
+
+        await ingestion_queue.submit(
+            upload["pdf_id"],
+            upload["filename"],
+            lambda job: pdf_service.ingest_pdf(upload, on_stage=job.set_stage),
+        )
+        response.status_code = 202
+        return PDFJobResponse(job_id=upload["pdf_id"], **upload)
     except HTTPException as e:
         logger.error(f"HTTP error during PDF upload: {e.status_code}: {e.detail}")
         raise
     except Exception as e:
         logger.error(f"Unexpected error during PDF upload: {str(e)}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
+
+
+@router.get(
+    "/pdf/{pdf_id}/status",
+    response_model=PDFStatusResponse,
+    dependencies=[Depends(verify_api_key)],
+)
+async def get_pdf_status(
+    pdf_id: str,
+    pdf_service: PDFService = Depends(get_pdf_service),
+    ingestion_queue: IngestionQueue = Depends(get_ingestion_queue),
+):
+    """Get the processing status of an uploaded PDF"""
+    job = ingestion_queue.get(pdf_id)
+    if job is not None:
+        return PDFStatusResponse(**job.to_dict())
+    if pdf_service.pdf_exists(pdf_id):
+        return PDFStatusResponse(pdf_id=pdf_id, status="ready")
+    raise HTTPException(status_code=404, detail="PDF not found")
+
+
+@router.delete(
+    "/pdf/{pdf_id}",
+    response_model=PDFDeleteResponse,
+    dependencies=[Depends(verify_api_key), Depends(check_rate_limit)],
+)
+async def delete_pdf(
+    pdf_id: str,
+    pdf_service: PDFService = Depends(get_pdf_service),
+):
+    """Delete an uploaded PDF"""
+    try:
+        return PDFDeleteResponse(**pdf_service.delete_pdf(pdf_id))
+    except HTTPException as e:
+        logger.error(f"HTTP error during PDF delete: {e.status_code}: {e.detail}")
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error during PDF delete: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred")
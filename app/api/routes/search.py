@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..dependencies import get_search_service
+from ..models.schemas import SearchRequest, SearchResponse
+from ...services.search_service import SearchService
+from ...core.security import verify_api_key, check_rate_limit
+from ...core.logging import setup_logging
+
+router = APIRouter()
+logger = setup_logging()
+
+
+@router.post(
+    "/search",
+    response_model=SearchResponse,
+    dependencies=[Depends(verify_api_key), Depends(check_rate_limit)],
+)
+async def search_documents(
+    request: SearchRequest,
+    search_service: SearchService = Depends(get_search_service),
+):
+    """Search for relevant chunks across one, several or all PDFs"""
+    try:
+        results = await search_service.search(
+            request.query, request.pdf_ids, request.top_k, request.method
+        )
+        return SearchResponse(**results)
+    except HTTPException as e:
+        logger.error(f"HTTP error in search endpoint: {e.status_code}: {e.detail}")
+        raise
+    except Exception as e:
+        logger.error(f"Error in search endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail="An unexpected error occurred")
@@ -3,6 +3,7 @@ import secrets
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 
@@ -15,20 +16,76 @@ class Settings(BaseSettings):
 
     # Gemini API
     GEMINI_API_KEY: str
+    GEMINI_SERVICE_ACCOUNT_FILE: str = "service_account.json"
+    GEMINI_API_URL: str = (
+        "https://generativelanguage.googleapis.com/v1beta/models/"
+        "gemini-1.5-flash-latest:generateContent"
+    )
+    OAUTH_REFRESH_MARGIN: float = 300.0  # Refresh tokens this long before expiry
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # Seconds an idle connection is kept
+    HTTP_TIMEOUT: float = 60.0
 
     # PDF Settings
     API_KEY: str = secrets.token_urlsafe(32)  # Default only if not set in .env
     MAX_PDF_SIZE: int = 10 * 1024 * 1024  # 10MB
     UPLOAD_DIR: str = "uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes read per upload chunk
+
+    # PDF Extraction Settings
+    PDF_EXTRACTION_WORKERS: int = 0  # 0 means one worker process per CPU
+    PDF_EXTRACTION_TIMEOUT: float = 120.0  # Seconds allowed per extraction job
+    PDF_EXTRACTION_MAX_QUEUED: int = 32  # Jobs (a ranged PDF counts once) before 503
+
+    # Background Ingestion Settings
+    INGESTION_WORKERS: int = 2  # PDFs extracted and indexed concurrently
+    INGESTION_MAX_QUEUED: int = 100  # Waiting jobs before uploads get 503
+    INGESTION_JOB_HISTORY: int = 1000  # Job statuses kept in memory
 
     # LLM Settings
+    LLM_BACKEND: str = "gemini"  # "gemini" or "fake" (local, for load tests)
+    LLM_MODEL: str = "gemini-pro"
     MAX_INPUT_LENGTH: int = 4096
     MAX_OUTPUT_LENGTH: int = 8196
+    LLM_MAX_CONCURRENT: int = 8  # Model calls in flight at once
+    LLM_MAX_WAITING: int = 32  # Calls waiting for a slot before 503
+    LLM_QUEUE_TIMEOUT: float = 10.0  # Seconds a call may wait for a slot
+    LLM_TIMEOUT: float = 60.0  # Seconds allowed per model call
+    LLM_ATTEMPT_TIMEOUT: float = 30.0  # Deadline per attempt (first token for streams)
+    LLM_MAX_RETRIES: int = 2  # Extra attempts after a retryable failure
+    LLM_RETRY_BACKOFF: float = 0.5  # Seconds, doubled per retry, fully jittered
+    LLM_RETRY_BACKOFF_MAX: float = 8.0
+    LLM_ABANDONED_WAIT: float = 2.0  # Seconds a retry waits for timed-out calls
+    LLM_HEDGE_ENABLED: bool = False  # Send a second request for slow calls
+    LLM_HEDGE_PERCENTILE: float = 95.0  # Latency percentile that triggers a hedge
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Calls observed before hedging starts
+    LLM_LATENCY_WINDOW: int = 200  # Recent calls the latency percentiles cover
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failures that open it
+    LLM_BREAKER_RESET_TIMEOUT: float = 30.0  # Seconds open before a trial call
+
+    # Fake LLM Backend Settings
+    FAKE_LLM_LATENCY_MS: float = 200.0  # Typical time to first token
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = "lognormal"  # "fixed", "uniform", "lognormal"
+    FAKE_LLM_LATENCY_SPREAD: float = 0.5  # uniform: +/- fraction; lognormal: sigma
+    FAKE_LLM_TOKENS_PER_SECOND: float = 50.0  # 0 streams the answer instantly
+    FAKE_LLM_RESPONSE_TOKENS: int = 64
+    FAKE_LLM_ERROR_RATE: float = 0.0  # Fraction of calls that fail
+    FAKE_LLM_SEED: Optional[int] = None
+
+    # Chat Context Settings
+    CONTEXT_MAX_TOKENS: int = 3000  # Budget for document text in a chat prompt
+    CONTEXT_CANDIDATE_CHUNKS: int = 24  # Chunks retrieved before packing
+    FULL_DOCUMENT_MAX_TOKENS: int = 1000  # Smaller documents are sent whole
+    BATCH_MAX_QUESTIONS: int = 100  # Questions per batch chat request
+    BATCH_MAX_CONCURRENCY: int = 8  # Questions of one batch answered at once
+    STREAM_DISCONNECT_POLL_INTERVAL: float = 0.5  # Seconds between client checks
 
     # Storage Settings
-    STORAGE_TYPE: str = "local"
+    STORAGE_TYPE: str = "local"  # "local" (compressed binary) or "json"
     USE_ASYNC_IO: bool = True
     COMPRESSION_ENABLED: bool = True
+    COMPRESSION_CODEC: str = "zstd"  # "zstd" (falls back to zlib) or "zlib"
 
     # Security Settings
     ALLOWED_HOSTS: list = ["*"]
@@ -37,12 +94,50 @@ class Settings(BaseSettings):
     MAX_CONCURRENT_REQUESTS: int = 100
 
     MAX_CHUNKS_PER_REQUEST: int = 10
+    # Deprecated and unused: CHUNK_MAX_TOKENS sets the chunk size. Kept so
+    # existing .env files that set it still load.
     EMBEDDING_CHUNK_SIZE: int = 500
 
+    # Chunking Settings (token counts are approximate, about 4 characters each)
+    CHUNK_MAX_TOKENS: int = 128
+    CHUNK_OVERLAP_TOKENS: int = 16
+    CHUNK_SNAP_TO_SENTENCE: bool = True
+
+    # Retrieval Settings
+    RETRIEVAL_METHOD: str = "bm25"  # "bm25" or "dense"
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    EMBEDDING_DIM: int = 1024  # Hashed vector buckets for dense retrieval
+    INDEX_DIR: str = "data/index"  # Memory-mapped chunk text and vectors
+    SEARCH_MAX_CONCURRENCY: int = 16  # Threads a request's documents are split over
+    SEARCH_MAX_DOCUMENTS: int = 5000  # Most documents one search may scan
+
+    # Corpus ANN Index Settings
+    ANN_ENABLED: bool = True
+    ANN_NLIST: int = 256  # k-means lists the corpus vectors are clustered into
+    ANN_NPROBE: int = 8  # Lists scanned per query; higher is slower but more exact
+    ANN_MIN_POINTS_PER_LIST: int = 39  # Vectors per list needed before training
+    ANN_KMEANS_ITERATIONS: int = 10
+    ANN_DIR: str = "data/ann"  # Memory-mapped trained lists shared by workers
+    ANN_REFRESH_INTERVAL: float = 5.0  # Seconds between background syncs
+
     # Performance Settings
     CHUNK_SIZE: int = 1000
     MAX_CHUNKS_PER_REQUEST: int = 10
-    CACHE_TTL: int = 3600
+    CACHE_TTL: int = 3600  # Seconds a cached document stays resident
+    CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # Heap budget for cached documents
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Memory tier for chat answers
+    ANSWER_CACHE_DIR: str = ""  # Disk tier for chat answers; empty disables it
+    CONTEXT_CACHE_ENABLED: bool = False  # Register document context with the provider
+    CONTEXT_CACHE_MIN_TOKENS: int = 4096  # Provider minimum for cached content
+    CONTEXT_CACHE_MAX_TOKENS: int = 100_000  # Larger documents use retrieved chunks
+    CONTEXT_CACHE_MAX_ENTRIES: int = 256
+    CONTEXT_CACHE_TTL_MARGIN: int = 60  # Stop using a cached context this early
+    SESSION_TTL: int = 3600  # Seconds an idle chat session is kept
+    SESSION_MAX_BYTES: int = 16 * 1024 * 1024  # Memory for chat session history
+    SESSION_HISTORY_MAX_TOKENS: int = 1000  # Recent turns kept verbatim
+    SESSION_SUMMARY_MAX_TOKENS: int = 250  # Running summary of older turns
 
     # Configuration for .env support
     class Config:
@@ -1,18 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import get_settings, create_necessary_directories
 from .core.logging import setup_logging
 from .api.routes import router
+from .middleware.upload_limit import MULTIPART_OVERHEAD, UploadSizeLimitMiddleware
+from .services.container import ServiceContainer
+from .services.pdf_service import FILE_TOO_LARGE_DETAIL
 
 # Initialize settings and logger
 settings = get_settings()
 logger = setup_logging()
 
+
+# Create directories and shared services on startup, release them on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_necessary_directories()
+    app.state.services = ServiceContainer()
+    logger.info("Application startup completed")
+    yield
+    await app.state.services.shutdown()
+    app.state.services = None
+    logger.info("Application shutdown completed")
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url=f"{settings.API_V1_STR}/docs",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -24,17 +42,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads before they are buffered
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_size=settings.MAX_PDF_SIZE + MULTIPART_OVERHEAD,
+    detail=FILE_TOO_LARGE_DETAIL,
+)
+
 # Include routers
 app.include_router(router, prefix=settings.API_V1_STR)
 
 
-# Create necessary directories on startup
-@app.on_event("startup")
-async def startup_event():
-    create_necessary_directories()
-    logger.info("Application startup completed")
-
-
 # Root endpoint
 @app.get("/")
 async def root():
@@ -0,0 +1,70 @@
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Room for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects request bodies over ``max_body_size`` while they stream in
+
+    Starlette parses a multipart upload in full, spooling it to a temp file,
+    before the endpoint sees it, so a size check in the endpoint comes after
+    the whole body was received. Here an oversized Content-Length is refused
+    before anything is read, and the body is counted as it arrives so a
+    request without (or lying about) Content-Length is cut off at the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, detail: str):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.detail = detail
+
+    def _response(self) -> JSONResponse:
+        return JSONResponse({"detail": self.detail}, status_code=400)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and int(content_length) > self.max_body_size:
+            await self._response()(scope, receive, send)
+            return
+
+        received = 0
+        rejected = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    rejected = True
+                    if not response_started:
+                        await self._response()(scope, receive, send)
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message):
+            nonlocal response_started
+            if rejected:
+                # The 400 has been sent; drop whatever the app answers
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # The app may report the aborted body as an error of its own
+            if not rejected:
+                raise
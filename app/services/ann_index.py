@@ -0,0 +1,760 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+from .chunk_store import ChunkStore
+from .vectorizer import idf_weights, l2_normalize, top_k
+
+try:
+    import fcntl
+except ImportError:  # No cross-process training lock without fcntl
+    fcntl = None
+
+settings = get_settings()
+logger = setup_logging()
+
+# Keys pack (document number, chunk id) into one int64
+CHUNK_BITS = 32
+# Rows re-weighted at a time, bounding the temporary copies made
+BLOCK_ROWS = 4096
+
+
+class _VectorList:
+    """Growable float32 matrix with an int64 key per row"""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.keys = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, vectors: np.ndarray, keys: np.ndarray):
+        needed = self.size + len(vectors)
+        if needed > len(self.keys):
+            capacity = max(needed, 2 * len(self.keys))
+            self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+            self.keys = np.resize(self.keys, capacity)
+        self.vectors[self.size : needed] = vectors
+        self.keys[self.size : needed] = keys
+        self.size = needed
+
+    def remove(self, doc_nums: np.ndarray):
+        keep = ~np.isin(self.keys[: self.size] >> CHUNK_BITS, doc_nums)
+        kept = int(keep.sum())
+        self.vectors[:kept] = self.vectors[: self.size][keep]
+        self.keys[:kept] = self.keys[: self.size][keep]
+        self.size = kept
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.vectors[: self.size], self.keys[: self.size]
+
+
+class _Snapshot:
+    """The trained lists, read-only and memory-mapped when loaded from disk
+
+    Layout of ``{snapshot_dir}/{generation}/``::
+
+        manifest.json  generation, and the number and row count of each doc_id
+        centroids.npy  float32 list centroids
+        idf.npy        float32 corpus IDF the vectors are weighted with
+        offsets.npy    int64 first row of each list, plus the end
+        vectors.npy    float32 normalized vectors, grouped by list
+        keys.npy       int64 (document number, chunk id) of each row
+
+    ``{snapshot_dir}/CURRENT`` names the generation to load.
+    """
+
+    def __init__(
+        self,
+        generation: str,
+        documents: Dict[str, Tuple[int, int]],
+        centroids: np.ndarray,
+        idf: np.ndarray,
+        offsets: np.ndarray,
+        vectors: np.ndarray,
+        keys: np.ndarray,
+    ):
+        self.generation = generation
+        self.documents = documents
+        self.centroids = centroids
+        self.idf = idf
+        self.offsets = offsets
+        self.vectors = vectors
+        self.keys = keys
+
+    @staticmethod
+    def current_generation(snapshot_dir: Path) -> Optional[str]:
+        try:
+            return (snapshot_dir / "CURRENT").read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def open(cls, snapshot_dir: Path) -> Optional["_Snapshot"]:
+        """Map the current snapshot; None if there is none or it was just replaced"""
+        generation = cls.current_generation(snapshot_dir)
+        if generation is None:
+            return None
+        path = snapshot_dir / generation
+        try:
+            with open(path / "manifest.json", encoding="utf-8") as f:
+                manifest = json.load(f)
+            arrays = [
+                np.load(path / f"{name}.npy", mmap_mode="r")
+                for name in ("centroids", "idf", "offsets", "vectors", "keys")
+            ]
+        except FileNotFoundError:
+            return None
+        documents = {
+            doc_id: (doc_num, rows)
+            for doc_id, (doc_num, rows) in manifest["documents"].items()
+        }
+        return cls(manifest["generation"], documents, *arrays)
+
+    def list_view(self, list_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = int(self.offsets[list_id]), int(self.offsets[list_id + 1])
+        return self.vectors[start:end], self.keys[start:end]
+
+
+class IVFIndex:
+    """Inverted-file ANN index over the chunk vectors of every document
+
+    Vectors are clustered with spherical k-means into ``nlist`` lists; a
+    query scans only the ``nprobe`` lists whose centroids are closest.
+    Until enough vectors exist to train the centroids, search is exact.
+
+    Documents arrive weighted with their own IDF and are re-weighted with
+    one corpus-level IDF, which queries are weighted with too. The corpus
+    IDF is recomputed whenever the index is trained.
+
+    Training writes every vector into a snapshot, grouped by list. With a
+    ``snapshot_dir`` the snapshot is saved there and memory-mapped, so all
+    worker processes share one copy in the page cache. Only documents added
+    since the snapshot are held on the heap, and removed ones are masked
+    out until the next training. Training runs on a background thread
+    (unless ``background_training`` is off) and holds the lock only to copy
+    the newest vectors and to swap in the new snapshot.
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        nlist: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        seed: int = 0,
+        background_training: bool = True,
+        snapshot_dir: Optional[Path] = None,
+    ):
+        self.dim = dim or settings.EMBEDDING_DIM
+        self.nlist = nlist or settings.ANN_NLIST
+        self.nprobe = nprobe or settings.ANN_NPROBE
+        self.background_training = background_training
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.snapshot: Optional[_Snapshot] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.idf = np.ones(self.dim, dtype=np.float32)
+        # Rows added since the snapshot, one list per centroid once trained
+        self.lists: List[_VectorList] = [_VectorList(self.dim)]
+        self.doc_nums: Dict[str, int] = {}
+        self.doc_ids: Dict[int, str] = {}
+        self.trained_size = 0
+        self._doc_rows: Dict[int, int] = {}
+        self._size = 0
+        self._removed: set = set()
+        self._next_doc_num = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        self._training: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_nums
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def unsaved_rows(self) -> int:
+        """Rows held on the heap rather than in the snapshot"""
+        return sum(lst.size for lst in self.lists)
+
+    def add(self, doc_id: str, vectors: np.ndarray, idf: Optional[np.ndarray] = None):
+        """Insert (or replace) a document's chunk vectors, weighted with ``idf``"""
+        with self._lock:
+            if doc_id in self.doc_nums:
+                self.remove(doc_id)
+            doc_num = self._register(doc_id, len(vectors))
+            keys = (np.int64(doc_num) << CHUNK_BITS) + np.arange(
+                len(vectors), dtype=np.int64
+            )
+            ratio = self.idf if idf is None else self.idf / idf
+            self._assign_reweighted(vectors, keys, ratio)
+
+            if self._needs_training():
+                self._start_training()
+
+    def _register(self, doc_id: str, rows: int) -> int:
+        doc_num = self._next_doc_num
+        self._next_doc_num += 1
+        self.doc_nums[doc_id] = doc_num
+        self.doc_ids[doc_num] = doc_id
+        self._doc_rows[doc_num] = rows
+        self._size += rows
+        return doc_num
+
+    def _needs_training(self) -> bool:
+        if not self.is_trained:
+            return self._size >= self.nlist * settings.ANN_MIN_POINTS_PER_LIST
+        # The corpus has outgrown the centroids (and IDF) it was trained
+        # with, or too many rows have piled up outside the snapshot
+        return (
+            self._size > 4 * self.trained_size
+            or self.unsaved_rows > self.trained_size // 4
+        )
+
+    def _start_training(self):
+        if not self.background_training:
+            self.train()
+        elif self._training is None or not self._training.is_alive():
+            self._training = threading.Thread(
+                target=self.train, name="ann-train", daemon=True
+            )
+            self._training.start()
+
+    def wait_for_training(self, timeout: Optional[float] = None):
+        """Wait for a background training run to finish"""
+        training = self._training
+        if training is not None:
+            training.join(timeout)
+
+    def _assign_reweighted(
+        self, vectors: np.ndarray, keys: np.ndarray, ratio: np.ndarray
+    ):
+        """Assign rows scaled by ``ratio`` (IDF re-weighting), a block at a time"""
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = np.asarray(vectors[start : start + BLOCK_ROWS], dtype=np.float32)
+            self._assign(l2_normalize(block * ratio), keys[start : start + BLOCK_ROWS])
+
+    def _assign(self, vectors: np.ndarray, keys: np.ndarray):
+        if not self.is_trained:
+            self.lists[0].append(vectors, keys)
+            return
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        for list_id in np.unique(assignments):
+            mask = assignments == list_id
+            self.lists[list_id].append(vectors[mask], keys[mask])
+
+    def remove(self, doc_id: str):
+        """Remove a document's vectors"""
+        with self._lock:
+            doc_num = self.doc_nums.pop(doc_id, None)
+            if doc_num is None:
+                return
+            del self.doc_ids[doc_num]
+            self._size -= self._doc_rows.pop(doc_num)
+            if self._in_snapshot(doc_id, doc_num):
+                # Snapshot rows are read-only; mask them until the next training
+                self._removed.add(doc_num)
+            else:
+                for lst in self.lists:
+                    lst.remove(np.array([doc_num]))
+
+    def _in_snapshot(self, doc_id: str, doc_num: int) -> bool:
+        """Whether these rows of a document are the snapshot's"""
+        return (
+            self.snapshot is not None
+            and self.snapshot.documents.get(doc_id, (None,))[0] == doc_num
+        )
+
+    def _removed_array(self) -> np.ndarray:
+        return np.fromiter(self._removed, dtype=np.int64, count=len(self._removed))
+
+    def _live_blocks(
+        self,
+        snapshot: Optional[_Snapshot],
+        removed: np.ndarray,
+        unsaved: Tuple[np.ndarray, np.ndarray],
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Every live row, a block at a time: the snapshot's, then the unsaved"""
+        if snapshot is not None:
+            for start in range(0, len(snapshot.keys), BLOCK_ROWS):
+                vectors = snapshot.vectors[start : start + BLOCK_ROWS]
+                keys = snapshot.keys[start : start + BLOCK_ROWS]
+                if len(removed):
+                    keep = ~np.isin(keys >> CHUNK_BITS, removed)
+                    vectors, keys = vectors[keep], keys[keep]
+                yield np.asarray(vectors, dtype=np.float32), np.asarray(keys)
+        vectors, keys = unsaved
+        for start in range(0, len(keys), BLOCK_ROWS):
+            yield vectors[start : start + BLOCK_ROWS], keys[start : start + BLOCK_ROWS]
+
+    def _sample(
+        self,
+        snapshot: Optional[_Snapshot],
+        removed: np.ndarray,
+        unsaved: Tuple[np.ndarray, np.ndarray],
+        sample_size: int,
+    ) -> np.ndarray:
+        """Copy about ``sample_size`` random live rows without reading the rest"""
+        saved_rows = 0 if snapshot is None else len(snapshot.keys)
+        total = saved_rows + len(unsaved[1])
+        picks = np.sort(self._rng.choice(total, min(sample_size, total), replace=False))
+        parts = [unsaved[0][picks[picks >= saved_rows] - saved_rows]]
+        if saved_rows:
+            saved = picks[picks < saved_rows]
+            if len(removed):
+                saved = saved[~np.isin(snapshot.keys[saved] >> CHUNK_BITS, removed)]
+            parts.insert(0, np.asarray(snapshot.vectors[saved], dtype=np.float32))
+        return np.concatenate(parts)
+
+    def train(self, iterations: Optional[int] = None):
+        """Recompute the corpus IDF, cluster the vectors with spherical k-means
+        and write them into a new snapshot"""
+        with self._training_lock() as acquired:
+            if acquired:
+                self._train(iterations)
+
+    @contextmanager
+    def _training_lock(self) -> Iterator[bool]:
+        """Keep worker processes from training at the same time"""
+        if self.snapshot_dir is None or fcntl is None:
+            yield True
+            return
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.snapshot_dir / ".train.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False  # Another worker is training
+                return
+            try:
+                # Another worker may have trained since this one last looked
+                current = _Snapshot.current_generation(self.snapshot_dir)
+                loaded = self.snapshot.generation if self.snapshot else None
+                yield current == loaded
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _train(self, iterations: Optional[int]):
+        with self._lock:
+            total = len(self)
+            if total < self.nlist:
+                return
+            snapshot, removed = self.snapshot, self._removed_array()
+            # Copies, since removals compact the unsaved lists in place
+            views = [lst.view() for lst in self.lists]
+            unsaved = (
+                np.concatenate([vectors for vectors, _ in views]),
+                np.concatenate([keys for _, keys in views]),
+            )
+            documents = {
+                doc_id: (doc_num, self._doc_rows[doc_num])
+                for doc_id, doc_num in self.doc_nums.items()
+            }
+            old_idf = self.idf
+
+        # Everything below runs without blocking searches and inserts
+        started = time.perf_counter()
+        doc_freq = sum(
+            np.count_nonzero(vectors, axis=0)
+            for vectors, _ in self._live_blocks(snapshot, removed, unsaved)
+        )
+        idf = idf_weights(doc_freq, total)
+        ratio = idf / old_idf
+
+        sample = self._sample(snapshot, removed, unsaved, self.nlist * 256)
+        sample = l2_normalize(sample * ratio)
+        sample_size = len(sample)
+        if sample_size < self.nlist:
+            return  # Mostly removed rows; wait for more documents
+        centroids = sample[self._rng.choice(sample_size, self.nlist, replace=False)]
+        for _ in range(iterations or settings.ANN_KMEANS_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            # Re-seed empty clusters with random points
+            empty = ~np.isin(np.arange(self.nlist), assignments)
+            sums[empty] = sample[self._rng.choice(sample_size, int(empty.sum()))]
+            centroids = l2_normalize(sums)
+        centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+
+        new_snapshot = self._write_snapshot(
+            documents,
+            centroids,
+            idf,
+            ratio,
+            lambda: self._live_blocks(snapshot, removed, unsaved),
+        )
+        if new_snapshot is not None:
+            self._install(new_snapshot, own=True)
+        logger.info(
+            f"Trained ANN index with {self.nlist} lists on {sample_size} of "
+            f"{total} vectors in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _write_snapshot(
+        self,
+        documents: Dict[str, Tuple[int, int]],
+        centroids: np.ndarray,
+        idf: np.ndarray,
+        ratio: np.ndarray,
+        blocks,
+    ) -> Optional[_Snapshot]:
+        """Re-weight and group every live row by its nearest centroid
+
+        Rows are streamed twice (to count each list's rows, then to place
+        them), so memory use stays at a block besides the output.
+        """
+        assignments = [
+            np.argmax(l2_normalize(vectors * ratio) @ centroids.T, axis=1)
+            for vectors, _ in blocks()
+        ]
+        counts = np.bincount(np.concatenate(assignments), minlength=self.nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        total = int(offsets[-1])
+
+        generation = f"{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+        build_dir = None
+        if self.snapshot_dir is not None:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            build_dir = Path(tempfile.mkdtemp(dir=self.snapshot_dir, prefix=".build-"))
+        try:
+            vectors_out = _new_array(
+                build_dir, "vectors", (total, self.dim), np.float32
+            )
+            keys_out = _new_array(build_dir, "keys", (total,), np.int64)
+            cursor = offsets[:-1].copy()
+            for (vectors, keys), assigned in zip(blocks(), assignments):
+                order = np.argsort(assigned, kind="stable")
+                assigned = assigned[order]
+                block_counts = np.bincount(assigned, minlength=self.nlist)
+                first = np.cumsum(block_counts) - block_counts
+                rows = cursor[assigned] + np.arange(len(assigned)) - first[assigned]
+                vectors_out[rows] = l2_normalize(vectors[order] * ratio)
+                keys_out[rows] = keys[order]
+                cursor += block_counts
+
+            if build_dir is None:
+                return _Snapshot(
+                    generation,
+                    documents,
+                    centroids,
+                    idf,
+                    offsets,
+                    vectors_out,
+                    keys_out,
+                )
+            vectors_out.flush()
+            keys_out.flush()
+            del vectors_out, keys_out
+            np.save(build_dir / "centroids.npy", centroids)
+            np.save(build_dir / "idf.npy", idf)
+            np.save(build_dir / "offsets.npy", offsets)
+            with open(build_dir / "manifest.json", "w", encoding="utf-8") as f:
+                json.dump({"generation": generation, "documents": documents}, f)
+            self._publish(build_dir, generation)
+        except BaseException:
+            if build_dir is not None:
+                shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        return _Snapshot.open(self.snapshot_dir)
+
+    def _publish(self, build_dir: Path, generation: str):
+        """Make a built snapshot current and delete the ones it replaces
+
+        Workers that still map an old snapshot keep reading it; its files
+        are only freed once they let go.
+        """
+        os.rename(build_dir, self.snapshot_dir / generation)
+        pointer = self.snapshot_dir / ".CURRENT"
+        pointer.write_text(generation)
+        os.replace(pointer, self.snapshot_dir / "CURRENT")
+        for path in self.snapshot_dir.iterdir():
+            if path.is_dir() and path.name != generation:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def load_snapshot(self) -> bool:
+        """Switch to the snapshot on disk if it is newer than the one in use"""
+        if self.snapshot_dir is None:
+            return False
+        loaded = self.snapshot.generation if self.snapshot else None
+        if _Snapshot.current_generation(self.snapshot_dir) == loaded:
+            return False
+        snapshot = _Snapshot.open(self.snapshot_dir)
+        if snapshot is None:
+            return False
+        self._install(snapshot, own=False)
+        logger.info(
+            f"Loaded ANN snapshot {snapshot.generation} with "
+            f"{len(snapshot.documents)} documents"
+        )
+        return True
+
+    def _install(self, snapshot: _Snapshot, own: bool):
+        """Swap in a snapshot, keeping documents it does not hold yet
+
+        Unsaved rows of documents missing from the snapshot are re-weighted
+        into its lists. This worker's own snapshot shares its document
+        numbers, so documents removed or replaced while it was built are
+        masked. Another worker's snapshot numbers documents its own way and
+        may hold documents deleted since; the caller re-syncs with the chunk
+        store to drop them.
+        """
+        with self._lock:
+            ratio = snapshot.idf / self.idf
+            saved_nums = {num for num, _ in snapshot.documents.values()}
+            carried: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+            for lst in self.lists:
+                vectors, keys = lst.view()
+                doc_nums = keys >> CHUNK_BITS
+                for doc_num in np.unique(doc_nums).tolist():
+                    doc_id = self.doc_ids.get(doc_num)
+                    if doc_id is None:
+                        continue
+                    saved = (
+                        doc_num in saved_nums if own else doc_id in snapshot.documents
+                    )
+                    if not saved:
+                        mask = doc_nums == doc_num
+                        carried.setdefault(doc_id, []).append(
+                            (vectors[mask], keys[mask])
+                        )
+
+            live = dict(self.doc_ids)
+            self.snapshot = snapshot
+            self.idf = snapshot.idf
+            self.centroids = snapshot.centroids
+            self.lists = [_VectorList(self.dim) for _ in range(len(snapshot.centroids))]
+            self.doc_nums, self.doc_ids, self._doc_rows = {}, {}, {}
+            self._size = 0
+            self._removed = set()
+            self._next_doc_num = max(
+                self._next_doc_num,
+                1 + max((num for num, _ in snapshot.documents.values()), default=-1),
+            )
+            for doc_id, (doc_num, rows) in snapshot.documents.items():
+                if own and live.get(doc_num) != doc_id:
+                    self._removed.add(doc_num)  # Removed or replaced meanwhile
+                    continue
+                self.doc_nums[doc_id] = doc_num
+                self.doc_ids[doc_num] = doc_id
+                self._doc_rows[doc_num] = rows
+                self._size += rows
+            self.trained_size = self._size
+
+            # Documents added since the snapshot was started keep their rows
+            for doc_id, parts in carried.items():
+                vectors = np.concatenate([vectors for vectors, _ in parts])
+                chunk_ids = np.concatenate([keys for _, keys in parts]) & (
+                    (1 << CHUNK_BITS) - 1
+                )
+                doc_num = self._register(doc_id, len(vectors))
+                keys = (np.int64(doc_num) << CHUNK_BITS) + chunk_ids
+                self._assign_reweighted(vectors, keys, ratio)
+
+    def _lists_to_scan(
+        self, list_ids: List[int]
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Snapshot and unsaved rows of some lists, removed documents left out"""
+        views = []
+        removed = self._removed_array()
+        for list_id in list_ids:
+            if self.snapshot is not None:
+                vectors, keys = self.snapshot.list_view(list_id)
+                if len(removed):
+                    keep = ~np.isin(keys >> CHUNK_BITS, removed)
+                    vectors, keys = vectors[keep], keys[keep]
+                if len(keys):
+                    views.append((vectors, keys))
+            if self.lists[list_id].size:
+                views.append(self.lists[list_id].view())
+        return views
+
+    def search(
+        self, query: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> List[Tuple[float, str, int]]:
+        """Return up to k ``(score, doc_id, chunk_id)`` results, best first
+
+        ``query`` is an unweighted query vector; the corpus IDF is applied here.
+        """
+        with self._lock:
+            query = l2_normalize(query * self.idf)
+            if self.is_trained:
+                nlist = len(self.centroids)
+                nprobe = min(nprobe or self.nprobe, nlist)
+                probed = [i for _, i in top_k(self.centroids @ query, nprobe, None)]
+            else:
+                probed = [0]
+
+            views = self._lists_to_scan(probed)
+            scores = [vectors @ query for vectors, _ in views]
+            return self._top_results(scores, [keys for _, keys in views], k)
+
+    def search_exact(self, query: np.ndarray, k: int) -> List[Tuple[float, str, int]]:
+        """Brute-force search over every vector, the reference for recall"""
+        with self._lock:
+            query = l2_normalize(query * self.idf)
+            views = self._lists_to_scan(list(range(len(self.lists))))
+            scores = [vectors @ query for vectors, _ in views]
+            return self._top_results(scores, [keys for _, keys in views], k)
+
+    def _top_results(
+        self, scores: List[np.ndarray], keys: List[np.ndarray], k: int
+    ) -> List[Tuple[float, str, int]]:
+        if not scores:
+            return []
+        scores, keys = np.concatenate(scores), np.concatenate(keys)
+        return [
+            (
+                score,
+                self.doc_ids[int(keys[i] >> CHUNK_BITS)],
+                int(keys[i] & ((1 << CHUNK_BITS) - 1)),
+            )
+            for score, i in top_k(scores, k)
+        ]
+
+    def benchmark(
+        self, queries: np.ndarray, k: int = 10, nprobe_values: Tuple[int, ...] = ()
+    ) -> List[Dict]:
+        """Measure recall@k against exact search and latency for each nprobe"""
+        exact = [
+            {(doc_id, chunk_id) for _, doc_id, chunk_id in self.search_exact(q, k)}
+            for q in queries
+        ]
+        report = []
+        for nprobe in nprobe_values or (self.nprobe,):
+            latencies, recalls = [], []
+            for query, truth in zip(queries, exact):
+                started = time.perf_counter()
+                results = self.search(query, k, nprobe)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found = {(doc_id, chunk_id) for _, doc_id, chunk_id in results}
+                recalls.append(len(found & truth) / len(truth) if truth else 1.0)
+            report.append(
+                {
+                    "nprobe": nprobe,
+                    "recall": float(np.mean(recalls)),
+                    "latency_ms_p50": float(np.percentile(latencies, 50)),
+                    "latency_ms_p95": float(np.percentile(latencies, 95)),
+                }
+            )
+        return report
+
+    def sync_with_store(self, chunk_store: ChunkStore):
+        """Add documents persisted by other workers and drop deleted ones
+
+        The lock is taken per document, so searches keep running during a
+        long sync. Mapped vectors are re-weighted into the lists a block at
+        a time and each mapping is released before the next one is opened.
+        """
+        stored = set(chunk_store.list_documents())
+        for doc_id in set(self.doc_nums) - stored:
+            self.remove(doc_id)
+        for doc_id in sorted(stored - set(self.doc_nums)):
+            mapped = chunk_store.open(doc_id)
+            if mapped is not None and len(mapped):
+                with self._lock:
+                    # Added by this worker while the sync was running
+                    if doc_id not in self.doc_nums:
+                        self.add(doc_id, mapped.vectors, mapped.idf)
+            del mapped
+
+
+def _new_array(build_dir: Optional[Path], name: str, shape: tuple, dtype):
+    """An output array, memory-mapped into build_dir when there is one"""
+    if build_dir is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(
+        build_dir / f"{name}.npy", mode="w+", dtype=dtype, shape=shape
+    )
+
+
+class CorpusIndex:
+    """Process-wide ANN index kept in step with the on-disk chunk store
+
+    ``start`` maps the saved snapshot and then syncs in the background, so
+    searches never open documents themselves; they see what has been
+    loaded so far.
+    """
+
+    def __init__(
+        self,
+        chunk_store: Optional[ChunkStore] = None,
+        snapshot_dir: Optional[Path] = None,
+    ):
+        self.chunk_store = chunk_store or ChunkStore()
+        self.index = IVFIndex(snapshot_dir=Path(snapshot_dir or settings.ANN_DIR))
+        self._synced_mtime: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _index_dir_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.chunk_store.index_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @property
+    def document_count(self) -> int:
+        return len(self.index.doc_nums)
+
+    def start(self):
+        """Load the saved snapshot now and keep the index synced in the background"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.index.load_snapshot()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ann-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error syncing the ANN index: {str(e)}")
+            self._stop.wait(settings.ANN_REFRESH_INTERVAL)
+
+    def refresh(self):
+        """Pick up a newer snapshot and documents added or removed since"""
+        if self.index.load_snapshot():
+            # Another worker's snapshot may hold documents deleted since
+            self._synced_mtime = None
+        mtime = self._index_dir_mtime()
+        if mtime != self._synced_mtime:
+            self.index.sync_with_store(self.chunk_store)
+            self._synced_mtime = mtime
+
+    def add(self, doc_id: str, vectors: np.ndarray, idf: np.ndarray):
+        self.index.add(doc_id, vectors, idf)
+
+    def remove(self, doc_id: str):
+        self.index.remove(doc_id)
+
+    def search(
+        self, query: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> List[Tuple[float, str, int]]:
+        return self.index.search(query, k, nprobe)
+
+
+@lru_cache()
+def get_corpus_index() -> CorpusIndex:
+    return CorpusIndex()
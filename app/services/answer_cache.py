@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+from ..utils.cache import LRUCache
+
+settings = get_settings()
+logger = setup_logging()
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, whitespace and trailing punctuation so equal questions match"""
+    return WHITESPACE_PATTERN.sub(" ", query.casefold()).strip().rstrip("?!. ")
+
+
+class AnswerCache:
+    """Cache of generated answers with a memory tier and an optional disk tier
+
+    Keys cover the PDF, its content hash, the normalized question and the
+    generation config, so a changed document or config never sees answers
+    produced for the old one. Entries expire after ``ttl`` seconds in both
+    tiers.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        cache_dir: Optional[str] = None,
+    ):
+        self.ttl = settings.CACHE_TTL if ttl is None else ttl
+        self.memory = LRUCache(
+            max_bytes or settings.ANSWER_CACHE_MAX_BYTES,
+            self.ttl,
+            sizeof=lambda answer: len(answer.encode("utf-8")),
+        )
+        cache_dir = settings.ANSWER_CACHE_DIR if cache_dir is None else cache_dir
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+    @staticmethod
+    def make_key(pdf_id: str, content_hash: str, query: str, config: Dict) -> str:
+        payload = json.dumps(
+            [pdf_id, content_hash, normalize_query(query), config], sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[str]:
+        """Read an answer from the disk tier, dropping it if expired"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        remaining = entry["expires_at"] - time.time()
+        if remaining <= 0:
+            path.unlink(missing_ok=True)
+            return None
+        self.memory.put(key, entry["answer"], ttl=remaining)
+        return entry["answer"]
+
+    def get(self, key: str) -> Optional[str]:
+        answer = self.memory.get(key)
+        if answer is None and self.cache_dir is not None:
+            answer = self._load(key)
+            if answer is not None:
+                self.memory.loads += 1
+        return answer
+
+    def put(self, key: str, answer: str):
+        self.memory.put(key, answer)
+        if self.cache_dir is None:
+            return
+        try:
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"answer": answer, "expires_at": time.time() + self.ttl}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # The memory tier still serves the answer
+            logger.warning(f"Could not write answer to disk cache: {str(e)}")
+
+    def stats(self) -> Dict:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + memory["loads"]
+        return {
+            "entries": memory["entries"],
+            "bytes": memory["bytes"],
+            "memory_hits": memory["hits"],
+            "disk_hits": memory["loads"],
+            "misses": memory["misses"] - memory["loads"],
+            "evictions": memory["evictions"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+@lru_cache()
+def get_answer_cache() -> AnswerCache:
+    return AnswerCache()
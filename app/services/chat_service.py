@@ -1,44 +1,142 @@
-import os
+import asyncio
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 import httpx
 import logging
+from ..core.config import get_settings
 
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
+SCOPES = ["https://www.googleapis.com/auth/generative-language"]
 
-def get_oauth_token():
-    credentials = service_account.Credentials.from_service_account_file(
-        "service_account.json",
-        scopes=["https://www.googleapis.com/auth/generative-language"],
+
+class TokenProvider:
+    """Caches a service account's OAuth token until shortly before it expires
+
+    The key file is read once. Refreshes are blocking, so they run in a
+    thread, and concurrent callers share one refresh. A token inside the
+    refresh margin but still valid is returned at once while a background
+    refresh replaces it; a failed background refresh is logged and tried
+    again on the next call.
+    """
+
+    def __init__(
+        self,
+        service_account_file: Optional[str] = None,
+        refresh_margin: Optional[float] = None,
+    ):
+        self.service_account_file = (
+            service_account_file or settings.GEMINI_SERVICE_ACCOUNT_FILE
+        )
+        self.refresh_margin = timedelta(
+            seconds=(
+                settings.OAUTH_REFRESH_MARGIN
+                if refresh_margin is None
+                else refresh_margin
+            )
+        )
+        self.refreshes = 0
+        self._credentials = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _load_credentials(self):
+        return service_account.Credentials.from_service_account_file(
+            self.service_account_file, scopes=SCOPES
+        )
+
+    def _refresh(self):
+        if self._credentials is None:
+            self._credentials = self._load_credentials()
+        self._credentials.refresh(Request())
+        self.refreshes += 1
+
+    def _remaining(self) -> Optional[timedelta]:
+        """Time until the cached token expires, or None if there is none"""
+        credentials = self._credentials
+        if credentials is None or not credentials.token:
+            return None
+        if credentials.expiry is None:
+            return timedelta.max
+        # google-auth keeps expiry as a naive UTC datetime
+        return credentials.expiry - datetime.utcnow()
+
+    def _start_refresh(self) -> asyncio.Task:
+        task = self._refresh_task
+        if (
+            task is None
+            or task.done()
+            or task.get_loop() is not asyncio.get_running_loop()
+        ):
+            task = self._refresh_task = asyncio.ensure_future(
+                asyncio.to_thread(self._refresh)
+            )
+            task.add_done_callback(self._refresh_done)
+        return task
+
+    def _refresh_done(self, task: asyncio.Task):
+        if self._refresh_task is task:
+            self._refresh_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"OAuth token refresh failed: {task.exception()}")
+
+    async def get_token(self) -> str:
+        remaining = self._remaining()
+        if remaining is None or remaining <= timedelta(0):
+            await asyncio.shield(self._start_refresh())
+        elif remaining <= self.refresh_margin:
+            self._start_refresh()
+        return self._credentials.token
+
+
+@lru_cache()
+def get_token_provider() -> TokenProvider:
+    return TokenProvider()
+
+
+@lru_cache()
+def get_http_client() -> httpx.AsyncClient:
+    """Keep-alive HTTP/2 client shared by every call to the Gemini REST API"""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=10.0),
     )
-    credentials.refresh(Request())
-    return credentials.token
+
+
+async def close_http_client():
+    """Close the shared client's connections (on application shutdown)"""
+    if get_http_client.cache_info().currsize:
+        await get_http_client().aclose()
+        get_http_client.cache_clear()
 
 
 async def chat_with_pdf(pdf_id, query):
-    api_url = os.getenv(
-        "GEMINI_API_URL",
-        "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent",
-    )
-    token = get_oauth_token()
+    api_url = settings.GEMINI_API_URL
+    token = await get_token_provider().get_token()
 
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     payload = {"contents": [{"parts": [{"text": f"PDF ID: {pdf_id}\nQuery: {query}"}]}]}
 
     try:
         logger.info(f"Payload: {payload}")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(api_url, json=payload, headers=headers)
-            logger.info(f"Response status: {response.status_code}")
-            logger.info(f"Response body: {response.text}")
-            response.raise_for_status()
-            return (
-                response.json()
-                .get("contents", [{}])[0]
-                .get("parts", [{}])[0]
-                .get("text", "No response from Gemini API.")
-            )
+        response = await get_http_client().post(api_url, json=payload, headers=headers)
+        logger.info(f"Response status: {response.status_code}")
+        logger.info(f"Response body: {response.text}")
+        response.raise_for_status()
+        return (
+            response.json()
+            .get("contents", [{}])[0]
+            .get("parts", [{}])[0]
+            .get("text", "No response from Gemini API.")
+        )
     except httpx.RequestError as e:
         logger.error(f"Error communicating with Gemini API: {e}")
         raise Exception(f"Error communicating with Gemini API: {e}")
@@ -0,0 +1,156 @@
+import mmap
+import os
+import shutil
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+from typing import List, Optional, Sequence as SequenceType
+import numpy as np
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+from ..utils.chunking import TextChunks
+from .search_index import BM25Index
+
+settings = get_settings()
+logger = setup_logging()
+
+
+class MappedChunks(Sequence):
+    """Read-only view of a persisted document's chunks and vectors
+
+    Files are memory-mapped, so opening is O(1) and every worker process
+    shares the same page-cache pages instead of holding its own copy.
+    Chunk strings are decoded only when accessed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.spans = np.load(path / "spans.npy", mmap_mode="r")
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.idf = np.load(path / "idf.npy", mmap_mode="r")
+        self.bm25 = BM25Index.load(path)
+        with open(path / "text.bin", "rb") as f:
+            # mmap cannot map an empty file
+            self._text = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if os.fstat(f.fileno()).st_size
+                else b""
+            )
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self.spans[i]
+        return self.excerpt(start, end)
+
+    def excerpt(self, start: int, end: int) -> str:
+        """The text between two byte offsets, which may span several chunks"""
+        return self._text[int(start) : int(end)].decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes mapped from disk (not held on the Python heap)"""
+        return len(self._text) + self.spans.nbytes + self.vectors.nbytes
+
+
+class ChunkStore:
+    """On-disk chunk text and vectors, one directory per document
+
+    Layout of ``{index_dir}/{doc_id}/``::
+
+        text.bin     UTF-8 document text, stored once even when chunks overlap
+        spans.npy    int64 (start, end) byte offsets of each chunk in text.bin
+        vectors.npy  float32 chunk vectors, one row per chunk
+        idf.npy      float32 IDF weights used to vectorize queries
+        bm25.bin     the BM25 inverted index (see BM25Index)
+    """
+
+    def __init__(self, index_dir: Optional[Path] = None):
+        self.index_dir = Path(index_dir or settings.INDEX_DIR)
+
+    def _path(self, doc_id: str) -> Path:
+        return self.index_dir / doc_id
+
+    def save(
+        self,
+        doc_id: str,
+        chunks: SequenceType[str],
+        vectors: np.ndarray,
+        idf: np.ndarray,
+        bm25: Optional[BM25Index] = None,
+    ):
+        """Persist a document atomically by renaming a completed directory"""
+        if not isinstance(chunks, TextChunks):
+            chunks = _contiguous_chunks(chunks)
+        text, spans = chunks.text.encode("utf-8"), _byte_spans(chunks)
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.index_dir, prefix=f".{doc_id}_"))
+        try:
+            with open(tmp_dir / "text.bin", "wb") as f:
+                f.write(text)
+            np.save(tmp_dir / "spans.npy", spans)
+            np.save(tmp_dir / "vectors.npy", np.ascontiguousarray(vectors, np.float32))
+            np.save(tmp_dir / "idf.npy", np.asarray(idf, np.float32))
+            if bm25 is not None:
+                bm25.save(tmp_dir)
+
+            path = self._path(doc_id)
+            if path.exists():
+                shutil.rmtree(path)
+            os.rename(tmp_dir, path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def save_bm25(self, doc_id: str, bm25: BM25Index) -> BM25Index:
+        """Add a BM25 index to a saved document, returning it memory-mapped"""
+        path = self._path(doc_id)
+        if not path.exists():
+            return bm25
+        bm25.save(path)
+        return BM25Index.load(path) or bm25
+
+    def open(self, doc_id: str) -> Optional[MappedChunks]:
+        """Map a persisted document, or return None if it was never saved"""
+        path = self._path(doc_id)
+        if not path.exists():
+            return None
+        return MappedChunks(path)
+
+    def delete(self, doc_id: str):
+        shutil.rmtree(self._path(doc_id), ignore_errors=True)
+
+    def list_documents(self) -> List[str]:
+        """Ids of every persisted document"""
+        if not self.index_dir.exists():
+            return []
+        return [
+            path.name
+            for path in self.index_dir.iterdir()
+            if path.is_dir() and not path.name.startswith(".")
+        ]
+
+
+def _contiguous_chunks(chunks: SequenceType[str]) -> TextChunks:
+    """Lay out separately held chunk strings back to back"""
+    spans, position = [], 0
+    for chunk in chunks:
+        spans.append((position, position + len(chunk)))
+        position += len(chunk)
+    return TextChunks("".join(chunks), spans)
+
+
+def _byte_spans(chunks: TextChunks) -> np.ndarray:
+    """Convert character offsets into UTF-8 byte offsets"""
+    spans = np.array(chunks.spans, dtype=np.int64).reshape(-1, 2)
+    if chunks.text.isascii():
+        return spans
+
+    byte_positions, char_position, byte_position = {}, 0, 0
+    for boundary in np.unique(spans):
+        byte_position += len(chunks.text[char_position:boundary].encode("utf-8"))
+        char_position = int(boundary)
+        byte_positions[char_position] = byte_position
+    return np.vectorize(byte_positions.__getitem__, otypes=[np.int64])(spans)
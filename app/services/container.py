@@ -0,0 +1,60 @@
+from ..core.logging import setup_logging
+from .chat_service import close_http_client
+from .ingestion_jobs import get_ingestion_queue
+from .llm_resilience import get_llm_caller
+from .llm_service import LLMService
+from .pdf_extraction import get_extraction_pool
+from .pdf_service import PDFService
+from .search_service import SearchService
+
+logger = setup_logging()
+
+
+class ServiceContainer:
+    """Services shared by every request for the lifetime of the application
+
+    Built once in the app lifespan so requests no longer reconfigure the
+    Gemini client or rebuild PDFService and its stores on every call.
+    """
+
+    def __init__(self):
+        self.pdf_service = PDFService()
+        self.llm_caller = get_llm_caller()
+        self.llm_call_pool = self.llm_caller.pool
+        self.llm_service = LLMService(self.pdf_service, self.llm_caller)
+        self.answer_cache = self.llm_service.answer_cache
+        self.single_flight = self.llm_service.single_flight
+        self.session_store = self.llm_service.session_store
+        self.context_cache = self.llm_service.context_cache
+        self.search_service = SearchService(self.pdf_service)
+        self.ingestion_queue = get_ingestion_queue()
+        self.extraction_pool = get_extraction_pool()
+        self.corpus_index = self.pdf_service.embedding_service.corpus_index
+        if self.corpus_index is not None:
+            self.corpus_index.start()
+        logger.info("Service container initialized")
+
+    def get_metrics(self) -> dict:
+        """Counters of the shared caches and model call pool"""
+        return {
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "document_cache": self.pdf_service.embedding_service.get_cache_stats()[
+                "cache"
+            ],
+            "llm_calls": self.llm_call_pool.get_stats(),
+            "resilience": self.llm_caller.get_stats(),
+            "coalescing": self.single_flight.get_stats(),
+            "sessions": self.session_store.stats(),
+            "context_cache": self.context_cache.stats(),
+        }
+
+    async def shutdown(self):
+        """Stop background workers and release their resources"""
+        await self.ingestion_queue.shutdown()
+        self.extraction_pool.shutdown()
+        if self.corpus_index is not None:
+            self.corpus_index.stop()
+        self.llm_call_pool.shutdown()
+        self.context_cache.shutdown()
+        await close_http_client()
+        logger.info("Service container shut down")
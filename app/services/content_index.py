@@ -0,0 +1,167 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from ..core.logging import setup_logging
+
+logger = setup_logging()
+
+
+class ContentIndex:
+    """Content-addressed index of uploaded PDFs keyed on the SHA-256 of their bytes
+
+    Every ``pdf_id`` handed out to a client is an alias pointing at a document
+    (the extracted text and chunks stored under ``doc_id``). Identical uploads
+    share one document, and the document is removed only when its last alias
+    is deleted. The upload that owns a document (its ``doc_id``) leaves a
+    tombstone when deleted before the other aliases, so its id can no longer
+    be resolved or deleted again while the document lives on.
+    """
+
+    def __init__(self, index_dir: Optional[Path] = None):
+        self.index_dir = Path(index_dir or Path("data") / "content_index")
+        self.hashes_dir = self.index_dir / "hashes"
+        self.aliases_dir = self.index_dir / "aliases"
+        self.hashes_dir.mkdir(parents=True, exist_ok=True)
+        self.aliases_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """Serialize index updates across threads and worker processes"""
+        with self._lock, open(self.index_dir / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self, path: Path) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: Path, data: dict):
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp_path, path)
+
+    def lookup(self, content_hash: str) -> Optional[dict]:
+        """Return the index entry for a content hash, if the content is known"""
+        return self._read(self.hashes_dir / f"{content_hash}.json")
+
+    def resolve(self, pdf_id: str) -> str:
+        """Map a client-facing pdf_id to the id its document is stored under
+
+        Raises FileNotFoundError for a deleted owner whose document is still
+        referenced by other uploads.
+        """
+        alias = self._read(self.aliases_dir / f"{pdf_id}.json")
+        if alias is None:
+            return pdf_id
+        if alias.get("deleted"):
+            raise FileNotFoundError(f"PDF {pdf_id} was deleted")
+        return alias["doc_id"]
+
+    def public_id(self, doc_id: str) -> str:
+        """A live client-facing pdf_id for a stored document
+
+        The document's own id unless that upload was deleted, in which case
+        one of the uploads still referencing it.
+        """
+        alias = self._read(self.aliases_dir / f"{doc_id}.json")
+        if alias is None or not alias.get("deleted"):
+            return doc_id
+        entry = self.lookup(alias["content_hash"])
+        return entry["refs"][0] if entry and entry["refs"] else doc_id
+
+    def is_deleted(self, pdf_id: str) -> bool:
+        """Whether pdf_id is a deleted owner kept as a tombstone"""
+        alias = self._read(self.aliases_dir / f"{pdf_id}.json")
+        return bool(alias and alias.get("deleted"))
+
+    def register(self, content_hash: str, pdf_id: str, file_path: Path) -> dict:
+        """Register a freshly extracted document as the owner of its content hash"""
+        with self._locked():
+            entry = self.lookup(content_hash)
+            if entry is None:
+                entry = {
+                    "doc_id": pdf_id,
+                    "file_path": str(file_path),
+                    "refs": [],
+                    "created_at": datetime.utcnow(),
+                }
+            elif entry["doc_id"] != pdf_id:
+                # Another upload of the same bytes won the race; keep this
+                # document standalone rather than re-pointing existing aliases
+                logger.debug(f"Content {content_hash[:12]} already indexed")
+                return entry
+
+            return self._add_ref(content_hash, entry, pdf_id)
+
+    def add_alias(self, content_hash: str, pdf_id: str) -> Optional[dict]:
+        """Point a new pdf_id at already indexed content"""
+        with self._locked():
+            entry = self.lookup(content_hash)
+            if entry is None:
+                return None
+            return self._add_ref(content_hash, entry, pdf_id)
+
+    def _add_ref(self, content_hash: str, entry: dict, pdf_id: str) -> dict:
+        entry["refs"].append(pdf_id)
+        self._write(self.hashes_dir / f"{content_hash}.json", entry)
+        self._write(
+            self.aliases_dir / f"{pdf_id}.json",
+            {"doc_id": entry["doc_id"], "content_hash": content_hash},
+        )
+        return entry
+
+    def remove_alias(self, pdf_id: str) -> Optional[dict]:
+        """Drop a pdf_id and return its entry with the remaining reference count
+
+        Returns ``None`` when the pdf_id is not tracked by the index, or
+        was already deleted.
+        """
+        with self._locked():
+            alias_path = self.aliases_dir / f"{pdf_id}.json"
+            alias = self._read(alias_path)
+            if alias is None or alias.get("deleted"):
+                return None
+
+            content_hash = alias["content_hash"]
+            entry_path = self.hashes_dir / f"{content_hash}.json"
+            entry = self._read(entry_path) or {
+                "doc_id": alias["doc_id"],
+                "file_path": None,
+                "refs": [pdf_id],
+            }
+            entry["refs"] = [ref for ref in entry["refs"] if ref != pdf_id]
+
+            if entry["refs"]:
+                self._write(entry_path, entry)
+                if pdf_id == entry["doc_id"]:
+                    # The document is stored under this id; keep it unreachable
+                    self._write(alias_path, {**alias, "deleted": True})
+                else:
+                    alias_path.unlink(missing_ok=True)
+            else:
+                entry_path.unlink(missing_ok=True)
+                alias_path.unlink(missing_ok=True)
+                # The owner's tombstone goes with the document
+                (self.aliases_dir / f"{entry['doc_id']}.json").unlink(missing_ok=True)
+
+            return entry
+
+    def get_stats(self) -> Dict:
+        """Get statistics about indexed content"""
+        return {
+            "unique_documents": sum(1 for _ in self.hashes_dir.glob("*.json")),
+            "aliases": sum(1 for _ in self.aliases_dir.glob("*.json")),
+        }
@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+from ..utils.cache import LRUCache
+from .llm_backends import LLMBackend, LLMBackendError
+from .single_flight import SingleFlight
+
+settings = get_settings()
+logger = setup_logging()
+
+ContextKey = Tuple[str, str, str]
+
+
+class ContextCacheRegistry:
+    """Which document contexts are registered with the provider's context cache
+
+    Maps ``(backend, model, content hash)`` to the provider's cached content
+    name. Provider entries live ``ttl`` seconds, the same as documents in our
+    own document cache; ours expire ``margin`` seconds earlier so a name is
+    never used after the provider dropped it. Backends (or models) that turn
+    out not to support context caching are remembered and skipped.
+
+    Provider entries are billed until they expire, so names evicted from
+    the LRU, invalidated, purged with their document or left at shutdown
+    are deleted upstream on a background thread.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        margin: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.ttl = settings.CACHE_TTL if ttl is None else ttl
+        margin = settings.CONTEXT_CACHE_TTL_MARGIN if margin is None else margin
+        self.names = LRUCache(
+            max_entries or settings.CONTEXT_CACHE_MAX_ENTRIES,
+            max(self.ttl - margin, 1),
+            on_evict=self._delete_upstream,
+        )
+        self.unsupported: Set[Tuple[str, str]] = set()
+        # backend name -> backend, to delete the names it created
+        self.backends: Dict[str, LLMBackend] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.flights = SingleFlight()
+        self.created = 0
+        self.failures = 0
+        self.invalidations = 0
+        self.deleted = 0
+        self.delete_failures = 0
+
+    def supports(self, backend: LLMBackend) -> bool:
+        return (
+            backend.supports_context_cache
+            and (backend.name, backend.model_name) not in self.unsupported
+        )
+
+    async def get_or_create(
+        self,
+        backend: LLMBackend,
+        key: ContextKey,
+        load_context: Callable[[], str],
+        run: Callable[..., Awaitable],
+    ) -> Optional[str]:
+        """Name of the cached content for a context, registering it if needed
+
+        ``run`` makes the blocking provider call (e.g. LLMCallPool.run).
+        Returns None when the context cannot be cached; callers then send
+        the plain prompt.
+        """
+        name = self.names.get(key)
+        if name is not None:
+            return name
+
+        async def create() -> Optional[str]:
+            try:
+                name = await run(backend.create_context_cache, load_context(), self.ttl)
+            except LLMBackendError as e:
+                self.failures += 1
+                if not e.retryable:
+                    logger.warning(
+                        f"Context caching unsupported by {backend.name} "
+                        f"({backend.model_name}): {str(e)}"
+                    )
+                    self.unsupported.add((backend.name, backend.model_name))
+                return None
+            self.created += 1
+            self.backends[backend.name] = backend
+            self.names.put(key, name)
+            logger.info(f"Registered cached context {name}")
+            return name
+
+        # Concurrent first questions about a document register it once
+        return await self.flights.do(key, create)
+
+    def invalidate(self, key: ContextKey):
+        """Forget a cached content name the provider no longer accepts"""
+        name = self.names.pop(key)
+        if name is not None:
+            self.invalidations += 1
+            self._delete_upstream(key, name)
+
+    def purge(self, content_hash: str):
+        """Drop every cached context of a document that was deleted"""
+        for key, name in self.names.items():
+            if key[2] == content_hash and self.names.pop(key) is not None:
+                self._delete_upstream(key, name)
+
+    def _delete_upstream(self, key: ContextKey, name: str):
+        backend = self.backends.get(key[0])
+        if backend is None:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="context-cache"
+            )
+        self._executor.submit(self._delete, backend, name)
+
+    def _delete(self, backend: LLMBackend, name: str):
+        try:
+            backend.delete_context_cache(name)
+        except Exception as e:
+            self.delete_failures += 1
+            logger.warning(f"Could not delete cached context {name}: {str(e)}")
+            return
+        self.deleted += 1
+        logger.debug(f"Deleted cached context {name}")
+
+    def shutdown(self):
+        """Delete the remaining provider entries and wait for the deletions"""
+        for key, name in self.names.items():
+            self._delete_upstream(key, name)
+        self.names.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        names = self.names.stats()
+        return {
+            "entries": names["entries"],
+            "hits": names["hits"],
+            "misses": names["misses"],
+            "created": self.created,
+            "failures": self.failures,
+            "invalidations": self.invalidations,
+            "deleted": self.deleted,
+            "delete_failures": self.delete_failures,
+            "expirations": names["expirations"],
+            "unsupported": sorted(
+                f"{name}/{model}" for name, model in self.unsupported
+            ),
+        }
+
+
+@lru_cache()
+def get_context_cache() -> ContextCacheRegistry:
+    return ContextCacheRegistry()
@@ -0,0 +1,237 @@
+import json
+import os
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+settings = get_settings()
+logger = setup_logging()
+
+
+def join_pages(page_texts: List[str]) -> str:
+    """Join page texts into the document text served to the LLM"""
+    return "\n\n".join(text for text in page_texts if text)
+
+
+class DocumentStore(ABC):
+    """Storage backend for extracted PDF text and metadata"""
+
+    @abstractmethod
+    def save(self, doc_id: str, metadata: dict, page_texts: List[str]):
+        """Store a document's metadata and the text of each page"""
+
+    @abstractmethod
+    def load_metadata(self, doc_id: str) -> dict:
+        """Metadata without the text; FileNotFoundError if unknown"""
+
+    @abstractmethod
+    def load_text(self, doc_id: str) -> str:
+        """The whole document text, pages joined with join_pages"""
+
+    @abstractmethod
+    def load_page(self, doc_id: str, page_number: int) -> str:
+        """The text of one page (zero-based)"""
+
+    @abstractmethod
+    def exists(self, doc_id: str) -> bool:
+        """Whether the document is stored"""
+
+    @abstractmethod
+    def delete(self, doc_id: str):
+        """Remove the document if it is stored"""
+
+
+class JSONDocumentStore(DocumentStore):
+    """One JSON file per document holding metadata and text"""
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = Path(data_dir)
+
+    def _path(self, doc_id: str) -> Path:
+        return self.data_dir / f"{doc_id}.json"
+
+    def _load(self, doc_id: str) -> dict:
+        with open(self._path(doc_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, doc_id: str, metadata: dict, page_texts: List[str]):
+        content = {
+            **metadata,
+            "text_content": join_pages(page_texts),
+            "page_texts": page_texts,
+        }
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._path(doc_id), "w", encoding="utf-8") as f:
+            json.dump(content, f, default=str, ensure_ascii=False)
+
+    def load_metadata(self, doc_id: str) -> dict:
+        content = self._load(doc_id)
+        content.pop("text_content", None)
+        content.pop("page_texts", None)
+        return content
+
+    def load_text(self, doc_id: str) -> str:
+        return self._load(doc_id).get("text_content", "")
+
+    def load_page(self, doc_id: str, page_number: int) -> str:
+        content = self._load(doc_id)
+        # Files written before page_texts was stored only have the full text
+        page_texts = content.get("page_texts") or [content.get("text_content", "")]
+        return page_texts[page_number]
+
+    def exists(self, doc_id: str) -> bool:
+        return self._path(doc_id).exists()
+
+    def delete(self, doc_id: str):
+        self._path(doc_id).unlink(missing_ok=True)
+
+
+class BinaryDocumentStore(DocumentStore):
+    """Compressed binary document files with a metadata header and page offsets
+
+    Layout of ``{doc_id}.pdoc``::
+
+        header   magic, version, codec, metadata length, page count
+        metadata compact JSON, uncompressed
+        offsets  (page count + 1) little-endian uint64, relative to the pages
+        pages    each page compressed independently
+
+    Metadata-only reads never touch the page data, and a single page is
+    read and decompressed on its own.
+    """
+
+    MAGIC = b"PDOC"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBBxxII")
+    CODECS = {"none": 0, "zlib": 1, "zstd": 2}
+
+    def __init__(self, data_dir: Path, codec: Optional[str] = None):
+        self.data_dir = Path(data_dir)
+        if codec is None:
+            codec = (
+                settings.COMPRESSION_CODEC if settings.COMPRESSION_ENABLED else "none"
+            )
+        if codec == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, falling back to zlib")
+            codec = "zlib"
+        self.codec = self.CODECS[codec]
+        # Documents written before the binary format existed are still readable
+        self.legacy_store = JSONDocumentStore(data_dir)
+
+    def _path(self, doc_id: str) -> Path:
+        return self.data_dir / f"{doc_id}.pdoc"
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == self.CODECS["zstd"]:
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        if self.codec == self.CODECS["zlib"]:
+            return zlib.compress(data, 6)
+        return data
+
+    @classmethod
+    def _decompress(cls, codec: int, data: bytes) -> bytes:
+        if codec == cls.CODECS["zstd"]:
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this document")
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == cls.CODECS["zlib"]:
+            return zlib.decompress(data)
+        return data
+
+    def save(self, doc_id: str, metadata: dict, page_texts: List[str]):
+        meta_bytes = json.dumps(
+            metadata, default=str, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        frames = [self._compress(text.encode("utf-8")) for text in page_texts]
+        offsets = [0]
+        for frame in frames:
+            offsets.append(offsets[-1] + len(frame))
+
+        path = self._path(doc_id)
+        tmp_path = path.with_suffix(".tmp")
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(
+                self.HEADER.pack(
+                    self.MAGIC, self.VERSION, self.codec, len(meta_bytes), len(frames)
+                )
+            )
+            f.write(meta_bytes)
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            for frame in frames:
+                f.write(frame)
+        os.replace(tmp_path, path)
+
+    def _read_header(self, f):
+        magic, version, codec, meta_len, page_count = self.HEADER.unpack(
+            f.read(self.HEADER.size)
+        )
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Unrecognized document file format")
+        return codec, meta_len, page_count
+
+    def load_metadata(self, doc_id: str) -> dict:
+        if not self._path(doc_id).exists():
+            return self.legacy_store.load_metadata(doc_id)
+        with open(self._path(doc_id), "rb") as f:
+            _, meta_len, _ = self._read_header(f)
+            return json.loads(f.read(meta_len))
+
+    def load_pages(self, doc_id: str) -> List[str]:
+        """Read and decompress every page"""
+        with open(self._path(doc_id), "rb") as f:
+            codec, meta_len, page_count = self._read_header(f)
+            f.seek(meta_len, os.SEEK_CUR)
+            offsets = struct.unpack(f"<{page_count + 1}Q", f.read(8 * (page_count + 1)))
+            data = f.read(offsets[-1])
+        return [
+            self._decompress(codec, data[start:end]).decode("utf-8")
+            for start, end in zip(offsets, offsets[1:])
+        ]
+
+    def load_text(self, doc_id: str) -> str:
+        if not self._path(doc_id).exists():
+            return self.legacy_store.load_text(doc_id)
+        return join_pages(self.load_pages(doc_id))
+
+    def load_page(self, doc_id: str, page_number: int) -> str:
+        if not self._path(doc_id).exists():
+            return self.legacy_store.load_page(doc_id, page_number)
+        with open(self._path(doc_id), "rb") as f:
+            codec, meta_len, page_count = self._read_header(f)
+            if not 0 <= page_number < page_count:
+                raise IndexError(f"Page {page_number} out of range")
+            offsets_start = self.HEADER.size + meta_len
+            f.seek(offsets_start + 8 * page_number)
+            start, end = struct.unpack("<2Q", f.read(16))
+            f.seek(offsets_start + 8 * (page_count + 1) + start)
+            return self._decompress(codec, f.read(end - start)).decode("utf-8")
+
+    def exists(self, doc_id: str) -> bool:
+        return self._path(doc_id).exists() or self.legacy_store.exists(doc_id)
+
+    def delete(self, doc_id: str):
+        self._path(doc_id).unlink(missing_ok=True)
+        self.legacy_store.delete(doc_id)
+
+
+@lru_cache()
+def get_document_store() -> DocumentStore:
+    """Create the document store selected by STORAGE_TYPE"""
+    data_dir = Path("data")
+    data_dir.mkdir(parents=True, exist_ok=True)
+    if settings.STORAGE_TYPE == "json":
+        return JSONDocumentStore(data_dir)
+    if settings.STORAGE_TYPE in ("local", "binary"):
+        return BinaryDocumentStore(data_dir)
+    raise ValueError(f"Unsupported STORAGE_TYPE: {settings.STORAGE_TYPE}")
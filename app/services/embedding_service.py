@@ -1,32 +1,89 @@
+import sys
 import typing
-from typing import List, Dict
+import numpy as np
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 from ..core.config import get_settings
 from ..core.logging import setup_logging
+from .ann_index import get_corpus_index
+from .chunk_store import ChunkStore
+from .search_index import BM25Index
+from .vectorizer import HashingVectorizer, top_k
+from ..utils.cache import LRUCache
+from ..utils.chunking import CHARS_PER_TOKEN, TextChunks, chunk_text, pack_excerpts
 
 settings = get_settings()
 logger = setup_logging()
 
+RETRIEVAL_METHODS = ("bm25", "dense")
+
+
+def document_nbytes(doc_data: Dict) -> int:
+    """Approximate heap bytes held by a cached document
+
+    Memory-mapped chunks and vectors live in the page cache, so they only
+    count when the document was processed in this worker.
+    """
+    size = 0
+    chunks = doc_data["chunks"]
+    if isinstance(chunks, TextChunks):
+        # Each span is a tuple of two ints plus its list slot
+        size += sys.getsizeof(chunks.text) + 72 * len(chunks.spans)
+    for key in ("vectors", "idf"):
+        array = doc_data[key]
+        if not isinstance(array, np.memmap):
+            size += array.nbytes
+    if doc_data["index"] is not None:
+        size += doc_data["index"].nbytes
+    return size
+
+
+@lru_cache()
+def get_document_cache() -> LRUCache:
+    """Process-wide cache of documents shared by every EmbeddingService"""
+    return LRUCache(settings.CACHE_MAX_BYTES, settings.CACHE_TTL, document_nbytes)
+
 
 class EmbeddingService:
-    def __init__(self):
-        self.chunk_size = settings.EMBEDDING_CHUNK_SIZE
-        self.embeddings_cache = {}
+    def __init__(self, cache: Optional[LRUCache] = None):
+        self.max_tokens = settings.CHUNK_MAX_TOKENS
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS
+        self.embeddings_cache = cache if cache is not None else get_document_cache()
+        self.vectorizer = HashingVectorizer()
+        self.chunk_store = ChunkStore()
+        self.corpus_index = get_corpus_index() if settings.ANN_ENABLED else None
 
     def process_document(
-        self, pdf_id: str, text_content: str, chunk_size: int = 500
+        self, pdf_id: str, text_content: str, max_tokens: Optional[int] = None
     ) -> int:
         """Process document text into chunks and cache"""
         try:
-            # Split text into chunks
-            chunks = self._split_text(text_content, chunk_size)
+            # Split text into chunk offsets; chunk strings are sliced on demand
+            chunks = chunk_text(
+                text_content,
+                max_tokens or self.max_tokens,
+                self.overlap_tokens,
+                settings.CHUNK_SNAP_TO_SENTENCE,
+            )
             chunk_count = len(chunks)
 
-            # Store in cache
-            self.embeddings_cache[pdf_id] = {
-                "chunks": chunks,
-                "total_chunks": chunk_count,
-            }
+            # Store in cache along with the chunks' inverted index and vectors
+            vectors, idf = self.vectorizer.fit_transform(chunks)
+            bm25 = BM25Index.build(chunks)
+            self.chunk_store.save(pdf_id, chunks, vectors, idf, bm25)
+            if self.corpus_index is not None:
+                self.corpus_index.add(pdf_id, vectors, idf)
+            self.embeddings_cache.put(
+                pdf_id,
+                {
+                    "chunks": chunks,
+                    "total_chunks": chunk_count,
+                    "index": bm25,
+                    "vectors": vectors,
+                    "idf": idf,
+                },
+            )
 
             logger.info(f"Processed document {pdf_id} into {chunk_count} chunks")
             return chunk_count
@@ -34,80 +91,189 @@ class EmbeddingService:
             logger.error(f"Error processing document: {str(e)}")
             return 0
 
-    def query_document(self, pdf_id: str, query: str, n_results: int = 3) -> List[str]:
+    def query_document(
+        self,
+        pdf_id: str,
+        query: str,
+        n_results: int = 3,
+        method: Optional[str] = None,
+    ) -> List[str]:
         """Get most relevant chunks for a query"""
         try:
-            if pdf_id not in self.embeddings_cache:
+            doc_data = self._get_document(pdf_id)
+            if doc_data is None:
                 logger.error(f"Document {pdf_id} not found in cache")
                 return []
 
-            doc_data = self.embeddings_cache[pdf_id]
             chunks = doc_data["chunks"]
+            results = self.search_document(pdf_id, query, n_results, method)
+            return [chunks[chunk_id] for _, chunk_id in results]
 
-            # Simple keyword matching for now
-            relevant_chunks = []
-            query_terms = query.lower().split()
+        except Exception as e:
+            logger.error(f"Error querying document: {str(e)}")
+            return []
 
-            for chunk in chunks:
-                if any(term in chunk.lower() for term in query_terms):
-                    relevant_chunks.append(chunk)
+    def query_excerpts(
+        self,
+        pdf_id: str,
+        query: str,
+        max_tokens: int,
+        n_results: int = 3,
+        method: Optional[str] = None,
+    ) -> List[str]:
+        """The best of the top chunks that fit within max_tokens, as excerpts
 
-            # Return top N chunks or all if less than N
-            return relevant_chunks[:n_results]
+        Overlapping chunks are merged and excerpts come in document order. A
+        budget smaller than any chunk still gets the best one, truncated.
+        """
+        try:
+            doc_data = self._get_document(pdf_id)
+            if doc_data is None:
+                logger.error(f"Document {pdf_id} not found in cache")
+                return []
+
+            chunks = doc_data["chunks"]
+            chunk_ids = [
+                chunk_id
+                for _, chunk_id in self.search_document(
+                    pdf_id, query, n_results, method
+                )
+            ]
+            if not chunk_ids:
+                return []
+            excerpts = pack_excerpts(chunks, chunk_ids, max_tokens)
+            logger.debug(
+                f"Packed {len(chunk_ids)} chunks into {len(excerpts)} excerpts"
+                f" for {pdf_id}"
+            )
+            return excerpts or [chunks[chunk_ids[0]][: max_tokens * CHARS_PER_TOKEN]]
 
         except Exception as e:
             logger.error(f"Error querying document: {str(e)}")
             return []
 
+    def search_document(
+        self,
+        pdf_id: str,
+        query: str,
+        n_results: int = 3,
+        method: Optional[str] = None,
+        idf: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[float, int]]:
+        """Rank a cached document's chunks, returning ``(score, chunk_id)`` pairs
+
+        ``idf`` gives BM25 term weights shared across documents (see
+        ``bm25_doc_freqs``).
+        """
+        method = method or settings.RETRIEVAL_METHOD
+        if method not in RETRIEVAL_METHODS:
+            raise ValueError(f"Unknown retrieval method: {method}")
+
+        doc_data = self._get_document(pdf_id)
+        if doc_data is None:
+            return []
+
+        if method == "dense":
+            # One matrix-vector product scores every chunk
+            query_vector = self.vectorizer.transform_query(query, doc_data["idf"])
+            return top_k(doc_data["vectors"] @ query_vector, n_results)
+
+        # BM25 over the document's inverted index
+        return self._bm25_index(pdf_id, doc_data).search(query, n_results, idf)
+
+    def bm25_doc_freqs(self, pdf_id: str, query: str) -> Tuple[int, Dict[str, int]]:
+        """A document's chunk count and how many chunks hold each query term"""
+        doc_data = self._get_document(pdf_id)
+        if doc_data is None:
+            return 0, {}
+        index = self._bm25_index(pdf_id, doc_data)
+        return index.total_chunks, index.doc_freqs(query)
+
+    def _bm25_index(self, pdf_id: str, doc_data: Dict) -> BM25Index:
+        if doc_data["index"] is None:
+            # Saved without an index (or with other BM25 parameters): build
+            # it once and persist it for every worker and later restarts
+            doc_data["index"] = self.chunk_store.save_bm25(
+                pdf_id, BM25Index.build(doc_data["chunks"])
+            )
+            # Re-put so the cache accounts for the index it now holds
+            self.embeddings_cache.put(pdf_id, doc_data)
+        return doc_data["index"]
+
+    def preload(self, pdf_id: str, method: Optional[str] = None) -> bool:
+        """Bring a document and its index into the cache ahead of queries"""
+        doc_data = self._get_document(pdf_id)
+        if doc_data is None:
+            return False
+        if (method or settings.RETRIEVAL_METHOD) == "bm25":
+            self._bm25_index(pdf_id, doc_data)
+        return True
+
+    def get_chunk(self, pdf_id: str, chunk_id: int) -> str:
+        """Get the text of one chunk"""
+        doc_data = self._get_document(pdf_id)
+        if doc_data is None:
+            raise KeyError(pdf_id)
+        return doc_data["chunks"][chunk_id]
+
+    def list_documents(self) -> List[str]:
+        """Ids of every document with persisted chunks"""
+        return self.chunk_store.list_documents()
+
+    def search_corpus(
+        self, query: str, n_results: int = 10, nprobe: Optional[int] = None
+    ) -> List[Tuple[float, str, int]]:
+        """Approximate top-k over every document's chunk vectors
+
+        Returns ``(score, pdf_id, chunk_id)`` triples. The query is vectorized
+        without IDF weights; the index weights it with the same corpus-level
+        IDF its vectors carry.
+        """
+        if self.corpus_index is None:
+            raise ValueError("The corpus ANN index is disabled")
+        query_vector = self.vectorizer.transform_query(
+            query, np.ones(self.vectorizer.dim, dtype=np.float32)
+        )
+        return self.corpus_index.search(query_vector, n_results, nprobe)
+
+    def _get_document(self, pdf_id: str) -> Optional[Dict]:
+        """Get a document's cached data, mapping it from disk if needed"""
+        return self.embeddings_cache.get(pdf_id, self._load_document)
+
+    def _load_document(self, pdf_id: str) -> Optional[Dict]:
+        mapped = self.chunk_store.open(pdf_id)
+        if mapped is None:
+            return None
+
+        doc_data = {
+            "chunks": mapped,
+            "total_chunks": len(mapped),
+            "index": mapped.bm25,
+            "vectors": mapped.vectors,
+            "idf": mapped.idf,
+        }
+        logger.debug(f"Mapped document {pdf_id} from {mapped.path}")
+        return doc_data
+
     def handle_long_text(self, text: str, max_tokens: int = 8196) -> List[str]:
         """Handle text exceeding token limit"""
-        chunks = self._split_text(text, self.chunk_size)
-        processed_chunks = []
-        current_chunk = ""
-        current_tokens = 0
-
-        for chunk in chunks:
-            chunk_tokens = len(chunk.split())
-            if current_tokens + chunk_tokens > max_tokens:
-                processed_chunks.append(current_chunk)
-                current_chunk = chunk
-                current_tokens = chunk_tokens
-            else:
-                current_chunk += "\n" + chunk if current_chunk else chunk
-                current_tokens += chunk_tokens
-
-        if current_chunk:
-            processed_chunks.append(current_chunk)
-
-        return processed_chunks
-
-    def _split_text(self, text: str, chunk_size: int) -> List[str]:
-        """Split text into chunks of approximately equal size"""
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-
-        for word in words:
-            current_size += len(word) + 1  # +1 for space
-            if current_size > chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [word]
-                current_size = len(word)
-            else:
-                current_chunk.append(word)
-
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
+        return list(chunk_text(text, max_tokens))
+
+    def remove_document(self, pdf_id: str):
+        """Drop a document's chunks from the cache and disk"""
+        self.embeddings_cache.pop(pdf_id, None)
+        self.chunk_store.delete(pdf_id)
+        if self.corpus_index is not None:
+            self.corpus_index.remove(pdf_id)
 
     def get_cache_stats(self) -> Dict:
         """Get statistics about cached embeddings"""
+        documents = self.embeddings_cache.items()
         return {
-            "total_documents": len(self.embeddings_cache),
+            "total_documents": len(documents),
             "documents": {
                 pdf_id: {"total_chunks": data["total_chunks"]}
-                for pdf_id, data in self.embeddings_cache.items()
+                for pdf_id, data in documents
             },
+            "cache": self.embeddings_cache.stats(),
         }
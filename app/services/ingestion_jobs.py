@@ -0,0 +1,149 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+
+settings = get_settings()
+logger = setup_logging()
+
+
+class IngestionJob:
+    """Progress of a single background PDF ingestion
+
+    Stages: queued -> extracting -> indexing -> ready, or failed.
+    """
+
+    def __init__(self, pdf_id: str, filename: str):
+        self.pdf_id = pdf_id
+        self.filename = filename
+        self.stage = "queued"
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.updated_at = self.created_at
+        self.timings: Dict[str, float] = {}
+        self._stage_started = time.perf_counter()
+        self._created = self._stage_started
+
+    def set_stage(self, stage: str, error: Optional[str] = None):
+        """Move to a new stage, recording how long the previous one took"""
+        now = time.perf_counter()
+        self.timings[self.stage] = round(now - self._stage_started, 4)
+        if stage in ("ready", "failed"):
+            self.timings["total"] = round(now - self._created, 4)
+        self.stage = stage
+        self.error = error
+        self.updated_at = datetime.utcnow()
+        self._stage_started = now
+
+    def to_dict(self) -> dict:
+        return {
+            "pdf_id": self.pdf_id,
+            "job_id": self.pdf_id,
+            "filename": self.filename,
+            "status": self.stage,
+            "error": self.error,
+            "timings": self.timings,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class IngestionQueue:
+    """Bounded queue of PDF ingestion jobs drained by a fixed set of workers"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        history_size: Optional[int] = None,
+    ):
+        self.workers = workers or settings.INGESTION_WORKERS
+        self.max_queued = max_queued or settings.INGESTION_MAX_QUEUED
+        self.history_size = history_size or settings.INGESTION_JOB_HISTORY
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_workers(self):
+        """Start the workers on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} PDF ingestion workers")
+
+    async def submit(
+        self,
+        pdf_id: str,
+        filename: str,
+        process: Callable[[IngestionJob], Awaitable],
+    ) -> IngestionJob:
+        """Queue ``process(job)`` to run in the background"""
+        self._ensure_workers()
+        job = IngestionJob(pdf_id, filename)
+        try:
+            self._queue.put_nowait((job, process))
+        except asyncio.QueueFull:
+            logger.warning(f"Ingestion queue full, rejecting PDF {pdf_id}")
+            raise HTTPException(
+                status_code=503,
+                detail="Too many PDFs are being processed, please retry later",
+                headers={"Retry-After": "10"},
+            )
+
+        self.jobs[pdf_id] = job
+        while len(self.jobs) > self.history_size:
+            self.jobs.popitem(last=False)
+
+        logger.info(f"Queued ingestion job for PDF {pdf_id}")
+        return job
+
+    def get(self, pdf_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(pdf_id)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job, process = await self._queue.get()
+            try:
+                await process(job)
+                job.set_stage("ready")
+                logger.info(
+                    f"Ingestion worker {worker_id} finished PDF {job.pdf_id} "
+                    f"in {job.timings['total']}s"
+                )
+            except asyncio.CancelledError:
+                job.set_stage("failed", "Server shut down before processing finished")
+                raise
+            except HTTPException as e:
+                job.set_stage("failed", str(e.detail))
+                logger.error(f"Ingestion of PDF {job.pdf_id} failed: {e.detail}")
+            except Exception as e:
+                job.set_stage("failed", str(e))
+                logger.error(f"Ingestion of PDF {job.pdf_id} failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def shutdown(self):
+        """Cancel the workers"""
+        for task in self._tasks:
+            task.cancel()
+        if self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        logger.info("PDF ingestion workers stopped")
+
+
+@lru_cache()
+def get_ingestion_queue() -> IngestionQueue:
+    return IngestionQueue()
@@ -0,0 +1,288 @@
+import asyncio
+import datetime
+import hashlib
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.generativeai.client import get_default_cache_client
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+
+settings = get_settings()
+logger = setup_logging()
+
+# Errors for a cached context the provider does not accept (or no longer has)
+CONTEXT_REJECTED = (
+    google_exceptions.InvalidArgument,
+    google_exceptions.NotFound,
+    google_exceptions.PermissionDenied,
+)
+
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 1024,
+}
+
+
+class LLMBackendError(Exception):
+    """A model call failed; ``retryable`` tells whether trying again may help"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class LLMBackend(ABC):
+    """A text generation model
+
+    ``generate`` blocks and is run on the LLM call pool's threads;
+    ``stream`` is async and yields the answer as it is produced.
+
+    Backends with ``supports_context_cache`` can register a long context
+    once with ``create_context_cache`` and answer prompts against it by
+    passing the returned name as ``cached_context``, until it expires or is
+    dropped with ``delete_context_cache``.
+    """
+
+    name = "base"
+    model_name = ""
+    supports_context_cache = False
+
+    @abstractmethod
+    def generate(self, prompt: str, cached_context: Optional[str] = None) -> str:
+        """The whole answer, once it is complete"""
+
+    @abstractmethod
+    def stream(
+        self, prompt: str, cached_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """An async generator of the answer's text pieces"""
+
+    def create_context_cache(self, context: str, ttl: float) -> str:
+        """Register a context with the provider, returning its name"""
+        raise LLMBackendError("Context caching is not supported", retryable=False)
+
+    def delete_context_cache(self, name: str):
+        """Drop a registered context from the provider before it expires"""
+        raise LLMBackendError("Context caching is not supported", retryable=False)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google.generativeai SDK"""
+
+    name = "gemini"
+    supports_context_cache = True
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or settings.LLM_MODEL
+        # Lets the SDK give up, so a timed-out call frees its thread
+        self.request_options = {"timeout": settings.LLM_ATTEMPT_TIMEOUT}
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def _model_for(self, cached_context: Optional[str]) -> genai.GenerativeModel:
+        if cached_context is None:
+            return self.model
+        return genai.GenerativeModel.from_cached_content(cached_context)
+
+    def create_context_cache(self, context: str, ttl: float) -> str:
+        try:
+            cached = genai.caching.CachedContent.create(
+                model=self.model_name,
+                contents=[context],
+                ttl=datetime.timedelta(seconds=ttl),
+            )
+        except CONTEXT_REJECTED as e:
+            # e.g. a model without context caching, or a context too short
+            raise LLMBackendError(str(e), retryable=False)
+        except google_exceptions.GoogleAPIError as e:
+            raise LLMBackendError(str(e))
+        return cached.name
+
+    def delete_context_cache(self, name: str):
+        try:
+            get_default_cache_client().delete_cached_content(
+                genai.protos.DeleteCachedContentRequest(name=name),
+                timeout=settings.LLM_ATTEMPT_TIMEOUT,
+            )
+        except google_exceptions.NotFound:
+            pass  # Already expired
+        except google_exceptions.GoogleAPIError as e:
+            raise LLMBackendError(str(e))
+
+    def generate(self, prompt: str, cached_context: Optional[str] = None) -> str:
+        try:
+            response = self._model_for(cached_context).generate_content(
+                prompt,
+                generation_config=GENERATION_CONFIG,
+                request_options=self.request_options,
+            )
+        except CONTEXT_REJECTED as e:
+            if cached_context is None:
+                raise
+            raise LLMBackendError(str(e), retryable=False)
+        return response.text
+
+    async def stream(
+        self, prompt: str, cached_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        try:
+            response = await self._model_for(cached_context).generate_content_async(
+                prompt,
+                generation_config=GENERATION_CONFIG,
+                stream=True,
+                request_options=self.request_options,
+            )
+        except CONTEXT_REJECTED as e:
+            if cached_context is None:
+                raise
+            raise LLMBackendError(str(e), retryable=False)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend(LLMBackend):
+    """Local stand-in that answers without the network, for load tests
+
+    The answer is derived from the prompt, so the same prompt always gets
+    the same text. Time to first token follows a ``fixed``, ``uniform`` or
+    ``lognormal`` distribution around ``latency_ms``; the rest of the
+    answer arrives at ``tokens_per_second`` (0 for instant). A fraction
+    ``error_rate`` of calls fail with a retryable LLMBackendError, and so
+    do calls that would take longer than ``request_timeout``.
+
+    Cached contexts are kept in memory until their TTL passes, and answers
+    against one match the answer to the context and prompt sent together.
+    """
+
+    name = "fake"
+    model_name = "fake"
+    supports_context_cache = True
+
+    def __init__(
+        self,
+        latency_ms: Optional[float] = None,
+        distribution: Optional[str] = None,
+        spread: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        response_tokens: Optional[int] = None,
+        error_rate: Optional[float] = None,
+        seed: Optional[int] = None,
+        request_timeout: Optional[float] = None,
+    ):
+        self.latency_ms = (
+            settings.FAKE_LLM_LATENCY_MS if latency_ms is None else latency_ms
+        )
+        self.distribution = distribution or settings.FAKE_LLM_LATENCY_DISTRIBUTION
+        if self.distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        self.spread = settings.FAKE_LLM_LATENCY_SPREAD if spread is None else spread
+        self.tokens_per_second = (
+            settings.FAKE_LLM_TOKENS_PER_SECOND
+            if tokens_per_second is None
+            else tokens_per_second
+        )
+        self.response_tokens = response_tokens or settings.FAKE_LLM_RESPONSE_TOKENS
+        self.error_rate = (
+            settings.FAKE_LLM_ERROR_RATE if error_rate is None else error_rate
+        )
+        self._random = random.Random(settings.FAKE_LLM_SEED if seed is None else seed)
+        self.request_timeout = request_timeout or settings.LLM_ATTEMPT_TIMEOUT
+        # name -> (context, expires_at)
+        self.cached_contexts: Dict[str, Tuple[str, float]] = {}
+
+    def sample_latency(self) -> float:
+        """Seconds until the first token"""
+        latency = self.latency_ms / 1000
+        if self.distribution == "uniform":
+            latency *= self._random.uniform(1 - self.spread, 1 + self.spread)
+        elif self.distribution == "lognormal":
+            latency *= self._random.lognormvariate(0, self.spread)
+        return max(0.0, latency)
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _maybe_fail(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise LLMBackendError("Injected failure from the fake LLM backend")
+
+    def answer_tokens(self, prompt: str) -> List[str]:
+        """The deterministic answer to a prompt, split into tokens"""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = re.findall(r"\w+", prompt) or ["empty"]
+        picker = random.Random(digest)
+        tokens = [f"[{self.name}:{digest[:8]}]"] + [
+            picker.choice(words) for _ in range(self.response_tokens - 1)
+        ]
+        return [token + " " for token in tokens[:-1]] + tokens[-1:]
+
+    def create_context_cache(self, context: str, ttl: float) -> str:
+        name = "cachedContents/" + hashlib.sha256(context.encode("utf-8")).hexdigest()
+        self.cached_contexts[name] = (context, time.monotonic() + ttl)
+        return name
+
+    def delete_context_cache(self, name: str):
+        self.cached_contexts.pop(name, None)
+
+    def _full_prompt(self, prompt: str, cached_context: Optional[str]) -> str:
+        if cached_context is None:
+            return prompt
+        context, expires_at = self.cached_contexts.get(cached_context, ("", 0.0))
+        if expires_at <= time.monotonic():
+            self.cached_contexts.pop(cached_context, None)
+            raise LLMBackendError(
+                f"Cached content not found: {cached_context}", retryable=False
+            )
+        return context + prompt
+
+    def generate(self, prompt: str, cached_context: Optional[str] = None) -> str:
+        self._maybe_fail()
+        tokens = self.answer_tokens(self._full_prompt(prompt, cached_context))
+        duration = self.sample_latency() + self._token_delay() * (len(tokens) - 1)
+        self._sleep_within_deadline(duration)
+        return "".join(tokens)
+
+    def _sleep_within_deadline(self, seconds: float):
+        if seconds > self.request_timeout:
+            time.sleep(self.request_timeout)
+            raise LLMBackendError("The fake LLM backend timed out")
+        time.sleep(seconds)
+
+    async def stream(
+        self, prompt: str, cached_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        self._maybe_fail()
+        prompt = self._full_prompt(prompt, cached_context)
+        latency = self.sample_latency()
+        if latency > self.request_timeout:
+            await asyncio.sleep(self.request_timeout)
+            raise LLMBackendError("The fake LLM backend timed out")
+        await asyncio.sleep(latency)
+        for i, token in enumerate(self.answer_tokens(prompt)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            yield token
+
+
+LLM_BACKENDS = {"gemini": GeminiBackend, "fake": FakeBackend}
+
+
+@lru_cache()
+def get_llm_backend() -> LLMBackend:
+    """The backend selected by the LLM_BACKEND setting"""
+    try:
+        backend_class = LLM_BACKENDS[settings.LLM_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown LLM backend: {settings.LLM_BACKEND}")
+    backend = backend_class()
+    logger.info(f"Using {backend.name} LLM backend ({backend.model_name})")
+    return backend
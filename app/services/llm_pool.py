@@ -0,0 +1,190 @@
+import asyncio
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import AsyncIterator, Callable, Optional
+from fastapi import HTTPException
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+
+settings = get_settings()
+logger = setup_logging()
+
+
+class LLMCallPool:
+    """Admission control for model calls
+
+    At most ``max_concurrent`` calls run at once and up to ``max_waiting``
+    more wait (for no longer than ``queue_timeout``) for a slot. Anything
+    beyond that is rejected with 503 and Retry-After, so a slow model backs
+    requests up instead of taking the whole API down. Blocking SDK calls
+    run on a dedicated thread pool, never on the event loop. A call whose
+    caller stopped waiting keeps its slot until its thread returns, and is
+    counted as ``abandoned`` meanwhile.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_waiting: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.max_concurrent = max_concurrent or settings.LLM_MAX_CONCURRENT
+        self.max_waiting = (
+            settings.LLM_MAX_WAITING if max_waiting is None else max_waiting
+        )
+        self.queue_timeout = queue_timeout or settings.LLM_QUEUE_TIMEOUT
+        self.timeout = timeout or settings.LLM_TIMEOUT
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.abandoned = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """The slot semaphore for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self.in_flight = self.waiting = self.abandoned = 0
+        return self._semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent, thread_name_prefix="llm"
+            )
+        return self._executor
+
+    def _busy(self) -> HTTPException:
+        self.rejected += 1
+        logger.warning(
+            f"LLM call rejected: {self.in_flight} in flight, {self.waiting} waiting"
+        )
+        return HTTPException(
+            status_code=503,
+            detail="The model is busy with other requests, please retry later",
+            headers={"Retry-After": str(max(1, round(self.queue_timeout)))},
+        )
+
+    async def acquire(self) -> Callable[[], None]:
+        """Wait for a call slot, returning an idempotent release function"""
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            if self.waiting >= self.max_waiting:
+                raise self._busy()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._busy()
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        self.in_flight += 1
+
+        released = False
+
+        def release():
+            nonlocal released
+            # A slot taken on an earlier event loop belongs to a dead semaphore
+            if not released and self._semaphore is semaphore:
+                released = True
+                self.in_flight -= 1
+                semaphore.release()
+
+        return release
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run a blocking call on the pool's threads and await its result"""
+        release = await self.acquire()
+        loop = asyncio.get_running_loop()
+        future = self._get_executor().submit(partial(func, *args, **kwargs))
+        abandoned = False
+
+        def finish():
+            if abandoned and self._semaphore is semaphore:
+                self.abandoned -= 1
+            release()
+
+        def on_done(_):
+            # The slot is held until the thread is actually free again
+            try:
+                loop.call_soon_threadsafe(finish)
+            except RuntimeError:
+                pass  # The event loop has already closed
+
+        def abandon():
+            nonlocal abandoned
+            if not future.done():
+                abandoned = True
+                self.abandoned += 1
+
+        semaphore = self._semaphore
+        future.add_done_callback(on_done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            abandon()
+            logger.error(f"LLM call timed out after {self.timeout}s")
+            raise HTTPException(
+                status_code=504, detail="Timed out waiting for the model"
+            )
+        except asyncio.CancelledError:
+            abandon()
+            raise
+
+    async def wait_for_abandoned(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for abandoned calls to return"""
+        deadline = time.monotonic() + timeout
+        while self.abandoned and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return not self.abandoned
+
+    async def open_stream(self, stream: AsyncIterator) -> AsyncIterator:
+        """Take a slot, then return ``stream`` wrapped to hold it while open
+
+        Admission happens before the first item, so callers can reject a
+        request with 503 before they start sending a response.
+        """
+        release = await self.acquire()
+
+        async def holding_slot():
+            try:
+                async for item in stream:
+                    yield item
+            finally:
+                release()
+                await stream.aclose()
+
+        wrapped = holding_slot()
+        # Frees the slot even if the stream is dropped without being iterated
+        weakref.finalize(wrapped, release)
+        return wrapped
+
+    def get_stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "abandoned": self.abandoned,
+        }
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("LLM call pool shut down")
+
+
+@lru_cache()
+def get_llm_call_pool() -> LLMCallPool:
+    return LLMCallPool()
@@ -0,0 +1,380 @@
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Optional
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+from .llm_backends import LLMBackendError
+from .llm_pool import LLMCallPool, get_llm_call_pool
+
+settings = get_settings()
+logger = setup_logging()
+
+# Upstream statuses worth trying again: timeouts, rate limits, server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed model call may succeed if tried again"""
+    if isinstance(error, LLMBackendError):
+        return error.retryable
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if isinstance(error, HTTPException):
+        # 504 is the call pool's own deadline; 503 means we are overloaded
+        return error.status_code == 504
+    if isinstance(error, google_exceptions.GoogleAPICallError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return False
+
+
+class CircuitBreaker:
+    """Fails model calls fast while the upstream looks unhealthy
+
+    After ``failure_threshold`` consecutive retryable failures the circuit
+    opens and calls are rejected with 503 for ``reset_timeout`` seconds.
+    Then one trial call is let through (half open): success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+    ):
+        self.failure_threshold = (
+            failure_threshold or settings.LLM_BREAKER_FAILURE_THRESHOLD
+        )
+        self.reset_timeout = (
+            settings.LLM_BREAKER_RESET_TIMEOUT
+            if reset_timeout is None
+            else reset_timeout
+        )
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trial_started: Optional[float] = None
+
+    def check(self):
+        """Raise 503 unless a call may go upstream now"""
+        if self.state == "open":
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="The model backend is unavailable, please retry later",
+                    headers={"Retry-After": str(max(1, math.ceil(remaining)))},
+                )
+            self.state = "half_open"
+        if self.state == "half_open":
+            now = time.monotonic()
+            # A trial abandoned without a verdict stops blocking after a while
+            if (
+                self._trial_started is not None
+                and now - self._trial_started < self.reset_timeout
+            ):
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="The model backend is recovering, please retry later",
+                    headers={"Retry-After": "1"},
+                )
+            self._trial_started = now
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("Model backend recovered, closing circuit breaker")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_started = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_started = None
+        if (
+            self.state == "half_open"
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            if self.state != "open":
+                self.opened += 1
+                logger.error(
+                    f"Opening circuit breaker after {self.consecutive_failures} "
+                    "consecutive model call failures"
+                )
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a trial slot whose call ended without a verdict"""
+        self._trial_started = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """Latencies of the last ``window`` successful calls"""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class ResilientLLMCaller:
+    """Deadlines, retries, hedging and a circuit breaker around model calls
+
+    Each attempt gets ``attempt_timeout`` seconds. Retryable failures (see
+    ``is_retryable``) are tried again up to ``max_retries`` times after a
+    jittered exponential backoff. With hedging on, a call still running
+    past the recent p``hedge_percentile`` latency gets a second, identical
+    request and the first answer wins. Streams are retried only until
+    their first token; they are not hedged.
+
+    Blocking calls cannot be interrupted, so backends are given the same
+    deadline and a timed-out or losing call still holds its call pool slot
+    until its thread returns. No retry or hedge is sent while such
+    abandoned calls are outstanding, so a hung upstream cannot fill the
+    pool with duplicates.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[LLMCallPool] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        attempt_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None,
+        abandoned_wait: Optional[float] = None,
+    ):
+        self.pool = pool or get_llm_call_pool()
+        self.breaker = breaker or CircuitBreaker()
+        self.attempt_timeout = attempt_timeout or settings.LLM_ATTEMPT_TIMEOUT
+        self.max_retries = (
+            settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.backoff = settings.LLM_RETRY_BACKOFF if backoff is None else backoff
+        self.backoff_max = backoff_max or settings.LLM_RETRY_BACKOFF_MAX
+        self.hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_percentile = hedge_percentile or settings.LLM_HEDGE_PERCENTILE
+        self.hedge_min_samples = (
+            settings.LLM_HEDGE_MIN_SAMPLES
+            if hedge_min_samples is None
+            else hedge_min_samples
+        )
+        self.abandoned_wait = (
+            settings.LLM_ABANDONED_WAIT if abandoned_wait is None else abandoned_wait
+        )
+        self.latencies = LatencyTracker(settings.LLM_LATENCY_WINDOW)
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _backoff_delay(self, retry: int) -> float:
+        """Full jitter: anywhere up to the exponential backoff for this retry"""
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2**retry))
+
+    def _record_failure(self, error: BaseException):
+        if isinstance(error, asyncio.TimeoutError):
+            self.timeouts += 1
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            # The request was bad, not the upstream
+            self.breaker.release()
+
+    def _final_error(self, error: BaseException) -> BaseException:
+        self.failures += 1
+        if isinstance(error, asyncio.TimeoutError):
+            return HTTPException(
+                status_code=504, detail="Timed out waiting for the model"
+            )
+        if isinstance(error, google_exceptions.GoogleAPICallError):
+            return LLMBackendError(str(error), retryable=is_retryable(error))
+        return error
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run a blocking model call on the call pool, with retries"""
+        self.calls += 1
+        for retry in range(self.max_retries + 1):
+            self.breaker.check()
+            try:
+                result = await asyncio.wait_for(
+                    self._attempt(func, args, kwargs), self.attempt_timeout
+                )
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                self._record_failure(e)
+                if not is_retryable(e) or retry == self.max_retries:
+                    raise self._final_error(e)
+                if not await self.pool.wait_for_abandoned(self.abandoned_wait):
+                    logger.warning(
+                        f"Not retrying: {self.pool.abandoned} timed-out model "
+                        "calls still hold call pool slots"
+                    )
+                    raise self._final_error(e)
+                self.retries += 1
+                delay = self._backoff_delay(retry)
+                logger.warning(
+                    f"Model call failed ({type(e).__name__}: {str(e)}), "
+                    f"retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def hedge_after(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None if it is not"""
+        if not self.hedge or len(self.latencies.samples) < self.hedge_min_samples:
+            return None
+        if self.pool.abandoned:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    async def _attempt(self, func: Callable, args: tuple, kwargs: dict):
+        started = time.perf_counter()
+        self.attempts += 1
+        primary = asyncio.ensure_future(self.pool.run(func, *args, **kwargs))
+        tasks = [primary]
+        try:
+            threshold = self.hedge_after()
+            if threshold is not None:
+                done, _ = await asyncio.wait({primary}, timeout=threshold)
+                # Re-check: a call may have been abandoned while waiting
+                if not done and not self.pool.abandoned:
+                    self.hedges += 1
+                    tasks.append(
+                        asyncio.ensure_future(self.pool.run(func, *args, **kwargs))
+                    )
+            result = await self._first_success(tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled calls register as abandoned before any retry
+            await asyncio.wait(tasks)
+        self.latencies.record(time.perf_counter() - started)
+        return result
+
+    async def _first_success(self, tasks: list):
+        """Result of the first task to succeed, else the first one's error"""
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        self.hedge_wins += 1
+                    return task.result()
+                if task is tasks[0] or error is None:
+                    error = task.exception()
+        raise error
+
+    async def open_stream(
+        self, open_stream: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        """Take a call pool slot (or raise 503) for a resilient stream
+
+        ``open_stream`` is called again for each attempt. Open circuits and
+        a full pool are reported here, before anything is streamed.
+        """
+        self.calls += 1
+        self.breaker.check()
+        try:
+            return await self.pool.open_stream(self._stream(open_stream))
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    async def _stream(
+        self, open_stream: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        for retry in range(self.max_retries + 1):
+            if retry:
+                self.breaker.check()
+            self.attempts += 1
+            started = time.perf_counter()
+            stream = open_stream()
+            try:
+                # The deadline covers the wait for the first token
+                first = await asyncio.wait_for(stream.__anext__(), self.attempt_timeout)
+            except StopAsyncIteration:
+                self.breaker.record_success()
+                return
+            except Exception as e:
+                await stream.aclose()
+                self._record_failure(e)
+                if not is_retryable(e) or retry == self.max_retries:
+                    raise self._final_error(e)
+                self.retries += 1
+                await asyncio.sleep(self._backoff_delay(retry))
+                continue
+            except BaseException:
+                # Cancelled while waiting: no verdict on the upstream
+                self.breaker.release()
+                await stream.aclose()
+                raise
+
+            self.latencies.record(time.perf_counter() - started)
+            self.breaker.record_success()
+            try:
+                yield first
+                async for text in stream:
+                    yield text
+            finally:
+                await stream.aclose()
+            return
+
+    def get_stats(self) -> Dict:
+        p50 = self.latencies.percentile(50)
+        p95 = self.latencies.percentile(95)
+        return {
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "breaker": self.breaker.get_stats(),
+        }
+
+
+@lru_cache()
+def get_llm_caller() -> ResilientLLMCaller:
+    return ResilientLLMCaller()
@@ -1,69 +1,544 @@
-import google.generativeai as genai
-from typing import List, Dict
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional, Tuple
 from pathlib import Path
 from fastapi import HTTPException
 from ..core.config import get_settings
 from ..core.logging import setup_logging
+from .answer_cache import AnswerCache, get_answer_cache, normalize_query
+from .context_cache import ContextCacheRegistry, ContextKey
+from .llm_backends import (
+    GENERATION_CONFIG,
+    LLMBackend,
+    LLMBackendError,
+    get_llm_backend,
+)
+from .llm_resilience import ResilientLLMCaller, get_llm_caller
 from .pdf_service import PDFService
+from .session_store import ChatSession, SessionStore, get_session_store, render_turns
+from .single_flight import SingleFlight, get_single_flight
+from ..utils.chunking import CHARS_PER_TOKEN, estimate_tokens, pack_chunks
 
 settings = get_settings()
 logger = setup_logging()
 
 
+async def _replay(answer: str) -> AsyncIterator[str]:
+    """Stream a cached answer as a single piece"""
+    yield answer
+
+
 class LLMService:
-    def __init__(self):
+    def __init__(
+        self,
+        pdf_service: Optional[PDFService] = None,
+        caller: Optional[ResilientLLMCaller] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        backend: Optional[LLMBackend] = None,
+        session_store: Optional[SessionStore] = None,
+        context_cache: Optional[ContextCacheRegistry] = None,
+    ):
         try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel("gemini-pro")
-            self.pdf_service = PDFService()
+            self.backend = backend or get_llm_backend()
+            self.pdf_service = pdf_service or PDFService()
+            self.caller = caller or get_llm_caller()
+            if answer_cache is None and settings.ANSWER_CACHE_ENABLED:
+                answer_cache = get_answer_cache()
+            self.answer_cache = answer_cache
+            self.single_flight = single_flight or get_single_flight()
+            self.session_store = session_store or get_session_store()
+            self.context_cache = context_cache or self.pdf_service.context_cache
             logger.info("LLM Service initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing LLM Service: {str(e)}")
             raise
 
-    async def generate_response(self, pdf_id: str, query: str) -> str:
-        """Generate a response based on the PDF content and user query"""
-        try:
-            # Get PDF content
-            text_content = self.pdf_service.get_pdf_content(pdf_id)
-            if not text_content:
-                raise HTTPException(status_code=404, detail="PDF content not found")
-
-            # Create prompt with context
-            prompt = self._create_prompt(text_content, query)
-
-            # Generate response
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    "temperature": 0.7,
-                    "top_p": 0.8,
-                    "top_k": 40,
-                    "max_output_tokens": 1024,
-                },
-            )
+    async def generate_response(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str] = None,
+        document: Optional[Dict] = None,
+        session: Optional[ChatSession] = None,
+    ) -> str:
+        """Generate a response based on the PDF content and user query
 
+        ``document`` is the result of load_document, for callers asking
+        several questions about one PDF. With a ``session`` the question is
+        answered in the context of that conversation and recorded in it.
+        """
+        try:
+            if session is not None and not session.is_empty:
+                # Answers depend on the conversation, so skip cache and coalescing
+                response = await self._generate(
+                    pdf_id, query, retrieval_method, session=session
+                )
+            else:
+                response = await self._answer(pdf_id, query, retrieval_method, document)
+            if session is not None:
+                await self.record_turn(session, query, response)
             logger.debug(f"Generated response for query: {query[:50]}...")
-            return response.text
+            return response
 
         except HTTPException as http_err:
             logger.error(f"HTTP error in generate_response: {str(http_err)}")
             raise
+        except LLMBackendError as e:
+            logger.error(f"Model backend error: {str(e)}")
+            raise HTTPException(status_code=502, detail="The model backend failed")
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             raise HTTPException(
                 status_code=500, detail=f"Error generating response: {str(e)}"
             )
 
-    def _create_prompt(self, context: str, query: str) -> str:
+    async def _answer(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str],
+        document: Optional[Dict],
+    ) -> str:
+        metadata = document["metadata"] if document else None
+        key = self.answer_key(pdf_id, query, retrieval_method, metadata)
+        response = self.get_cached_answer(key)
+        if response is not None:
+            logger.debug(f"Answer cache hit for query: {query[:50]}...")
+            return response
+
+        async def answer() -> str:
+            response = await self._generate(pdf_id, query, retrieval_method, document)
+            self.cache_answer(key, response)
+            return response
+
+        # Identical questions already in flight share that model call
+        return await self.single_flight.do(
+            self._flight_key(pdf_id, query, retrieval_method), answer
+        )
+
+    async def _generate(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str] = None,
+        document: Optional[Dict] = None,
+        session: Optional[ChatSession] = None,
+    ) -> str:
+        """Ask the model, against the document's cached context when possible"""
+        cached = await self._cached_context(pdf_id, document)
+        if cached is not None:
+            key, name = cached
+            history = session.render() if session is not None else ""
+            try:
+                return await self.caller.run(
+                    self.backend.generate,
+                    self._create_question_prompt(query, history),
+                    cached_context=name,
+                )
+            except LLMBackendError as e:
+                if e.retryable:
+                    raise
+                self._drop_cached_context(key, e)
+        prompt = await self.build_prompt(
+            pdf_id, query, retrieval_method, document, session
+        )
+        return await self.caller.run(self.backend.generate, prompt)
+
+    async def _cached_context(
+        self, pdf_id: str, document: Optional[Dict] = None
+    ) -> Optional[Tuple[ContextKey, str]]:
+        """The provider's cached content for a document, if it should be used
+
+        With CONTEXT_CACHE_ENABLED, documents between CONTEXT_CACHE_MIN_TOKENS
+        and CONTEXT_CACHE_MAX_TOKENS are registered whole with the backend's
+        context cache, so later questions send only the question itself.
+        """
+        if not settings.CONTEXT_CACHE_ENABLED or not self.context_cache.supports(
+            self.backend
+        ):
+            return None
+        metadata = document["metadata"] if document else None
+        metadata = metadata or self.pdf_service.get_pdf_metadata(pdf_id)
+        content_hash = metadata.get("content_hash")
+        text_length = metadata.get("text_length")
+        if content_hash is None or text_length is None:
+            return None
+        tokens = text_length // CHARS_PER_TOKEN
+        if not (
+            settings.CONTEXT_CACHE_MIN_TOKENS
+            <= tokens
+            <= settings.CONTEXT_CACHE_MAX_TOKENS
+        ):
+            return None
+
+        def load_context() -> str:
+            if document is not None and document["text"] is not None:
+                text = document["text"]
+            else:
+                text = self.pdf_service.get_pdf_content(pdf_id)
+            return self._create_context_prompt(text)
+
+        key = (self.backend.name, self.backend.model_name, content_hash)
+        name = await self.context_cache.get_or_create(
+            self.backend, key, load_context, self.caller.run
+        )
+        return (key, name) if name is not None else None
+
+    def _drop_cached_context(self, key: ContextKey, error: Exception):
+        logger.warning(f"Cached context rejected, sending the full prompt: {error}")
+        self.context_cache.invalidate(key)
+
+    async def answer_batch(
+        self,
+        pdf_id: str,
+        queries: List[str],
+        retrieval_method: Optional[str] = None,
+        document: Optional[Dict] = None,
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """Answer many questions about one PDF with bounded concurrency
+
+        Yields ``(index, result)`` pairs in completion order; a result holds
+        either a ``response`` or an ``error``. The document is loaded once
+        for all questions.
+        """
+        document = document or await self.load_document(pdf_id, retrieval_method)
+        semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+
+        async def answer_one(index: int, query: str) -> Tuple[int, Dict]:
+            async with semaphore:
+                try:
+                    response = await self.generate_response(
+                        pdf_id, query, retrieval_method, document
+                    )
+                    return index, {"response": response}
+                except HTTPException as e:
+                    return index, {"error": e.detail, "status_code": e.status_code}
+
+        tasks = [
+            asyncio.ensure_future(answer_one(i, query))
+            for i, query in enumerate(queries)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The caller stopped early (e.g. the client disconnected)
+            for task in tasks:
+                task.cancel()
+
+    def answer_key(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+    ) -> Optional[str]:
+        """Answer cache key for a question, or None if it cannot be cached"""
+        if self.answer_cache is None:
+            return None
+        metadata = metadata or self.pdf_service.get_pdf_metadata(pdf_id)
+        content_hash = metadata.get("content_hash")
+        if content_hash is None:
+            return None
+        config = {
+            "backend": self.backend.name,
+            "model": self.backend.model_name,
+            "retrieval_method": retrieval_method or settings.RETRIEVAL_METHOD,
+            **GENERATION_CONFIG,
+        }
+        return self.answer_cache.make_key(pdf_id, content_hash, query, config)
+
+    @staticmethod
+    def _flight_key(
+        pdf_id: str, query: str, retrieval_method: Optional[str]
+    ) -> Tuple[str, str, str]:
+        return (
+            pdf_id,
+            normalize_query(query),
+            retrieval_method or settings.RETRIEVAL_METHOD,
+        )
+
+    def get_cached_answer(self, key: Optional[str]) -> Optional[str]:
+        return self.answer_cache.get(key) if key is not None else None
+
+    def cache_answer(self, key: Optional[str], answer: str):
+        if key is not None and answer:
+            self.answer_cache.put(key, answer)
+
+    async def build_prompt(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str] = None,
+        document: Optional[Dict] = None,
+        session: Optional[ChatSession] = None,
+    ) -> str:
+        """Build the prompt for a question about a PDF"""
+        search_query, history = query, ""
+        if session is not None:
+            history = session.render()
+            if session.last_question:
+                # Follow-ups like "why?" retrieve poorly on their own
+                search_query = f"{session.last_question} {query}"
+        # Get the relevant part of the PDF content
+        context = await self.build_context(
+            pdf_id, search_query, retrieval_method, document
+        )
+        if not context:
+            raise HTTPException(status_code=404, detail="PDF content not found")
+        return self._create_prompt(context, query, history)
+
+    async def record_turn(self, session: ChatSession, question: str, answer: str):
+        """Add a turn to a session, folding turns over budget into its summary"""
+        async with session.turn_lock():
+            overflow = session.add_turn(question, answer)
+            if not overflow:
+                self.session_store.save(session)
+                return
+            summary = await self._summarize(session.summary, overflow)
+            self.session_store.compact(session, summary)
+        logger.debug(f"Compacted {len(overflow)} turns of session {session.session_id}")
+
+    async def _summarize(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        max_chars = settings.SESSION_SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN
+        try:
+            new_summary = await self.caller.run(
+                self.backend.generate, self._create_summary_prompt(summary, turns)
+            )
+        except Exception as e:
+            # Keep the most recent of the old material rather than fail the turn
+            logger.warning(f"Could not summarize conversation: {str(e)}")
+            return f"{summary}\n{render_turns(turns)}".strip()[-max_chars:]
+        return new_summary.strip()[:max_chars]
+
+    async def open_answer_stream(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str] = None,
+        session: Optional[ChatSession] = None,
+    ) -> Tuple[AsyncIterator[str], Dict]:
+        """Open a stream of the answer to a question about a PDF
+
+        Cached answers are replayed, and a question already being streamed
+        is joined instead of asked again. Errors such as a missing PDF or a
+        full call pool are raised here, before anything is streamed. Returns
+        the stream and its details: ``cached``, ``coalesced`` and
+        ``prompt_tokens`` (approximate). A completed answer is recorded in
+        ``session`` if one is given.
+        """
+        if session is not None and not session.is_empty:
+            tokens, info = await self._open_generation(
+                pdf_id, query, retrieval_method, session
+            )
+            details = {"cached": False, "coalesced": False, **info}
+            return self._record_when_complete(tokens, session, query), details
+
+        tokens, details = await self._open_shared_stream(
+            pdf_id, query, retrieval_method
+        )
+        if session is not None:
+            tokens = self._record_when_complete(tokens, session, query)
+        return tokens, details
+
+    async def _open_shared_stream(
+        self, pdf_id: str, query: str, retrieval_method: Optional[str]
+    ) -> Tuple[AsyncIterator[str], Dict]:
+        key = self.answer_key(pdf_id, query, retrieval_method)
+        answer = self.get_cached_answer(key)
+        if answer is not None:
+            details = {"cached": True, "coalesced": False, "prompt_tokens": 0}
+            return _replay(answer), details
+
+        async def open_upstream() -> Tuple[AsyncIterator[str], Dict]:
+            tokens, info = await self._open_generation(pdf_id, query, retrieval_method)
+            return self._cache_when_complete(tokens, key), info
+
+        tokens, info, coalesced = await self.single_flight.stream(
+            self._flight_key(pdf_id, query, retrieval_method), open_upstream
+        )
+        return tokens, {"cached": False, "coalesced": coalesced, **info}
+
+    async def _open_generation(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str] = None,
+        session: Optional[ChatSession] = None,
+    ) -> Tuple[AsyncIterator[str], Dict]:
+        """Open the model's answer stream, using a cached context if possible"""
+        cached = await self._cached_context(pdf_id)
+        if cached is None:
+            prompt = await self.build_prompt(
+                pdf_id, query, retrieval_method, session=session
+            )
+            tokens = await self.open_stream(prompt)
+            return tokens, {"prompt_tokens": estimate_tokens(prompt)}
+
+        history = session.render() if session is not None else ""
+        prompt = self._create_question_prompt(query, history)
+
+        async def full_prompt() -> str:
+            return await self.build_prompt(
+                pdf_id, query, retrieval_method, session=session
+            )
+
+        tokens = await self.caller.open_stream(
+            lambda: self._stream_cached(cached, prompt, full_prompt)
+        )
+        return tokens, {
+            "prompt_tokens": estimate_tokens(prompt),
+            "context_cached": True,
+        }
+
+    async def _stream_cached(
+        self,
+        cached: Tuple[ContextKey, str],
+        prompt: str,
+        full_prompt: Callable[[], Awaitable[str]],
+    ) -> AsyncIterator[str]:
+        key, name = cached
+        started = False
+        try:
+            async for text in self.backend.stream(prompt, cached_context=name):
+                started = True
+                yield text
+            return
+        except LLMBackendError as e:
+            # Nothing was sent yet, so the plain prompt can still take over
+            if started or e.retryable:
+                raise
+            self._drop_cached_context(key, e)
+        async for text in self.backend.stream(await full_prompt()):
+            yield text
+
+    async def _cache_when_complete(
+        self, tokens: AsyncIterator[str], key: Optional[str]
+    ) -> AsyncIterator[str]:
+        parts = []
+        try:
+            async for text in tokens:
+                parts.append(text)
+                yield text
+        finally:
+            await tokens.aclose()
+        self.cache_answer(key, "".join(parts))
+
+    async def _record_when_complete(
+        self, tokens: AsyncIterator[str], session: ChatSession, question: str
+    ) -> AsyncIterator[str]:
+        parts = []
+        try:
+            async for text in tokens:
+                parts.append(text)
+                yield text
+        finally:
+            await tokens.aclose()
+        # Only answers the client received in full become part of the history
+        await self.record_turn(session, question, "".join(parts))
+
+    async def open_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Reserve a model call slot (or raise 503) and return the answer stream"""
+        return await self.caller.open_stream(lambda: self.stream_response(prompt))
+
+    async def stream_response(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the model's answer to a prompt as it is generated
+
+        Closing the iterator early cancels the upstream request.
+        """
+        async for text in self.backend.stream(prompt):
+            yield text
+
+    async def generate_response_from_chunks(self, chunks: List[str], query: str) -> str:
+        """Generate a response from already retrieved chunks"""
+        context = self._join_chunks(pack_chunks(chunks, settings.CONTEXT_MAX_TOKENS))
+        return await self.caller.run(
+            self.backend.generate, self._create_prompt(context, query)
+        )
+
+    async def load_document(
+        self, pdf_id: str, retrieval_method: Optional[str] = None
+    ) -> Dict:
+        """Load what answering questions about a PDF needs, once
+
+        Returns the metadata plus the full text for documents sent whole;
+        for larger ones the chunk index is brought into the document cache.
+        """
+        metadata = self.pdf_service.get_pdf_metadata(pdf_id)
+        document = {"metadata": metadata, "text": None}
+        if self._send_whole(metadata):
+            document["text"] = self.pdf_service.get_pdf_content(pdf_id)
+        else:
+            await self.pdf_service.preload_document(pdf_id, retrieval_method)
+        return document
+
+    @staticmethod
+    def _send_whole(metadata: Dict) -> bool:
+        text_length = metadata.get("text_length")
+        return (
+            text_length is not None
+            and text_length <= settings.FULL_DOCUMENT_MAX_TOKENS * CHARS_PER_TOKEN
+        )
+
+    async def build_context(
+        self,
+        pdf_id: str,
+        query: str,
+        retrieval_method: Optional[str] = None,
+        document: Optional[Dict] = None,
+    ) -> str:
+        """Select the document text to put in the prompt
+
+        Documents within FULL_DOCUMENT_MAX_TOKENS are sent whole. Larger ones
+        contribute their best ranked chunks, packed into CONTEXT_MAX_TOKENS
+        with overlaps merged and in the order they appear in the document.
+        """
+        if document is not None and document["text"] is not None:
+            return document["text"]
+        metadata = document["metadata"] if document else None
+        metadata = metadata or self.pdf_service.get_pdf_metadata(pdf_id)
+        if self._send_whole(metadata):
+            return self.pdf_service.get_pdf_content(pdf_id)
+
+        excerpts = await self.pdf_service.get_relevant_excerpts(
+            pdf_id,
+            query,
+            settings.CONTEXT_MAX_TOKENS,
+            settings.CONTEXT_CANDIDATE_CHUNKS,
+            retrieval_method,
+        )
+        if not excerpts:
+            # Nothing indexed for this document; fall back to its leading text
+            logger.warning(f"No chunks retrieved for {pdf_id}, using document text")
+            max_chars = settings.CONTEXT_MAX_TOKENS * CHARS_PER_TOKEN
+            return self.pdf_service.get_pdf_content(pdf_id)[:max_chars]
+        return self._join_chunks(excerpts)
+
+    @staticmethod
+    def _join_chunks(chunks: List[str]) -> str:
+        return "\n\n---\n\n".join(chunks)
+
+    def _create_prompt(self, context: str, query: str, history: str = "") -> str:
         """Create a detailed prompt for the LLM"""
+        return self._create_context_prompt(context) + self._create_question_prompt(
+            query, history
+        )
+
+    def _create_context_prompt(self, context: str) -> str:
+        """The document part of the prompt, the same for every question"""
         return f"""
         You are an AI assistant analyzing a document about philosophical films. 
         
-        Document Content:
+        Document Content (relevant excerpts are separated by ---):
         {context}
 
-        User Question: {query}
+        """
+
+    def _create_question_prompt(self, query: str, history: str = "") -> str:
+        """The part of the prompt that changes with each question"""
+        if history:
+            history = f"Conversation So Far:\n{history}\n\n"
+        return f"""{history}User Question: {query}
 
         Please provide a detailed response based on the document content above. Consider:
         1. The main themes and categories present in the document
@@ -76,3 +551,17 @@ class LLMService:
 
         Provide your response in a clear, structured format.
         """
+
+    def _create_summary_prompt(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        """Create a prompt folding older conversation turns into the summary"""
+        return f"""
+        Summarize the conversation below between a user and an assistant about
+        a document, in at most {settings.SESSION_SUMMARY_MAX_TOKENS * 3 // 4} words.
+        Keep the facts, names and open questions a follow-up question may refer to.
+
+        Summary So Far:
+        {summary or "(none)"}
+
+        Further Conversation:
+        {render_turns(turns)}
+        """
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+from fastapi import HTTPException
+from pypdf import PdfReader
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+
+settings = get_settings()
+logger = setup_logging()
+
+
+def extract_page_range(
+    file_path: str, start: int = 0, end: Optional[int] = None
+) -> List[str]:
+    """Extract the stripped text of pages [start, end) (runs inside a worker process)"""
+    with open(file_path, "rb") as file:
+        pdf = PdfReader(file)
+        end = len(pdf.pages) if end is None else min(end, len(pdf.pages))
+        return [(pdf.pages[i].extract_text() or "").strip() for i in range(start, end)]
+
+
+def extract_pdf_pages(file_path: str) -> List[str]:
+    """Extract the stripped text of every page (runs inside a worker process)"""
+    return extract_page_range(file_path)
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Count the pages of a PDF (runs inside a worker process)"""
+    with open(file_path, "rb") as file:
+        return len(PdfReader(file).pages)
+
+
+class _Slot:
+    """A queue slot, held until its holder and every job it submitted are done"""
+
+    def __init__(self, pool: "ExtractionPool"):
+        self.pool = pool
+        self.holders = 1
+
+    def hold(self):
+        with self.pool._lock:
+            self.holders += 1
+
+    def release(self):
+        with self.pool._lock:
+            self.holders -= 1
+            if self.holders == 0:
+                self.pool._pending -= 1
+
+
+class ExtractionPool:
+    """Process pool that keeps CPU-bound pypdf work off the event loop
+
+    Every job holds a queue slot until its worker process has returned, so
+    a job the caller gave up on (timed out) still counts against
+    ``max_queued`` while it keeps a worker busy.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_queued: Optional[int] = None,
+    ):
+        self.max_workers = (
+            max_workers or settings.PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+        )
+        self.timeout = timeout or settings.PDF_EXTRACTION_TIMEOUT
+        self.max_queued = max_queued or settings.PDF_EXTRACTION_MAX_QUEUED
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        # Slots are released from the executor's result thread
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"Started PDF extraction pool with {self.max_workers} workers")
+        return self._executor
+
+    def _admit(self) -> _Slot:
+        """Take a queue slot, or raise 503 when the queue is full"""
+        with self._lock:
+            if self._pending < self.max_queued:
+                self._pending += 1
+                return _Slot(self)
+        logger.warning(f"PDF extraction queue full ({self._pending} jobs)")
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy processing other PDFs, please retry later",
+            headers={"Retry-After": "5"},
+        )
+
+    def _restart(self, executor: ProcessPoolExecutor):
+        """Replace a pool whose worker died, stopping what is left of it"""
+        logger.error("PDF extraction pool is broken, restarting it")
+        if self._executor is executor:
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _execute(self, slot: _Slot, func: Callable, *args):
+        """Run a job under a slot that it holds until the worker returns"""
+        executor = self._get_executor()
+        try:
+            slot.hold()
+            try:
+                future = executor.submit(func, *args)
+            except BaseException:
+                slot.release()
+                raise
+            future.add_done_callback(lambda _: slot.release())
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # The worker cannot be interrupted; its result is simply discarded
+            logger.error(f"PDF extraction timed out after {self.timeout}s")
+            raise HTTPException(
+                status_code=504, detail="Timed out while extracting PDF content"
+            )
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise HTTPException(
+                status_code=503,
+                detail="PDF extraction workers restarted, please retry",
+                headers={"Retry-After": "5"},
+            )
+
+    async def run(self, func: Callable, *args):
+        """Run a picklable function in the pool and await its result"""
+        slot = self._admit()
+        try:
+            return await self._execute(slot, func, *args)
+        finally:
+            slot.release()
+
+    async def extract_page_ranges(
+        self,
+        file_path: str,
+        pages_per_range: int,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+    ) -> Tuple[int, List[List[str]]]:
+        """Extract page ranges across the pool, returning page texts in page order
+
+        The document takes a single queue slot for all of its ranges, so it
+        cannot be turned away by its own jobs however many workers there are.
+        """
+        slot = self._admit()
+        try:
+            total_pages = await self._execute(slot, count_pdf_pages, file_path)
+            page_ranges = [
+                (start, min(start + pages_per_range, total_pages))
+                for start in range(0, total_pages, pages_per_range)
+            ]
+            # Keep at most one range per worker in flight so a single large
+            # document leaves room in the executor for other uploads
+            semaphore = asyncio.Semaphore(self.max_workers)
+            completed = 0
+
+            async def extract(start: int, end: int) -> List[str]:
+                nonlocal completed
+                async with semaphore:
+                    page_texts = await self._execute(
+                        slot, extract_page_range, file_path, start, end
+                    )
+                completed += 1
+                logger.debug(
+                    f"Extracted pages {start + 1}-{end} of {total_pages} "
+                    f"({completed}/{len(page_ranges)} ranges)"
+                )
+                if progress_callback:
+                    progress_callback(completed, len(page_ranges))
+                return page_texts
+
+            results = await asyncio.gather(*(extract(s, e) for s, e in page_ranges))
+            return total_pages, results
+        finally:
+            slot.release()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("PDF extraction pool shut down")
+
+
+@lru_cache()
+def get_extraction_pool() -> ExtractionPool:
+    return ExtractionPool()
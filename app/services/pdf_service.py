@@ -1,18 +1,28 @@
+import os
 import uuid
+import hashlib
 import shutil
+import tempfile
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict  # Add this import
+from typing import Callable, List, Dict, Optional, Tuple
 from fastapi import UploadFile, HTTPException
-from pypdf import PdfReader
+from starlette.concurrency import run_in_threadpool
 from ..core.config import get_settings
 from ..core.logging import setup_logging
+from .content_index import ContentIndex
+from .context_cache import get_context_cache
+from .document_store import get_document_store, join_pages
 from .embedding_service import EmbeddingService
-import json
+from .pdf_extraction import extract_pdf_pages, get_extraction_pool
 
 settings = get_settings()
 logger = setup_logging()
 
+FILE_TOO_LARGE_DETAIL = (
+    f"File size exceeds maximum limit of {settings.MAX_PDF_SIZE // (1024 * 1024)}MB"
+)
+
 
 class PDFService:
     def __init__(self):
@@ -21,9 +31,24 @@ class PDFService:
         self.data_dir = Path("data")
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.embedding_service = EmbeddingService()
+        self.extraction_pool = get_extraction_pool()
+        self.content_index = ContentIndex(self.data_dir / "content_index")
+        self.store = get_document_store()
+        self.context_cache = get_context_cache()
 
     async def save_pdf(self, file: UploadFile) -> dict:
         """Save uploaded PDF file and extract basic information"""
+        upload, needs_ingestion = await self.receive_pdf(file)
+        if not needs_ingestion:
+            return upload
+        return await self.ingest_pdf(upload)
+
+    async def receive_pdf(self, file: UploadFile) -> Tuple[dict, bool]:
+        """Validate and persist an upload
+
+        Returns the upload details and whether it still needs extraction;
+        duplicates of known content are returned fully processed.
+        """
         try:
             # Validate file type
             if not file.filename.lower().endswith(".pdf"):
@@ -37,37 +62,65 @@ class PDFService:
             safe_filename = f"{pdf_id}_{timestamp}.pdf"
             file_path = self.upload_dir / safe_filename
 
-            # Read and save file content
-            content = await file.read()
-            file_size = len(content)
+            # Stream file content to disk
+            file_size, content_hash = await self._stream_to_disk(file, file_path)
 
-            logger.debug(f"Received PDF file size: {file_size} bytes")
+            logger.debug(f"Saved PDF to: {file_path} ({file_size} bytes)")
 
-            if file_size > settings.MAX_PDF_SIZE:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File size exceeds maximum limit of {settings.MAX_PDF_SIZE // (1024 * 1024)}MB",
-                )
+            # Reuse the extracted content of an identical earlier upload
+            pdf_info = self._create_alias(pdf_id, content_hash, file.filename)
+            if pdf_info is not None:
+                file_path.unlink(missing_ok=True)
+                return pdf_info, False
 
-            # Save file
-            with open(file_path, "wb") as pdf_file:
-                pdf_file.write(content)
+            upload = {
+                "pdf_id": pdf_id,
+                "filename": file.filename,
+                "size": file_size,
+                "content_hash": content_hash,
+                "file_path": file_path,
+                "uploaded_at": datetime.utcnow(),
+            }
+            return upload, True
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error saving PDF: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error processing PDF file: {str(e)}"
+            )
 
-            logger.debug(f"Saved PDF to: {file_path}")
+    async def ingest_pdf(
+        self, upload: dict, on_stage: Optional[Callable[[str], None]] = None
+    ) -> dict:
+        """Extract, store and chunk a persisted upload"""
+        try:
+            pdf_id = upload["pdf_id"]
+            file_path = upload["file_path"]
 
             # Extract PDF information and text content
-            pdf_info = self._extract_pdf_info(file_path, file_size)
+            if on_stage:
+                on_stage("extracting")
+            pdf_info = await self._extract_pdf_info(file_path, upload["size"])
             pdf_info["pdf_id"] = pdf_id
-            pdf_info["filename"] = file.filename
-            pdf_info["uploaded_at"] = datetime.utcnow()
+            pdf_info["filename"] = upload["filename"]
+            pdf_info["uploaded_at"] = upload["uploaded_at"]
+            pdf_info["content_hash"] = upload["content_hash"]
 
             # Store the extracted text
-            self._store_pdf_content(pdf_id, pdf_info)
+            if on_stage:
+                on_stage("indexing")
+            self._store_pdf_content(pdf_id, pdf_info, pdf_info.pop("page_texts"))
+            self.content_index.register(upload["content_hash"], pdf_id, file_path)
 
             # Process embeddings for the document
             try:
-                chunk_count = self.embedding_service.process_document(
-                    pdf_id, pdf_info["text_content"]
+                # Chunking, vectorizing and indexing are CPU-bound
+                chunk_count = await run_in_threadpool(
+                    self.embedding_service.process_document,
+                    pdf_id,
+                    pdf_info["text_content"],
                 )
                 pdf_info["chunk_count"] = chunk_count
                 logger.info(f"Created {chunk_count} embeddings for PDF {pdf_id}")
@@ -86,43 +139,115 @@ class PDFService:
                 status_code=500, detail=f"Error processing PDF file: {str(e)}"
             )
 
-    def _extract_pdf_info(self, file_path: Path, file_size: int) -> dict:
-        """Extract basic information and text content from PDF file"""
+    def pdf_exists(self, pdf_id: str) -> bool:
+        """Check whether a PDF has been fully processed"""
         try:
-            with open(file_path, "rb") as file:
-                pdf = PdfReader(file)
-                text_content = ""
+            return self.store.exists(self.content_index.resolve(pdf_id))
+        except FileNotFoundError:
+            return False
 
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text.strip() + "\n\n"
+    def _create_alias(
+        self, pdf_id: str, content_hash: str, filename: str
+    ) -> Optional[dict]:
+        """Point pdf_id at an already extracted document with the same content"""
+        entry = self.content_index.lookup(content_hash)
+        if entry is None or not self.store.exists(entry["doc_id"]):
+            return None
 
-                logger.debug(
-                    f"Extracted text content length: {len(text_content)} characters"
-                )
-                logger.debug(f"First 200 characters of content: {text_content[:200]}")
+        pdf_info = self.store.load_metadata(entry["doc_id"])
+        if self.content_index.add_alias(content_hash, pdf_id) is None:
+            return None
+
+        pdf_info.update(
+            pdf_id=pdf_id,
+            filename=filename,
+            uploaded_at=datetime.utcnow(),
+            message="PDF already processed, reusing extracted content",
+        )
+        logger.info(f"PDF {pdf_id} deduplicated to document {entry['doc_id']}")
+        return pdf_info
+
+    async def _stream_to_disk(self, file: UploadFile, file_path: Path) -> tuple:
+        """Stream an upload to a temp file in chunks and atomically move it into place
+
+        Returns the file size and the SHA-256 hex digest of its content. The
+        request body itself is capped by UploadSizeLimitMiddleware.
+        """
+        if file.size is not None and file.size > settings.MAX_PDF_SIZE:
+            raise self._file_too_large()
+
+        tmp_file = tempfile.NamedTemporaryFile(
+            dir=self.upload_dir,
+            prefix=f".{file_path.stem}_",
+            suffix=".part",
+            delete=False,
+        )
+        tmp_path = Path(tmp_file.name)
+        file_size = 0
+        file_hash = hashlib.sha256()
 
-                return {
-                    "size": file_size,
-                    "pages": len(pdf.pages),
-                    "text_content": text_content.strip(),
-                }
+        def write(chunk: bytes):
+            file_hash.update(chunk)
+            tmp_file.write(chunk)
 
+        try:
+            with tmp_file:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    file_size += len(chunk)
+                    if file_size > settings.MAX_PDF_SIZE:
+                        raise self._file_too_large()
+                    # Hashing and disk writes stay off the event loop
+                    await run_in_threadpool(write, chunk)
+
+            await run_in_threadpool(os.replace, tmp_path, file_path)
+            return file_size, file_hash.hexdigest()
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def _file_too_large() -> HTTPException:
+        return HTTPException(status_code=400, detail=FILE_TOO_LARGE_DETAIL)
+
+    async def _extract_pdf_info(self, file_path: Path, file_size: int) -> dict:
+        """Extract basic information and text content from PDF file"""
+        try:
+            page_texts = await self.extraction_pool.run(
+                extract_pdf_pages, str(file_path)
+            )
+            text_content = join_pages(page_texts)
+
+            logger.debug(
+                f"Extracted text content length: {len(text_content)} characters"
+            )
+            logger.debug(f"First 200 characters of content: {text_content[:200]}")
+
+            return {
+                "size": file_size,
+                "pages": len(page_texts),
+                "text_content": text_content,
+                "page_texts": page_texts,
+            }
+
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error extracting PDF info: {str(e)}")
             raise HTTPException(
                 status_code=400, detail=f"Invalid or corrupted PDF file: {str(e)}"
             )
 
-    def _store_pdf_content(self, pdf_id: str, pdf_info: dict):
+    def _store_pdf_content(self, pdf_id: str, pdf_info: dict, page_texts: List[str]):
         """Store PDF content and metadata"""
         try:
-            content_file = self.data_dir / f"{pdf_id}.json"
-            with open(content_file, "w", encoding="utf-8") as f:
-                json.dump(pdf_info, f, default=str, ensure_ascii=False, indent=2)
+            metadata = {k: v for k, v in pdf_info.items() if k != "text_content"}
+            metadata["text_length"] = len(pdf_info["text_content"])
+            self.store.save(pdf_id, metadata, page_texts)
 
-            logger.debug(f"Stored PDF content to: {content_file}")
+            logger.debug(f"Stored PDF content for: {pdf_id}")
 
         except Exception as e:
             logger.error(f"Error storing PDF content: {str(e)}")
@@ -133,78 +258,185 @@ class PDFService:
     def get_pdf_content(self, pdf_id: str) -> str:
         """Retrieve PDF content by ID"""
         try:
-            content_file = self.data_dir / f"{pdf_id}.json"
-            if not content_file.exists():
-                logger.error(f"PDF content file not found: {content_file}")
-                raise HTTPException(status_code=404, detail="PDF not found")
-
-            with open(content_file, "r", encoding="utf-8") as f:
-                content = json.load(f)
-                text_content = content.get("text_content", "")
-                logger.debug(
-                    f"Retrieved content length: {len(text_content)} characters"
-                )
-                logger.debug(
-                    f"First 200 characters of retrieved content: {text_content[:200]}"
-                )
-                return text_content
+            text_content = self.store.load_text(self.content_index.resolve(pdf_id))
+            logger.debug(f"Retrieved content length: {len(text_content)} characters")
+            logger.debug(
+                f"First 200 characters of retrieved content: {text_content[:200]}"
+            )
+            return text_content
 
-        except HTTPException:
-            raise
+        except FileNotFoundError:
+            logger.error(f"PDF content not found: {pdf_id}")
+            raise HTTPException(status_code=404, detail="PDF not found")
         except Exception as e:
             logger.error(f"Error retrieving PDF content: {str(e)}")
             raise HTTPException(
                 status_code=500, detail=f"Error retrieving PDF content: {str(e)}"
             )
 
-    async def process_large_pdf(self, file_path: Path) -> dict:
+    def get_pdf_metadata(self, pdf_id: str) -> dict:
+        """Retrieve PDF metadata by ID without reading its text"""
+        try:
+            return self.store.load_metadata(self.content_index.resolve(pdf_id))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="PDF not found")
+        except Exception as e:
+            logger.error(f"Error retrieving PDF metadata: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error retrieving PDF metadata: {str(e)}"
+            )
+
+    def get_pdf_page(self, pdf_id: str, page_number: int) -> str:
+        """Retrieve the text of a single page (zero-based)"""
+        try:
+            return self.store.load_page(self.content_index.resolve(pdf_id), page_number)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="PDF not found")
+        except IndexError:
+            raise HTTPException(status_code=404, detail="Page not found")
+        except Exception as e:
+            logger.error(f"Error retrieving PDF page: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error retrieving PDF page: {str(e)}"
+            )
+
+    def delete_pdf(self, pdf_id: str) -> dict:
+        """Delete a PDF, removing its document once no other upload references it"""
+        try:
+            entry = self.content_index.remove_alias(pdf_id)
+            if entry is None:
+                # Not tracked by the content index: a standalone document,
+                # unless it is a deleted owner still shared by other uploads
+                if self.content_index.is_deleted(pdf_id) or not self.store.exists(
+                    pdf_id
+                ):
+                    raise HTTPException(status_code=404, detail="PDF not found")
+                entry = {"doc_id": pdf_id, "file_path": None, "refs": []}
+
+            if not entry["refs"]:
+                self._purge_document(entry["doc_id"], entry["file_path"])
+
+            logger.info(
+                f"Deleted PDF {pdf_id} ({len(entry['refs'])} references remaining)"
+            )
+            return {"pdf_id": pdf_id, "references_remaining": len(entry["refs"])}
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error deleting PDF: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error deleting PDF: {str(e)}")
+
+    def _purge_document(self, doc_id: str, file_path: Optional[str]):
+        """Remove the stored file, text and chunks of a document"""
+        try:
+            content_hash = self.store.load_metadata(doc_id).get("content_hash")
+        except FileNotFoundError:
+            content_hash = None
+        if content_hash:
+            self.context_cache.purge(content_hash)
+
+        upload_files = (
+            [Path(file_path)] if file_path else self.upload_dir.glob(f"{doc_id}_*.pdf")
+        )
+        for upload_file in upload_files:
+            upload_file.unlink(missing_ok=True)
+        self.store.delete(doc_id)
+        self.embedding_service.remove_document(doc_id)
+        logger.debug(f"Purged document {doc_id}")
+
+    async def process_large_pdf(
+        self,
+        file_path: Path,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+    ) -> dict:
         """Process large PDF files efficiently"""
         try:
-            with open(file_path, "rb") as file:
-                pdf = PdfReader(file)
-                total_pages = len(pdf.pages)
-
-                # Process pages in chunks
-                chunks = []
-                for i in range(0, total_pages, settings.MAX_CHUNKS_PER_REQUEST):
-                    page_range = range(
-                        i, min(i + settings.MAX_CHUNKS_PER_REQUEST, total_pages)
+            # Extract page ranges in parallel worker processes
+            total_pages, range_texts = await self.extraction_pool.extract_page_ranges(
+                str(file_path), settings.MAX_CHUNKS_PER_REQUEST, progress_callback
+            )
+            chunks = ["\n".join(page_texts) for page_texts in range_texts]
+
+            # Process embeddings for chunks
+            for i, chunk in enumerate(chunks):
+                try:
+                    await run_in_threadpool(
+                        self.embedding_service.process_document,
+                        f"{file_path.stem}_chunk_{i}",
+                        chunk,
                     )
-                    chunk = ""
-                    for page_num in page_range:
-                        chunk += pdf.pages[page_num].extract_text() + "\n"
-                    chunks.append(chunk)
-
-                # Process embeddings for chunks
-                for i, chunk in enumerate(chunks):
-                    try:
-                        self.embedding_service.process_document(
-                            f"{file_path.stem}_chunk_{i}", chunk
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Error creating embeddings for chunk {i}: {str(e)}"
-                        )
-
-                return {
-                    "total_pages": total_pages,
-                    "chunks": chunks,
-                    "chunk_count": len(chunks),
-                }
+                except Exception as e:
+                    logger.error(f"Error creating embeddings for chunk {i}: {str(e)}")
+
+            return {
+                "total_pages": total_pages,
+                "chunks": chunks,
+                "chunk_count": len(chunks),
+            }
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error processing large PDF: {str(e)}")
             raise HTTPException(
                 status_code=500, detail="Error processing large PDF file"
             )
 
+    async def preload_document(self, pdf_id: str, method: Optional[str] = None):
+        """Load a document's chunks and index before a series of queries"""
+        try:
+            doc_id = self.content_index.resolve(pdf_id)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="PDF not found")
+        await run_in_threadpool(self.embedding_service.preload, doc_id, method)
+
     async def get_relevant_chunks(
-        self, pdf_id: str, query: str, n_results: int = 3
+        self,
+        pdf_id: str,
+        query: str,
+        n_results: int = 3,
+        method: Optional[str] = None,
     ) -> List[str]:
         """Get relevant chunks of text based on query"""
         try:
-            return self.embedding_service.query_document(pdf_id, query, n_results)
+            return await run_in_threadpool(
+                self.embedding_service.query_document,
+                self.content_index.resolve(pdf_id),
+                query,
+                n_results,
+                method,
+            )
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="PDF not found")
         except Exception as e:
             logger.error(f"Error getting relevant chunks: {str(e)}")
             raise HTTPException(
                 status_code=500, detail="Error retrieving relevant content"
             )
+
+    async def get_relevant_excerpts(
+        self,
+        pdf_id: str,
+        query: str,
+        max_tokens: int,
+        n_results: int = 3,
+        method: Optional[str] = None,
+    ) -> List[str]:
+        """Relevant text within max_tokens, overlaps merged, in document order"""
+        try:
+            # Scoring (and building a missing BM25 index) is CPU-bound
+            return await run_in_threadpool(
+                self.embedding_service.query_excerpts,
+                self.content_index.resolve(pdf_id),
+                query,
+                max_tokens,
+                n_results,
+                method,
+            )
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="PDF not found")
+        except Exception as e:
+            logger.error(f"Error getting relevant excerpts: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail="Error retrieving relevant content"
+            )
@@ -0,0 +1,222 @@
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from ..core.config import get_settings
+
+settings = get_settings()
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalize text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def bm25_idf(total_chunks: int, doc_freq: int) -> float:
+    return math.log(1 + (total_chunks - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+@lru_cache(maxsize=65536)
+def term_hash(term: str) -> int:
+    """Stable 64-bit key of a term (identical in every process)"""
+    return int.from_bytes(
+        hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class BM25Index:
+    """Inverted index over a document's chunks with BM25 scoring
+
+    Term weights are fully computed at build time, so a query only sums the
+    precomputed weights found in the postings of its terms and selects the
+    top results. Postings are flat arrays keyed by sorted term hashes, so
+    an index saved with ``save`` can be memory-mapped back by ``load``
+    instead of being rebuilt. Scores from different documents are only
+    comparable when searched with shared IDF weights (see ``doc_freqs``).
+
+    Layout of ``bm25.bin``, mapped with a single mmap call::
+
+        header   magic, version, k1, b, chunk count, term and posting counts
+        terms    uint64 sorted term hashes
+        offsets  int64 start of each term's postings, plus the end
+        chunks   int32 chunk id of each posting
+        weights  float32 BM25 weight of each posting
+    """
+
+    MAGIC = b"BM25"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBxxxddQQQ")
+    DTYPES = (np.uint64, np.int64, np.int32, np.float32)
+
+    def __init__(
+        self,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        chunk_ids: np.ndarray,
+        weights: np.ndarray,
+        total_chunks: int,
+        k1: float,
+        b: float,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.chunk_ids = chunk_ids
+        self.weights = weights
+        self.total_chunks = total_chunks
+        self.k1 = k1
+        self.b = b
+        self.mapped = False
+
+    @classmethod
+    def build(
+        cls,
+        chunks: List[str],
+        k1: Optional[float] = None,
+        b: Optional[float] = None,
+    ) -> "BM25Index":
+        k1 = settings.BM25_K1 if k1 is None else k1
+        b = settings.BM25_B if b is None else b
+        term_freqs: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        chunk_lengths = []
+
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            chunk_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_freqs[term_hash(term)].append((chunk_id, tf))
+
+        total_chunks = len(chunk_lengths)
+        avg_length = (sum(chunk_lengths) / total_chunks) if total_chunks else 0.0
+        length_norms = [
+            k1 * (1 - b + b * length / (avg_length or 1)) for length in chunk_lengths
+        ]
+        terms = np.array(sorted(term_freqs), dtype=np.uint64)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        chunk_ids, weights = [], []
+        for i, key in enumerate(terms.tolist()):
+            postings = term_freqs[key]
+            idf = bm25_idf(total_chunks, len(postings))
+            for chunk_id, tf in postings:
+                chunk_ids.append(chunk_id)
+                weights.append(idf * tf * (k1 + 1) / (tf + length_norms[chunk_id]))
+            offsets[i + 1] = len(chunk_ids)
+        return cls(
+            terms,
+            offsets,
+            np.array(chunk_ids, dtype=np.int32),
+            np.array(weights, dtype=np.float32),
+            total_chunks,
+            k1,
+            b,
+        )
+
+    def save(self, path: Path):
+        """Write the index into a document directory, replacing it atomically"""
+        tmp_path = path / ".bm25.bin"
+        with open(tmp_path, "wb") as f:
+            f.write(
+                self.HEADER.pack(
+                    self.MAGIC,
+                    self.VERSION,
+                    self.k1,
+                    self.b,
+                    self.total_chunks,
+                    len(self.terms),
+                    len(self.chunk_ids),
+                )
+            )
+            for array, dtype in zip(
+                (self.terms, self.offsets, self.chunk_ids, self.weights), self.DTYPES
+            ):
+                f.write(np.ascontiguousarray(array, dtype).tobytes())
+        os.replace(tmp_path, path / "bm25.bin")
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """Map a saved index; None if missing or built with other parameters"""
+        try:
+            with open(path / "bm25.bin", "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        magic, version, k1, b, total_chunks, n_terms, n_postings = (
+            cls.HEADER.unpack_from(buffer)
+        )
+        if (magic, version) != (cls.MAGIC, cls.VERSION) or (k1, b) != (
+            settings.BM25_K1,
+            settings.BM25_B,
+        ):
+            return None
+
+        # Views straight into the mapping: nothing is copied onto the heap
+        arrays, offset = [], cls.HEADER.size
+        for dtype, count in zip(
+            cls.DTYPES, (n_terms, n_terms + 1, n_postings, n_postings)
+        ):
+            arrays.append(np.frombuffer(buffer, dtype, count, offset))
+            offset += np.dtype(dtype).itemsize * count
+        index = cls(*arrays, total_chunks, k1, b)
+        index.mapped = True
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        """Heap bytes of the postings (none when they are memory-mapped)"""
+        if self.mapped:
+            return 0
+        arrays = (self.terms, self.offsets, self.chunk_ids, self.weights)
+        return sum(array.nbytes for array in arrays)
+
+    def _postings(self, term: str) -> Tuple[int, int]:
+        """Start and end of a term's postings (equal when it does not occur)"""
+        key = np.uint64(term_hash(term))
+        i = int(np.searchsorted(self.terms, key))
+        if i == len(self.terms) or self.terms[i] != key:
+            return 0, 0
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def doc_freqs(self, query: str) -> Dict[str, int]:
+        """Number of chunks each query term occurs in"""
+        freqs = {}
+        for term in set(tokenize(query)):
+            start, end = self._postings(term)
+            freqs[term] = end - start
+        return freqs
+
+    def term_idf(self, term: str) -> float:
+        """The IDF this document's weights for a term were computed with"""
+        start, end = self._postings(term)
+        return bm25_idf(self.total_chunks, end - start)
+
+    def search(
+        self, query: str, k: int, idf: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[float, int]]:
+        """Return up to k ``(score, chunk_id)`` pairs, best first
+
+        ``idf`` replaces this document's term IDF weights, e.g. with ones
+        computed over every document being searched.
+        """
+        scores = np.zeros(self.total_chunks, dtype=np.float64)
+        matched = np.zeros(self.total_chunks, dtype=bool)
+        for term in set(tokenize(query)):
+            start, end = self._postings(term)
+            if start == end:
+                continue
+            scale = idf[term] / bm25_idf(self.total_chunks, end - start) if idf else 1.0
+            chunk_ids = self.chunk_ids[start:end]
+            np.add.at(scores, chunk_ids, self.weights[start:end] * scale)
+            matched[chunk_ids] = True
+
+        # Ties go to the earlier chunk
+        candidates = np.flatnonzero(matched)
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+        return [(float(scores[i]), int(i)) for i in ranked]
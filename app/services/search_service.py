@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import math
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Union
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+from .pdf_service import PDFService
+from .search_index import bm25_idf
+
+settings = get_settings()
+logger = setup_logging()
+
+
+class SearchService:
+    """Chunk retrieval across many documents"""
+
+    def __init__(self, pdf_service: Optional[PDFService] = None):
+        self.pdf_service = pdf_service or PDFService()
+        self.embedding_service = self.pdf_service.embedding_service
+
+    async def search(
+        self,
+        query: str,
+        pdf_ids: Union[List[str], str] = "all",
+        top_k: int = 5,
+        method: Optional[str] = None,
+    ) -> dict:
+        """Search the given documents (or all of them) and merge a global top-k
+
+        Raises 404 naming any requested pdf_ids that do not exist. Results
+        always carry client-facing pdf_ids, and chunks of documents deleted
+        while the search ran are left out.
+        """
+        try:
+            if pdf_ids == "all" and self._use_corpus_index(method):
+                results = await run_in_threadpool(
+                    self.embedding_service.search_corpus, query, top_k
+                )
+                results = [
+                    (
+                        score,
+                        self.pdf_service.content_index.public_id(doc_id),
+                        doc_id,
+                        chunk_id,
+                    )
+                    for score, doc_id, chunk_id in results
+                ]
+                documents_searched = self.embedding_service.corpus_index.document_count
+            else:
+                if pdf_ids == "all":
+                    targets = {
+                        self.pdf_service.content_index.public_id(doc_id): doc_id
+                        for doc_id in self.embedding_service.list_documents()
+                    }
+                else:
+                    targets = self._resolve_targets(pdf_ids)
+                results = await self._fan_out(query, targets, top_k, method)
+                documents_searched = len(targets)
+
+            return {
+                "query": query,
+                "documents_searched": documents_searched,
+                "results": self._with_text(results),
+            }
+
+        except HTTPException:
+            raise
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}")
+            raise HTTPException(status_code=500, detail="Error searching documents")
+
+    def _resolve_targets(self, pdf_ids: List[str]) -> Dict[str, str]:
+        """Map requested pdf_ids to their documents, raising 404 for unknown ones"""
+        targets, missing = {}, []
+        for pdf_id in pdf_ids:
+            if self.pdf_service.pdf_exists(pdf_id):
+                targets[pdf_id] = self.pdf_service.content_index.resolve(pdf_id)
+            else:
+                missing.append(pdf_id)
+        if missing:
+            raise HTTPException(
+                status_code=404, detail=f"PDF not found: {', '.join(missing)}"
+            )
+        return targets
+
+    def _with_text(self, results: List[tuple]) -> List[dict]:
+        with_text = []
+        for score, pdf_id, doc_id, chunk_id in results:
+            try:
+                text = self.embedding_service.get_chunk(doc_id, chunk_id)
+            except (KeyError, IndexError):
+                # Deleted since it was ranked
+                continue
+            with_text.append(
+                {"pdf_id": pdf_id, "chunk_id": chunk_id, "score": score, "text": text}
+            )
+        return with_text
+
+    def _use_corpus_index(self, method: Optional[str]) -> bool:
+        return (
+            self.embedding_service.corpus_index is not None
+            and (method or settings.RETRIEVAL_METHOD) == "dense"
+        )
+
+    def _check_fan_out(self, document_count: int):
+        """Refuse searches that would scan more than SEARCH_MAX_DOCUMENTS"""
+        if document_count <= settings.SEARCH_MAX_DOCUMENTS:
+            return
+        detail = (
+            f"Searching {document_count} documents exceeds the limit of "
+            f"{settings.SEARCH_MAX_DOCUMENTS}; pass fewer pdf_ids"
+        )
+        if self.embedding_service.corpus_index is not None:
+            detail += " or use the dense method to search all of them"
+        raise HTTPException(status_code=400, detail=detail)
+
+    async def _map_documents(self, func: Callable, doc_ids: List[str]) -> List:
+        """Apply a blocking per-document function on worker threads
+
+        Documents are split into SEARCH_MAX_CONCURRENCY batches, each handed
+        to a thread once, rather than paying a thread hand-off per document.
+        """
+        size = max(1, math.ceil(len(doc_ids) / settings.SEARCH_MAX_CONCURRENCY))
+        batches = [doc_ids[i : i + size] for i in range(0, len(doc_ids), size)]
+        results = await asyncio.gather(
+            *(run_in_threadpool(_apply_each, func, batch) for batch in batches)
+        )
+        return [result for batch in results for result in batch]
+
+    async def _corpus_idf(self, query: str, doc_ids: List[str]) -> Dict[str, float]:
+        """BM25 IDF of the query terms over every targeted document's chunks"""
+        stats = await self._map_documents(
+            lambda doc_id: self.embedding_service.bm25_doc_freqs(doc_id, query),
+            doc_ids,
+        )
+        total_chunks = sum(chunks for chunks, _ in stats)
+        doc_freq: Dict[str, int] = defaultdict(int)
+        for _, freqs in stats:
+            for term, df in freqs.items():
+                doc_freq[term] += df
+        return {term: bm25_idf(total_chunks, df) for term, df in doc_freq.items()}
+
+    async def _fan_out(
+        self, query: str, targets: Dict[str, str], top_k: int, method: Optional[str]
+    ) -> List[tuple]:
+        """Search each document and keep the best top_k overall
+
+        BM25 scores are made comparable across documents by searching every
+        document with the IDF of the query terms over all of them. Each
+        document's BM25 index is memory-mapped from disk, so neither pass
+        rebuilds anything.
+        """
+        self._check_fan_out(len(targets))
+        pdf_ids, doc_ids = list(targets), list(targets.values())
+        idf = None
+        if (method or settings.RETRIEVAL_METHOD) == "bm25" and len(targets) > 1:
+            idf = await self._corpus_idf(query, doc_ids)
+
+        per_document = await self._map_documents(
+            lambda doc_id: self.embedding_service.search_document(
+                doc_id, query, top_k, method, idf
+            ),
+            doc_ids,
+        )
+        return heapq.nlargest(
+            top_k,
+            (
+                (score, pdf_id, doc_id, chunk_id)
+                for pdf_id, doc_id, ranked in zip(pdf_ids, doc_ids, per_document)
+                for score, chunk_id in ranked
+            ),
+            key=lambda result: result[0],
+        )
+
+
+def _apply_each(func: Callable, items: List) -> List:
+    return [func(item) for item in items]
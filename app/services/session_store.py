@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from ..core.config import get_settings
+from ..core.logging import setup_logging
+from ..utils.cache import LRUCache
+from ..utils.chunking import CHARS_PER_TOKEN, estimate_tokens
+
+settings = get_settings()
+logger = setup_logging()
+
+Turn = Tuple[str, str]
+
+
+def render_turns(turns: List[Turn]) -> str:
+    return "\n".join(
+        f"User: {question}\nAssistant: {answer}" for question, answer in turns
+    )
+
+
+class ChatSession:
+    """A conversation about one PDF: a running summary plus recent turns
+
+    Recent turns are kept verbatim within ``history_max_tokens``. Older
+    turns are handed back by ``add_turn`` to be folded into the summary, so
+    the history sent with each prompt stays roughly the same size however
+    long the conversation runs. ``turn_lock`` serializes recording a turn
+    with folding its overflow into the summary, so concurrent turns do not
+    summarize the same old summary and overwrite each other.
+    """
+
+    def __init__(self, pdf_id: str, history_max_tokens: int):
+        self.session_id = str(uuid.uuid4())
+        self.pdf_id = pdf_id
+        self.history_max_tokens = history_max_tokens
+        self.summary = ""
+        self.turns: List[Turn] = []
+        self.compactions = 0
+        self.created_at = datetime.utcnow()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+        self._turn_lock: Optional[asyncio.Lock] = None
+        self._turn_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def turn_lock(self) -> asyncio.Lock:
+        """The turn lock for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._turn_lock_loop is not loop:
+            self._turn_lock_loop = loop
+            self._turn_lock = asyncio.Lock()
+        return self._turn_lock
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.summary and not self.turns
+
+    @property
+    def last_question(self) -> Optional[str]:
+        return self.turns[-1][0] if self.turns else None
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(render_turns(self.turns))
+
+    def add_turn(self, question: str, answer: str) -> List[Turn]:
+        """Record a turn, returning older turns that no longer fit verbatim"""
+        # A single oversized answer must not blow the budget on its own
+        answer = answer[: self.history_max_tokens * CHARS_PER_TOKEN]
+        with self.lock:
+            self.turns.append((question, answer))
+            self.updated_at = datetime.utcnow()
+            overflow = []
+            while (
+                len(self.turns) > 1 and self.history_tokens() > self.history_max_tokens
+            ):
+                overflow.append(self.turns.pop(0))
+            return overflow
+
+    def render(self) -> str:
+        """History for the prompt: the summary, then the recent turns"""
+        with self.lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Summary of the earlier conversation: {self.summary}")
+            if self.turns:
+                parts.append(render_turns(self.turns))
+            return "\n\n".join(parts)
+
+    def nbytes(self) -> int:
+        return len(self.summary.encode("utf-8")) + sum(
+            len(question.encode("utf-8")) + len(answer.encode("utf-8"))
+            for question, answer in self.turns
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "pdf_id": self.pdf_id,
+            "turns": len(self.turns),
+            "compactions": self.compactions,
+            "history_tokens": self.history_tokens(),
+            "summary_tokens": estimate_tokens(self.summary),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class SessionStore:
+    """Conversation sessions held in memory, expiring after ``ttl`` idle seconds"""
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        history_max_tokens: Optional[int] = None,
+    ):
+        self.history_max_tokens = (
+            history_max_tokens or settings.SESSION_HISTORY_MAX_TOKENS
+        )
+        self.sessions = LRUCache(
+            max_bytes or settings.SESSION_MAX_BYTES,
+            settings.SESSION_TTL if ttl is None else ttl,
+            # Count a little for the session itself so empty ones still weigh
+            sizeof=lambda session: session.nbytes() + 256,
+        )
+        self.compactions = 0
+
+    def create(self, pdf_id: str) -> ChatSession:
+        session = ChatSession(pdf_id, self.history_max_tokens)
+        self.sessions.put(session.session_id, session)
+        logger.info(f"Created chat session {session.session_id} for {pdf_id}")
+        return session
+
+    def get(self, session_id: str, pdf_id: Optional[str] = None) -> ChatSession:
+        """Look up a live session, raising 404 if unknown or for another PDF"""
+        session = self.sessions.get(session_id)
+        if session is None or (pdf_id is not None and session.pdf_id != pdf_id):
+            raise HTTPException(status_code=404, detail="Chat session not found")
+        return session
+
+    def save(self, session: ChatSession):
+        """Store a session again after a turn, refreshing its size and expiry"""
+        self.sessions.put(session.session_id, session)
+
+    def compact(self, session: ChatSession, summary: str):
+        """Replace a session's summary with one that covers its dropped turns"""
+        with session.lock:
+            session.summary = summary
+            session.compactions += 1
+        self.compactions += 1
+        self.save(session)
+
+    def delete(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id) is not None
+
+    def stats(self) -> Dict:
+        stats = self.sessions.stats()
+        return {
+            "sessions": stats["entries"],
+            "bytes": stats["bytes"],
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+            "compactions": self.compactions,
+        }
+
+
+@lru_cache()
+def get_session_store() -> SessionStore:
+    return SessionStore()
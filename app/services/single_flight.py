@@ -0,0 +1,205 @@
+import asyncio
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List
+from typing import Optional, Tuple
+from ..core.logging import setup_logging
+
+logger = setup_logging()
+
+
+class StreamCancelled(Exception):
+    """The shared upstream stream stopped before it finished"""
+
+
+class _Broadcast:
+    """Fans one upstream stream out to any number of subscribers
+
+    Pieces are kept so late subscribers replay from the start. The
+    upstream is cancelled once every subscriber has gone away; if it stops
+    early for any other reason, subscribers get a StreamCancelled error
+    rather than a silently truncated stream.
+    """
+
+    def __init__(self, source: AsyncIterator[str], info: Dict):
+        self.info = info
+        self.pieces: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for piece in source:
+                self.pieces.append(piece)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        except BaseException:
+            self.error = StreamCancelled("The shared stream was cancelled")
+            raise
+        finally:
+            self.done = True
+            self._notify()
+            await source.aclose()
+
+    def subscribe(self) -> "_Subscription":
+        """A new subscription, counted from now on even before it is iterated"""
+        return _Subscription(self)
+
+    def _unsubscribe(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            logger.info("All subscribers left, cancelling shared stream")
+            try:
+                self.task.cancel()
+            except RuntimeError:
+                pass  # The event loop has already closed
+
+
+class _Subscription:
+    """One subscriber's position in a broadcast
+
+    Leaves the broadcast when exhausted, closed or garbage collected, so a
+    subscription handed out but never iterated still counts until then.
+    """
+
+    def __init__(self, broadcast: _Broadcast):
+        self._broadcast = broadcast
+        self._position = 0
+        self._closed = False
+        broadcast.subscribers += 1
+
+    def __aiter__(self) -> "_Subscription":
+        return self
+
+    async def __anext__(self) -> str:
+        broadcast = self._broadcast
+        while not self._closed:
+            changed = broadcast._changed
+            if self._position < len(broadcast.pieces):
+                self._position += 1
+                return broadcast.pieces[self._position - 1]
+            if broadcast.done:
+                self._leave()
+                if broadcast.error is not None:
+                    raise broadcast.error
+                break
+            await changed.wait()
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        self._leave()
+
+    def _leave(self):
+        if not self._closed:
+            self._closed = True
+            self._broadcast._unsubscribe()
+
+    def __del__(self):
+        self._leave()
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls into one
+
+    Callers with the same key that arrive while a call is in flight await
+    that call's result instead of starting their own. The shared call runs
+    as its own task, so the first caller going away does not cancel it for
+    the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.streams = 0
+        self.coalesced_streams = 0
+
+    @staticmethod
+    def _join(flights: Dict[Hashable, asyncio.Future], key: Hashable):
+        """The in-flight task for key on the running event loop, if any"""
+        task = flights.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return task
+        return None
+
+    def _forget(
+        self, flights: Dict[Hashable, asyncio.Future], key: Hashable, task
+    ) -> Callable:
+        def forget(_):
+            if flights.get(key) is task:
+                del flights[key]
+
+        return forget
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Return func()'s result, sharing one call among identical keys"""
+        task = self._join(self._calls, key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = self._calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(self._forget(self._calls, key, task))
+        return await asyncio.shield(task)
+
+    async def stream(
+        self,
+        key: Hashable,
+        open_stream: Callable[[], Awaitable[Tuple[AsyncIterator[str], Dict]]],
+    ) -> Tuple[AsyncIterator[str], Dict, bool]:
+        """Subscribe to a shared stream, opening it if none is in flight
+
+        ``open_stream`` returns the upstream iterator and details about it.
+        Returns a subscription, those details, and whether it was coalesced.
+        """
+        task = self._join(self._streams, key)
+        coalesced = task is not None
+        if coalesced:
+            self.coalesced_streams += 1
+        else:
+            self.streams += 1
+            task = self._streams[key] = asyncio.ensure_future(
+                self._open_broadcast(open_stream)
+            )
+            forget = self._forget(self._streams, key, task)
+
+            # The flight lasts until the upstream stream finishes
+            def on_open(opened: asyncio.Future):
+                if opened.cancelled() or opened.exception() is not None:
+                    forget(opened)
+                else:
+                    opened.result().task.add_done_callback(forget)
+
+            task.add_done_callback(on_open)
+
+        broadcast = await asyncio.shield(task)
+        return broadcast.subscribe(), broadcast.info, coalesced
+
+    @staticmethod
+    async def _open_broadcast(
+        open_stream: Callable[[], Awaitable[Tuple[AsyncIterator[str], Dict]]],
+    ) -> _Broadcast:
+        source, info = await open_stream()
+        return _Broadcast(source, info)
+
+    def get_stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "streams": self.streams,
+            "coalesced_streams": self.coalesced_streams,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
+
+
+@lru_cache()
+def get_single_flight() -> SingleFlight:
+    return SingleFlight()
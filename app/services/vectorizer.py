@@ -0,0 +1,82 @@
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import numpy as np
+from ..core.config import get_settings
+from .search_index import tokenize
+
+settings = get_settings()
+
+
+@lru_cache(maxsize=65536)
+def _hash_token(token: str, dim: int) -> Tuple[int, float]:
+    """Map a token to a stable bucket and sign (crc32 is identical in every process)"""
+    digest = zlib.crc32(token.encode("utf-8"))
+    return digest % dim, 1.0 if digest & 0x80000000 else -1.0
+
+
+class HashingVectorizer:
+    """Local TF-IDF vectors over hashed token buckets
+
+    No vocabulary or model is needed: tokens are hashed into ``dim`` signed
+    buckets, weighted with sublinear TF and the document's IDF, and rows are
+    L2-normalized so a dot product is a cosine similarity.
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or settings.EMBEDDING_DIM
+
+    def _term_matrix(self, texts: List[str]) -> np.ndarray:
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            for token, count in Counter(tokenize(text)).items():
+                bucket, sign = _hash_token(token, self.dim)
+                rows.append(row)
+                cols.append(bucket)
+                values.append(sign * (1.0 + np.log(count)))
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (rows, cols), values)
+        return matrix
+
+    def fit_transform(self, chunks: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorize a document's chunks, returning the matrix and its IDF weights"""
+        matrix = self._term_matrix(chunks)
+        idf = idf_weights(np.count_nonzero(matrix, axis=0), len(chunks))
+        matrix *= idf
+        return np.ascontiguousarray(l2_normalize(matrix)), idf
+
+    def transform_query(self, query: str, idf: np.ndarray) -> np.ndarray:
+        """Vectorize a query with a document's (or the corpus') IDF weights"""
+        return l2_normalize(self._term_matrix([query])[0] * idf)
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows (or a single vector) to unit length, leaving zeros alone"""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def idf_weights(doc_freq: np.ndarray, n_rows: int) -> np.ndarray:
+    """Smoothed IDF of each bucket from the number of rows it occurs in"""
+    return (np.log((1 + n_rows) / (1 + doc_freq)) + 1).astype(np.float32)
+
+
+def top_k(
+    scores: np.ndarray, k: int, min_score: Optional[float] = 0.0
+) -> List[Tuple[float, int]]:
+    """Return the k best ``(score, index)`` pairs above min_score, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    candidates = (
+        np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(k)
+    )
+    ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [
+        (float(scores[i]), int(i))
+        for i in ranked
+        if min_score is None or scores[i] > min_score
+    ]
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by an approximate size in bytes
+
+    Entries also expire ``ttl`` seconds after they were stored. A loader
+    passed to ``get`` fills misses transparently. ``on_evict`` is called
+    with the key and value of each entry evicted to stay within budget; it
+    runs under the cache lock and must not block. Hit, miss, load,
+    eviction and expiration counts are kept for ``stats``.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: Optional[float] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self.on_evict = on_evict
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (value, size, expires_at)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._live_entry(key) is not None
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def _live_entry(self, key: Hashable) -> Optional[Tuple[Any, int, float]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def get(
+        self, key: Hashable, loader: Optional[Callable[[Hashable], Any]] = None
+    ) -> Any:
+        """Return a cached value, loading and caching it on a miss if possible"""
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        if loader is None:
+            return None
+        value = loader(key)
+        if value is not None:
+            self.loads += 1
+            self.put(key, value)
+        return value
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        size: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        """Store a value (re-putting an entry refreshes its size and TTL)"""
+        size = self.sizeof(value) if size is None else size
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else float("inf")
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.current_bytes += size
+            self._evict(keep=key)
+
+    def _evict(self, keep: Hashable):
+        """Drop least recently used entries until the budget is met"""
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            value = self._entries[key][0]
+            self._remove(key)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value = self._entries[key][0]
+            self._remove(key)
+            return value
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Snapshot of live entries, least recently used first"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                (key, value)
+                for key, (value, _, expires_at) in self._entries.items()
+                if expires_at > now
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,148 @@
+import math
+import re
+from collections.abc import Sequence
+from typing import Iterable, List, Tuple
+
+# Rough size of a model token in characters of English text
+CHARS_PER_TOKEN = 4
+
+WORD_PATTERN = re.compile(r"\S+")
+SENTENCE_END_PATTERN = re.compile(r"[.!?][\"')\]]*$")
+
+Span = Tuple[int, int]
+
+
+def word_tokens(word: str) -> int:
+    """Approximate the number of model tokens in a single word"""
+    return max(1, math.ceil(len(word) / CHARS_PER_TOKEN))
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in a text"""
+    return sum(word_tokens(m.group()) for m in WORD_PATTERN.finditer(text))
+
+
+def chunk_spans(
+    text: str,
+    max_tokens: int,
+    overlap_tokens: int = 0,
+    snap_to_sentence: bool = True,
+) -> List[Span]:
+    """Split text into ``(start, end)`` character offsets of at most max_tokens
+
+    Consecutive chunks share up to overlap_tokens of trailing words. With
+    snap_to_sentence, a chunk ends at the last sentence boundary in the
+    second half of its window, when there is one. A single word larger
+    than the budget becomes a chunk of its own. Overlap is capped at half
+    the budget so every chunk advances by at least half a window.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    words = [(m.start(), m.end()) for m in WORD_PATTERN.finditer(text)]
+    costs = [word_tokens(text[start:end]) for start, end in words]
+    spans: List[Span] = []
+
+    first = 0
+    while first < len(words):
+        # Grow the window until the token budget is spent
+        last, budget = first, 0
+        while last < len(words) and (
+            last == first or budget + costs[last] <= max_tokens
+        ):
+            budget += costs[last]
+            last += 1
+
+        if snap_to_sentence and last < len(words):
+            for candidate in range(last, first + (last - first) // 2, -1):
+                start, end = words[candidate - 1]
+                if SENTENCE_END_PATTERN.search(text, start, end):
+                    last = candidate
+                    break
+
+        spans.append((words[first][0], words[last - 1][1]))
+        if last >= len(words):
+            break
+
+        # Step back over up to overlap_tokens words, always moving forward
+        next_first, overlap = last, 0
+        while (
+            next_first - 1 > first and overlap + costs[next_first - 1] <= overlap_tokens
+        ):
+            next_first -= 1
+            overlap += costs[next_first]
+        first = next_first
+
+    return spans
+
+
+class TextChunks(Sequence):
+    """Chunks of a text stored as offsets; strings are sliced out on access"""
+
+    def __init__(self, text: str, spans: List[Span]):
+        self.text = text
+        self.spans = spans
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self.spans[i]
+        return self.text[start:end]
+
+    def excerpt(self, start: int, end: int) -> str:
+        """The text between two offsets, which may span several chunks"""
+        return self.text[start:end]
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int,
+    overlap_tokens: int = 0,
+    snap_to_sentence: bool = True,
+) -> TextChunks:
+    """Chunk text lazily; see chunk_spans"""
+    return TextChunks(
+        text, chunk_spans(text, max_tokens, overlap_tokens, snap_to_sentence)
+    )
+
+
+def pack_chunks(chunks: Iterable[str], max_tokens: int) -> List[str]:
+    """Greedily keep chunks, in the given order, that fit within max_tokens
+
+    A chunk too large for the remaining budget is skipped so smaller,
+    lower-ranked chunks can still fill it.
+    """
+    packed, budget = [], max_tokens
+    for chunk in chunks:
+        cost = estimate_tokens(chunk)
+        if cost <= budget:
+            packed.append(chunk)
+            budget -= cost
+    return packed
+
+
+def merge_spans(spans: Iterable[Span]) -> List[Span]:
+    """Sort spans by position and merge the ones that overlap or touch"""
+    merged: List[Span] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def pack_excerpts(chunks, chunk_ids: Iterable[int], max_tokens: int) -> List[str]:
+    """Greedily keep ranked chunks that fit within max_tokens, in document order
+
+    ``chunks`` holds ``spans`` and an ``excerpt(start, end)`` method, like
+    TextChunks. Overlapping chunks are merged into one excerpt, so text they
+    share is sent, and counted against the budget, only once.
+    """
+    packed: List[Span] = []
+    for chunk_id in chunk_ids:
+        start, end = chunks.spans[chunk_id]
+        candidate = merge_spans(packed + [(int(start), int(end))])
+        cost = sum(estimate_tokens(chunks.excerpt(*span)) for span in candidate)
+        if cost <= max_tokens:
+            packed = candidate
+    return [chunks.excerpt(*span) for span in packed]
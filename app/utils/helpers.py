@@ -3,6 +3,7 @@ from pathlib import Path
 from typing import List, Dict
 from fastapi import HTTPException
 from ..core.config import get_settings
+from .chunking import CHARS_PER_TOKEN, chunk_text as chunk_text_spans
 
 settings = get_settings()
 
@@ -30,6 +31,6 @@ def validate_file_type(filename: str) -> bool:
 
 def chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
     """
-    Split text into chunks for processing
+    Split text into chunks of roughly chunk_size characters for processing
     """
-    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+    return list(chunk_text_spans(text, max(1, chunk_size // CHARS_PER_TOKEN)))
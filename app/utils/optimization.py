@@ -1,18 +1,20 @@
 from typing import List, Dict
 import asyncio
 from ..core.config import get_settings
+from .chunking import CHARS_PER_TOKEN, chunk_text as chunk_text_spans
 
 settings = get_settings()
 
 
 async def chunk_text(text: str) -> List[str]:
     """Split text into manageable chunks"""
-    chunks = []
-    length = len(text)
-    for i in range(0, length, settings.CHUNK_SIZE):
-        chunk = text[i : i + settings.CHUNK_SIZE]
-        chunks.append(chunk)
-    return chunks
+    return list(
+        chunk_text_spans(
+            text,
+            max(1, settings.CHUNK_SIZE // CHARS_PER_TOKEN),
+            settings.CHUNK_OVERLAP_TOKENS,
+        )
+    )
 
 
 async def process_large_document(text: str) -> List[Dict]:
@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 from dotenv import load_dotenv
@@ -34,6 +35,9 @@ def upload_pdf():
                         st.success("Upload successful!")
                         st.session_state["pdf_id"] = pdf_info["pdf_id"]
                         st.session_state["pdf_info"] = pdf_info
+                        # A new document starts a new conversation
+                        st.session_state.pop("chat_session_id", None)
+                        st.session_state["messages"] = []
                         st.json(pdf_info)
                     else:
                         st.error(f"Upload failed: {response.text}")
@@ -41,6 +45,48 @@ def upload_pdf():
                     st.error(f"Error: {str(e)}")
 
 
+def start_chat_session(pdf_id):
+    """Start a server-side conversation so follow-ups keep their context"""
+    response = requests.post(
+        f"{API_URL}/chat/{pdf_id}/sessions", headers={"X-API-Key": API_KEY}
+    )
+    response.raise_for_status()
+    st.session_state["chat_session_id"] = response.json()["session_id"]
+    return st.session_state["chat_session_id"]
+
+
+def post_question(pdf_id, question, headers):
+    """Ask a question in the chat session, restarting it if it expired"""
+    for _ in range(2):
+        session_id = st.session_state.get("chat_session_id") or start_chat_session(
+            pdf_id
+        )
+        response = requests.post(
+            f"{API_URL}/chat/{pdf_id}/stream",
+            headers=headers,
+            json={"message": question, "session_id": session_id},
+            stream=True,
+        )
+        if response.status_code != 404:
+            break
+        st.session_state.pop("chat_session_id", None)
+    return response
+
+
+def stream_answer(response):
+    """Yield the text of each token event from a chat SSE stream"""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: ") :]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: ") :])
+            if event == "token":
+                yield data["text"]
+            elif event == "error":
+                raise RuntimeError(data["detail"])
+
+
 def chat_with_pdf():
     st.header("Chat with PDF")
 
@@ -76,14 +122,12 @@ def chat_with_pdf():
             headers = {"X-API-Key": API_KEY, "Content-Type": "application/json"}
 
             try:
-                response = requests.post(
-                    f"{API_URL}/chat/{pdf_id}",
-                    headers=headers,
-                    json={"message": user_input},
-                )
+                response = post_question(pdf_id, user_input, headers)
 
                 if response.status_code == 200:
-                    ai_response = response.json()["response"]
+                    # Show the answer as it is generated
+                    with st.chat_message("assistant"):
+                        ai_response = st.write_stream(stream_answer(response))
                     # Add AI response to history
                     st.session_state["messages"].append(
                         {"role": "assistant", "content": ai_response}
@@ -97,6 +141,12 @@ def chat_with_pdf():
     # Clear chat button (outside the form)
     if st.button("Clear Chat History", key="clear_button"):
         st.session_state["messages"] = []
+        session_id = st.session_state.pop("chat_session_id", None)
+        if session_id:
+            requests.delete(
+                f"{API_URL}/chat/sessions/{session_id}",
+                headers={"X-API-Key": API_KEY},
+            )
         st.rerun()
 
 
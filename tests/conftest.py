@@ -12,6 +12,8 @@ from . import test_env
 from fastapi.testclient import TestClient
 from app.main import app
 from app.core.config import get_settings
+from app.core.security import rate_limiter
+from app.services.ann_index import get_corpus_index
 
 # Load environment variables from .env if they exist
 load_dotenv()
@@ -42,6 +44,12 @@ def test_pdf_content():
     return pdf_buffer
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    """Give every test a fresh rate limit window"""
+    rate_limiter.requests.clear()
+
+
 @pytest.fixture(autouse=True)
 def cleanup_test_files():
     """Clean up test files after each test"""
@@ -51,3 +59,8 @@ def cleanup_test_files():
     for dir_path in test_dirs:
         if dir_path.exists():
             shutil.rmtree(dir_path)
+
+    # Services hold the removed directories; the next test builds fresh ones
+    app.state.services = None
+    get_corpus_index().stop()
+    get_corpus_index.cache_clear()
@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.services.ann_index import CorpusIndex, IVFIndex
+from app.services.chunk_store import ChunkStore
+
+
+def clustered_vectors(rng, n_clusters=16, per_cluster=50, dim=32):
+    centers = rng.normal(size=(n_clusters, dim))
+    points = centers.repeat(per_cluster, axis=0) + 0.1 * rng.normal(
+        size=(n_clusters * per_cluster, dim)
+    )
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points.astype(np.float32)
+
+
+def test_search_is_exact_before_training():
+    """Test that small corpora are searched exhaustively"""
+    rng = np.random.default_rng(1)
+    index = IVFIndex(dim=32, nlist=64)
+    vectors = clustered_vectors(rng, n_clusters=4, per_cluster=5)
+    index.add("doc-1", vectors)
+
+    assert not index.is_trained
+    assert index.search(vectors[3], 1)[0][1:] == ("doc-1", 3)
+
+
+def test_ivf_recall_and_incremental_insert():
+    """Test recall against exact search, incremental insert and removal"""
+    rng = np.random.default_rng(2)
+    vectors = clustered_vectors(rng)
+    index = IVFIndex(dim=32, nlist=16)
+    for doc_num, doc_vectors in enumerate(np.split(vectors, 20)):
+        index.add(f"doc-{doc_num}", doc_vectors)
+
+    # Training runs off the caller's thread
+    index.wait_for_training()
+    assert index.is_trained
+    assert len(index) == len(vectors)
+
+    queries = vectors[rng.choice(len(vectors), 20, replace=False)]
+    report = index.benchmark(queries, k=5, nprobe_values=(1, 16))
+    assert report[1]["recall"] == pytest.approx(1.0)
+    assert report[0]["recall"] >= 0.5
+
+    index.remove("doc-0")
+    assert "doc-0" not in index
+    assert all(doc_id != "doc-0" for _, doc_id, _ in index.search(vectors[0], 10, 16))
+
+
+def test_corpus_idf_is_shared_by_vectors_and_queries():
+    """Test that documents and queries are weighted with one corpus IDF"""
+    index = IVFIndex(dim=4, nlist=1, background_training=False)
+    # Bucket 0 occurs in every row, bucket 3 in one row only
+    rows = np.array([[1, 1, 0, 0], [1, 0, 1, 0], [1, 0, 0, 1]], dtype=np.float32)
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    # Each document's vectors arrive weighted with its own (different) IDF
+    index.add("doc-a", rows[:2] * 2, np.full(4, 2, dtype=np.float32))
+    index.add("doc-b", rows[2:], np.ones(4, dtype=np.float32))
+    index.train()
+
+    assert index.idf[0] < index.idf[3]
+    # A query on the common and the rare bucket prefers the rare bucket's row
+    results = index.search(np.array([1, 0, 0, 1], dtype=np.float32), 3)
+    assert results[0][1:] == ("doc-b", 0)
+    assert index.search_exact(np.array([1, 0, 0, 1], dtype=np.float32), 1) == [
+        results[0]
+    ]
+
+
+def test_trained_lists_are_memory_mapped_and_shared(tmp_path):
+    """Test that a second worker maps the snapshot instead of copying vectors"""
+    rng = np.random.default_rng(3)
+    vectors = clustered_vectors(rng)
+    index = IVFIndex(dim=32, nlist=16, background_training=False, snapshot_dir=tmp_path)
+    for doc_num, doc_vectors in enumerate(np.split(vectors, 20)):
+        index.add(f"doc-{doc_num}", doc_vectors)
+    index.train()
+
+    assert isinstance(index.snapshot.vectors, np.memmap)
+    assert index.unsaved_rows == 0 and len(index) == len(vectors)
+
+    worker = IVFIndex(dim=32, nlist=16, snapshot_dir=tmp_path)
+    assert worker.load_snapshot()
+    assert worker.is_trained and worker.unsaved_rows == 0
+    assert worker.search(vectors[7], 5, 16) == index.search(vectors[7], 5, 16)
+
+    # Removed documents are masked until the next training
+    worker.remove("doc-0")
+    assert len(worker) == len(vectors) - 40
+    assert all(doc_id != "doc-0" for _, doc_id, _ in worker.search(vectors[0], 10, 16))
+    worker.train()
+    assert "doc-0" not in worker.snapshot.documents
+    assert index.load_snapshot() and "doc-0" not in index
+
+
+def test_documents_added_while_training_are_kept(tmp_path):
+    """Test that rows inserted during training survive the snapshot swap"""
+    rng = np.random.default_rng(4)
+    vectors = clustered_vectors(rng)
+    index = IVFIndex(dim=32, nlist=16, background_training=False, snapshot_dir=tmp_path)
+    index.add("doc-a", vectors[:700])
+
+    write_snapshot = index._write_snapshot
+
+    def add_during_write(*args):
+        index.add("doc-b", vectors[700:])
+        index.remove("doc-a")
+        index.add("doc-a", vectors[:10])
+        return write_snapshot(*args)
+
+    index._write_snapshot = add_during_write
+    index.train()
+
+    assert len(index) == len(vectors) - 690
+    assert index.unsaved_rows == 110
+    results = index.search_exact(vectors[750], 1)
+    assert results[0][1:] == ("doc-b", 50)
+    assert {doc_id for _, doc_id, _ in index.search_exact(vectors[5], 50)} <= {
+        "doc-a",
+        "doc-b",
+    }
+    assert index.search_exact(vectors[5], 1)[0][1:] == ("doc-a", 5)
+
+
+def test_corpus_index_syncs_in_the_background_not_in_search(tmp_path):
+    """Test that stored documents are picked up by the sync thread, not by search"""
+    rng = np.random.default_rng(5)
+    vectors = clustered_vectors(rng)[:20]
+    store = ChunkStore(tmp_path / "index")
+    store.save("doc-1", [f"chunk {i}" for i in range(20)], vectors, np.ones(32))
+    corpus = CorpusIndex(store, tmp_path / "ann")
+    corpus.index = IVFIndex(dim=32, nlist=16, snapshot_dir=tmp_path / "ann")
+
+    assert corpus.search(vectors[3], 1) == []
+
+    corpus.start()
+    try:
+        deadline = time.monotonic() + 5
+        while corpus.document_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert corpus.search(vectors[3], 1)[0][1:] == ("doc-1", 3)
+    finally:
+        corpus.stop()
@@ -0,0 +1,52 @@
+import time
+from app.services.answer_cache import AnswerCache, normalize_query
+
+CONFIG = {"model": "gemini-pro", "temperature": 0.7}
+
+
+def test_normalize_query_folds_trivial_differences():
+    """Test that equivalent phrasings normalize to the same text"""
+    assert normalize_query("  What is the REFUND   policy? ") == (
+        normalize_query("what is the refund policy")
+    )
+    assert normalize_query("refund policy") != normalize_query("shipping policy")
+
+
+def test_key_changes_with_document_content_and_config():
+    """Test that a changed document or config misses the cache"""
+    key = AnswerCache.make_key("pdf-1", "hash-a", "What is it?", CONFIG)
+    assert key == AnswerCache.make_key("pdf-1", "hash-a", "what is it", CONFIG)
+    assert key != AnswerCache.make_key("pdf-1", "hash-b", "What is it?", CONFIG)
+    assert key != AnswerCache.make_key(
+        "pdf-1", "hash-a", "What is it?", {**CONFIG, "temperature": 0.2}
+    )
+
+
+def test_memory_tier_hits_and_stats():
+    """Test memory hits and the hit rate"""
+    cache = AnswerCache(max_bytes=1024, ttl=60, cache_dir="")
+    key = AnswerCache.make_key("pdf-1", "hash-a", "q", CONFIG)
+    assert cache.get(key) is None
+    cache.put(key, "answer")
+    assert cache.get(key) == "answer"
+
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_disk_tier_survives_a_new_cache_and_expires(tmp_path):
+    """Test that answers persist on disk and honour the TTL there"""
+    key = AnswerCache.make_key("pdf-1", "hash-a", "q", CONFIG)
+    AnswerCache(ttl=60, cache_dir=str(tmp_path)).put(key, "answer")
+
+    cache = AnswerCache(ttl=60, cache_dir=str(tmp_path))
+    assert cache.get(key) == "answer"
+    assert cache.get(key) == "answer"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+    AnswerCache(ttl=0.05, cache_dir=str(tmp_path)).put(key, "stale")
+    time.sleep(0.06)
+    assert AnswerCache(ttl=60, cache_dir=str(tmp_path)).get(key) is None
+    assert not list(tmp_path.rglob("*.json"))
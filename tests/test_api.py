@@ -26,3 +26,55 @@ def test_environment_variables():
     """Test that required environment variables are set"""
     assert os.getenv("GEMINI_API_KEY") is not None
     assert os.getenv("API_KEY") is not None
+
+
+def test_services_are_shared_across_requests(client, api_key_headers):
+    """Test that routes get the app-scoped services instead of new ones"""
+    from app.main import app
+
+    client.get("/v1/pdf/missing/status", headers=api_key_headers)
+    services = app.state.services
+    assert services is not None
+
+    client.get("/v1/pdf/missing/status", headers=api_key_headers)
+    assert app.state.services is services
+    assert services.llm_service.pdf_service is services.pdf_service
+
+
+def test_requests_construct_no_services(client, api_key_headers, monkeypatch):
+    """Test that chat and search requests reuse services instead of building them"""
+    from app.services import llm_service, pdf_service, search_service
+
+    client.get("/v1/pdf/missing/status", headers=api_key_headers)
+    constructed = []
+    for module, name in (
+        (pdf_service, "PDFService"),
+        (llm_service, "LLMService"),
+        (search_service, "SearchService"),
+    ):
+        cls = getattr(module, name)
+        original = cls.__init__
+
+        def counting_init(self, *args, _original=original, _name=name, **kwargs):
+            constructed.append(_name)
+            _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(cls, "__init__", counting_init)
+
+    for _ in range(3):
+        client.post("/v1/chat/missing", json={"message": "hi"})
+        client.post("/v1/search", json={"query": "hi"}, headers=api_key_headers)
+    assert constructed == []
+
+
+def test_lifespan_creates_and_releases_services(api_key_headers):
+    """Test that the lifespan owns the service container"""
+    from app.main import app
+
+    with TestClient(app) as client:
+        services = app.state.services
+        assert services is not None
+        response = client.get("/v1/pdf/missing/status", headers=api_key_headers)
+        assert response.status_code == 404
+        assert app.state.services is services
+    assert app.state.services is None
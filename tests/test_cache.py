@@ -0,0 +1,56 @@
+import time
+from app.utils.cache import LRUCache
+
+
+def test_lru_entry_is_evicted_when_over_budget():
+    """Test that the least recently used entry goes first"""
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+
+    cache.put("c", "cccc")
+    assert "b" not in cache
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.current_bytes == 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_entry_is_kept_alone():
+    """Test that a single entry larger than the budget still caches"""
+    cache = LRUCache(max_bytes=2, sizeof=len)
+    cache.put("a", "a")
+    cache.put("big", "bigger")
+    assert "a" not in cache
+    assert cache.get("big") == "bigger"
+
+
+def test_entries_expire_after_ttl():
+    """Test TTL expiry"""
+    cache = LRUCache(max_bytes=100, ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_loader_fills_misses_and_counts():
+    """Test transparent loading and the hit/miss counters"""
+    cache = LRUCache(max_bytes=100)
+    calls = []
+
+    def loader(key):
+        calls.append(key)
+        return key.upper() if key != "missing" else None
+
+    assert cache.get("a", loader) == "A"
+    assert cache.get("a", loader) == "A"
+    assert cache.get("missing", loader) is None
+    assert calls == ["a", "missing"]
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["loads"]) == (1, 2, 1)
+    assert stats["hit_rate"] == 1 / 3
@@ -1,5 +1,7 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
+from app.services.llm_backends import LLMBackend
 
 
 def test_chat_without_pdf(client):
@@ -20,3 +22,240 @@ def test_chat_invalid_message(client):
         headers={"X-API-Key": "my-secure-api-key"},
     )
     assert response.status_code == 422
+
+
+def test_chat_context_is_retrieved_chunks(client, api_key_headers, monkeypatch):
+    """Test that large documents contribute only their relevant chunks"""
+    from fpdf import FPDF
+    from app.services import llm_service
+    from app.services.llm_service import LLMService
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.multi_cell(
+        0,
+        10,
+        txt=" ".join(f"Filler sentence number {i} about nothing." for i in range(200))
+        + " The refund policy covers unused items.",
+    )
+    response = client.post(
+        "/v1/pdf",
+        files={"file": ("long.pdf", pdf.output(dest="S").encode("latin-1"))},
+        headers=api_key_headers,
+    )
+    pdf_id = response.json()["pdf_id"]
+
+    service = LLMService()
+    full_text = service.pdf_service.get_pdf_content(pdf_id)
+    monkeypatch.setattr(llm_service.settings, "FULL_DOCUMENT_MAX_TOKENS", 0)
+    monkeypatch.setattr(llm_service.settings, "CONTEXT_MAX_TOKENS", 300)
+
+    context = asyncio.run(service.build_context(pdf_id, "refund policy"))
+    assert "refund policy" in context
+    assert len(context) < len(full_text)
+
+    monkeypatch.setattr(llm_service.settings, "FULL_DOCUMENT_MAX_TOKENS", 10**6)
+    assert asyncio.run(service.build_context(pdf_id, "refund policy")) == full_text
+
+
+class RecordingBackend(LLMBackend):
+    """Answers with fixed pieces and records the prompts it was sent"""
+
+    name = model_name = "recording"
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        return "".join(self.pieces)
+
+    async def stream(self, prompt):
+        self.prompts.append(prompt)
+        for piece in self.pieces:
+            yield piece
+
+
+def test_chat_stream_sends_sse_events(client, api_key_headers, test_pdf_content):
+    """Test streaming an answer as start, token and done events"""
+    import json
+    from app.main import app
+
+    upload = client.post(
+        "/v1/pdf",
+        files={"file": ("test.pdf", test_pdf_content, "application/pdf")},
+        headers=api_key_headers,
+    )
+    pdf_id = upload.json()["pdf_id"]
+    model = RecordingBackend(["The document ", "says hello."])
+    app.state.services.llm_service.backend = model
+
+    with client.stream(
+        "POST", f"/v1/chat/{pdf_id}/stream", json={"message": "What is it?"}
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = response.read().decode()
+
+    events = [
+        (block.split("\n")[0][len("event: ") :], json.loads(block.split("\n")[1][6:]))
+        for block in body.strip().split("\n\n")
+    ]
+    assert [name for name, _ in events] == ["start", "token", "token", "done"]
+    assert "".join(data["text"] for name, data in events if name == "token") == (
+        "The document says hello."
+    )
+    done = events[-1][1]
+    assert done["completion_tokens"] > 0 and done["prompt_tokens"] > 0
+    assert done["time_to_first_token_ms"] <= done["total_ms"]
+    assert "Test PDF Content" in model.prompts[0]
+
+
+def test_chat_stream_frees_its_slot_when_the_client_leaves(monkeypatch):
+    """Test that a disconnect while waiting for a token cancels the upstream"""
+    import time
+    from app.api.routes import chat
+    from app.services.llm_pool import LLMCallPool
+
+    monkeypatch.setattr(chat.settings, "STREAM_DISCONNECT_POLL_INTERVAL", 0.01)
+    cancelled = []
+
+    class LeavingRequest:
+        def __init__(self):
+            self.started = time.monotonic()
+
+        async def is_disconnected(self):
+            return time.monotonic() - self.started > 0.05
+
+    async def slow_upstream():
+        try:
+            await asyncio.sleep(10)
+            yield "too late"
+        finally:
+            cancelled.append(True)
+
+    async def collect(events):
+        return [event async for event in events]
+
+    async def main():
+        pool = LLMCallPool(max_concurrent=1)
+        tokens = await pool.open_stream(slow_upstream())
+        events = chat._chat_events(tokens, {}, LeavingRequest(), time.perf_counter())
+        assert (await events.__anext__()).startswith("event: start")
+        rest = await asyncio.wait_for(collect(events), 1)
+        return rest, pool.get_stats()["in_flight"]
+
+    rest, in_flight = asyncio.run(main())
+    assert rest == []
+    assert cancelled == [True]
+    assert in_flight == 0
+
+
+def test_chat_stream_unknown_pdf(client):
+    """Test that a missing PDF fails before the stream starts"""
+    response = client.post("/v1/chat/missing/stream", json={"message": "hi"})
+    assert response.status_code == 404
+
+
+def test_repeated_question_is_answered_from_cache(
+    client, api_key_headers, test_pdf_content
+):
+    """Test that the answer cache serves repeats on both chat endpoints"""
+    from app.main import app
+
+    upload = client.post(
+        "/v1/pdf",
+        files={"file": ("test.pdf", test_pdf_content, "application/pdf")},
+        headers=api_key_headers,
+    )
+    pdf_id = upload.json()["pdf_id"]
+    model = RecordingBackend(["Cached ", "answer."])
+    app.state.services.llm_service.backend = model
+
+    first = client.post(f"/v1/chat/{pdf_id}", json={"message": "What is it?"})
+    second = client.post(f"/v1/chat/{pdf_id}", json={"message": "what is it"})
+    assert first.json()["response"] == second.json()["response"] == "Cached answer."
+    assert len(model.prompts) == 1
+
+    streamed = client.post(f"/v1/chat/{pdf_id}/stream", json={"message": "What is it"})
+    assert '"cached": true' in streamed.text
+    assert len(model.prompts) == 1
+
+    metrics = client.get("/v1/metrics", headers=api_key_headers).json()
+    assert metrics["answer_cache"]["memory_hits"] >= 2
+    assert metrics["llm_calls"]["in_flight"] == 0
+    assert metrics["resilience"]["breaker"]["state"] == "closed"
+
+
+class EchoBackend(LLMBackend):
+    """Answers with the question found in the prompt, failing on request"""
+
+    name = model_name = "echo"
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        question = prompt.split("User Question: ")[1].split("\n")[0]
+        if question == "fail":
+            from app.services.llm_backends import LLMBackendError
+
+            raise LLMBackendError("boom", retryable=False)
+        return f"answer to {question}"
+
+    async def stream(self, prompt):
+        yield self.generate(prompt)
+
+
+def test_batch_chat_answers_in_order(client, api_key_headers, test_pdf_content):
+    """Test that a batch returns one result per question, in order"""
+    import json
+    from app.main import app
+
+    upload = client.post(
+        "/v1/pdf",
+        files={"file": ("test.pdf", test_pdf_content, "application/pdf")},
+        headers=api_key_headers,
+    )
+    pdf_id = upload.json()["pdf_id"]
+    model = EchoBackend()
+    app.state.services.llm_service.backend = model
+    questions = [f"question {i}" for i in range(10)] + ["fail"]
+
+    response = client.post(f"/v1/chat/{pdf_id}/batch", json={"messages": questions})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == list(range(11))
+    assert [r["response"] for r in results[:10]] == [
+        f"answer to {q}" for q in questions[:10]
+    ]
+    assert results[10]["response"] is None and results[10]["status_code"] == 502
+    assert all("Test PDF Content" in prompt for prompt in model.prompts)
+
+    streamed = client.post(
+        f"/v1/chat/{pdf_id}/batch",
+        json={"messages": ["stream me", "fail"], "stream": True},
+    )
+    events = [
+        (block.split("\n")[0][len("event: ") :], json.loads(block.split("\n")[1][6:]))
+        for block in streamed.text.strip().split("\n\n")
+    ]
+    assert [name for name, _ in events] == ["start", "result", "result", "done"]
+    assert sorted(data["index"] for name, data in events if name == "result") == [0, 1]
+    assert events[-1][1]["succeeded"] == 1 and events[-1][1]["failed"] == 1
+
+
+def test_batch_chat_validation(client, monkeypatch):
+    """Test batch requests for unknown PDFs or with too many questions"""
+    from app.api.routes import chat
+
+    response = client.post("/v1/chat/missing/batch", json={"messages": ["hi"]})
+    assert response.status_code == 404
+    response = client.post("/v1/chat/missing/batch", json={"messages": []})
+    assert response.status_code == 422
+    monkeypatch.setattr(chat.settings, "BATCH_MAX_QUESTIONS", 2)
+    response = client.post("/v1/chat/missing/batch", json={"messages": ["a"] * 3})
+    assert response.status_code == 422
@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+from app.services import chat_service
+from app.services.chat_service import TokenProvider
+
+
+class FakeCredentials:
+    """Service account credentials whose tokens live for a set time"""
+
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.token = None
+        self.expiry = None
+        self.refreshes = 0
+        self.error = None
+
+    def refresh(self, request):
+        if self.error is not None:
+            raise self.error
+        self.refreshes += 1
+        self.token = f"token-{self.refreshes}"
+        self.expiry = datetime.utcnow() + self.lifetime
+
+
+def make_provider(lifetime, loads):
+    provider = TokenProvider("unused.json", refresh_margin=60)
+
+    def load():
+        loads.append(1)
+        return FakeCredentials(lifetime)
+
+    provider._load_credentials = load
+    return provider
+
+
+def test_token_is_cached_until_near_expiry():
+    """Test that the key file is read once and tokens are reused"""
+    loads = []
+    provider = make_provider(timedelta(hours=1), loads)
+
+    async def main():
+        return await asyncio.gather(*(provider.get_token() for _ in range(10)))
+
+    assert set(asyncio.run(main())) == {"token-1"}
+    assert asyncio.run(provider.get_token()) == "token-1"
+    assert loads == [1]
+    assert provider.refreshes == 1
+
+
+def test_token_near_expiry_refreshes_in_background():
+    """Test that a token inside the margin is served while it is replaced"""
+    loads = []
+    provider = make_provider(timedelta(seconds=30), loads)
+
+    async def main():
+        first = await provider.get_token()
+        # Still valid, so it is returned at once and refreshed behind it
+        second = await provider.get_token()
+        await provider._refresh_task
+        return first, second, await provider.get_token()
+
+    assert asyncio.run(main()) == ("token-1", "token-1", "token-2")
+
+
+def test_failed_background_refresh_is_logged_and_retried(caplog):
+    """Test that a background refresh error is logged and not kept around"""
+    loads = []
+    provider = make_provider(timedelta(seconds=30), loads)
+
+    async def main():
+        await provider.get_token()
+        credentials = provider._credentials
+        credentials.error = RuntimeError("token endpoint down")
+        assert await provider.get_token() == "token-1"
+        await asyncio.wait({provider._refresh_task})
+        assert provider._refresh_task is None
+        credentials.error = None
+        await provider.get_token()
+        await provider._refresh_task
+        return await provider.get_token()
+
+    assert asyncio.run(main()) == "token-2"
+    assert "OAuth token refresh failed: token endpoint down" in caplog.text
+
+
+def test_http_client_is_shared():
+    """Test that calls reuse one pooled HTTP/2 client"""
+
+    async def main():
+        client = chat_service.get_http_client()
+        assert chat_service.get_http_client() is client
+        await chat_service.close_http_client()
+        assert chat_service.get_http_client() is not client
+        await chat_service.close_http_client()
+
+    asyncio.run(main())
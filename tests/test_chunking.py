@@ -0,0 +1,81 @@
+import pytest
+from app.utils.chunking import (
+    chunk_spans,
+    chunk_text,
+    estimate_tokens,
+    merge_spans,
+    pack_chunks,
+    pack_excerpts,
+)
+from app.utils.helpers import chunk_text as helpers_chunk_text
+
+TEXT = (
+    "The refund policy covers unused items. Refunds are issued within thirty "
+    "days. Shipping takes five business days. Gift cards cannot be exchanged."
+)
+
+
+def test_spans_cover_text_within_budget():
+    """Test that chunks are offsets into the original text within the budget"""
+    spans = chunk_spans(TEXT, max_tokens=10, snap_to_sentence=False)
+
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(TEXT)
+    assert all(estimate_tokens(TEXT[start:end]) <= 10 for start, end in spans)
+    assert " ".join(TEXT[start:end] for start, end in spans).split() == TEXT.split()
+
+
+def test_chunks_snap_to_sentence_boundaries():
+    """Test that chunks end at a sentence boundary when one is in range"""
+    chunks = chunk_text(TEXT, max_tokens=16)
+
+    assert chunks[0] == "The refund policy covers unused items."
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+
+def test_overlap_repeats_trailing_words():
+    """Test that consecutive chunks share up to the overlap budget"""
+    spans = chunk_spans(TEXT, max_tokens=10, overlap_tokens=3, snap_to_sentence=False)
+
+    for (_, prev_end), (start, _) in zip(spans, spans[1:]):
+        assert start < prev_end
+        assert estimate_tokens(TEXT[start:prev_end]) <= 3
+
+
+def test_oversized_word_becomes_its_own_chunk():
+    """Test that a word larger than the budget does not stall chunking"""
+    text = "short " + "x" * 100 + " tail"
+    assert chunk_text(text, max_tokens=5, overlap_tokens=2)[1] == "x" * 100
+
+
+def test_helpers_chunk_text_uses_shared_chunker():
+    """Test that the helper chunker returns slices of the original text"""
+    chunks = helpers_chunk_text(TEXT, chunk_size=40)
+    assert len(chunks) > 1
+    assert all(chunk in TEXT for chunk in chunks)
+
+
+def test_pack_chunks_fills_budget_in_rank_order():
+    """Test greedy packing skips chunks that no longer fit"""
+    chunks = ["one two three", "x" * 40, "four five"]
+    assert pack_chunks(chunks, max_tokens=6) == ["one two three", "four five"]
+    assert pack_chunks(chunks, max_tokens=0) == []
+
+
+def test_merge_spans_joins_overlaps_in_document_order():
+    """Test overlapping and touching spans become one, sorted by position"""
+    assert merge_spans([(20, 30), (0, 10), (5, 12), (12, 15)]) == [(0, 15), (20, 30)]
+    assert merge_spans([]) == []
+
+
+def test_pack_excerpts_merges_overlapping_chunks_in_document_order():
+    """Test ranked chunks are packed without repeating their shared words"""
+    text = " ".join(f"w{i}" for i in range(12))
+    chunks = chunk_text(text, max_tokens=4, overlap_tokens=2, snap_to_sentence=False)
+    assert chunks[1] == "w2 w3 w4 w5" and chunks[2] == "w4 w5 w6 w7"
+
+    # Chunks 2 and 1 overlap by two words: together they cost 6 tokens, not 8
+    excerpts = pack_excerpts(chunks, [4, 2, 1], max_tokens=10)
+    assert excerpts == ["w2 w3 w4 w5 w6 w7", "w8 w9 w10 w11"]
+    assert pack_excerpts(chunks, [2, 1], max_tokens=5) == ["w4 w5 w6 w7"]
+    assert pack_excerpts(chunks, [2], max_tokens=3) == []
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import pytest
+from app.services.context_cache import ContextCacheRegistry
+from app.services.llm_backends import FakeBackend, LLMBackend
+
+KEY = ("fake", "fake", "hash-a")
+
+
+async def run(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def test_context_is_registered_once():
+    """Test that concurrent first lookups register a context only once"""
+    registry = ContextCacheRegistry(ttl=600, margin=60, max_entries=8)
+    backend = FakeBackend(latency_ms=0, tokens_per_second=0)
+
+    async def lookups():
+        return await asyncio.gather(
+            *(
+                registry.get_or_create(backend, KEY, lambda: "context", run)
+                for _ in range(5)
+            )
+        )
+
+    names = asyncio.run(lookups())
+    assert len(set(names)) == 1 and names[0] in backend.cached_contexts
+    assert registry.stats()["created"] == 1
+
+    registry.invalidate(KEY)
+    assert registry.stats()["invalidations"] == 1
+    assert KEY not in registry.names
+
+
+def test_unsupported_backend_is_skipped():
+    """Test that a backend rejecting context caching is not asked again"""
+    registry = ContextCacheRegistry(ttl=600, margin=60, max_entries=8)
+
+    class RejectingBackend(FakeBackend):
+        supports_context_cache = True
+
+        def create_context_cache(self, context, ttl):
+            return LLMBackend.create_context_cache(self, context, ttl)
+
+    backend = RejectingBackend(latency_ms=0)
+    assert registry.supports(backend)
+    name = asyncio.run(registry.get_or_create(backend, KEY, lambda: "context", run))
+    assert name is None
+    assert not registry.supports(backend)
+    assert registry.stats()["unsupported"] == ["fake/fake"]
+
+
+def drain(registry):
+    """Wait for the registry's pending upstream deletions"""
+    if registry._executor is not None:
+        registry._executor.shutdown(wait=True)
+        registry._executor = None
+
+
+def test_dropped_contexts_are_deleted_upstream():
+    """Test that evicted, invalidated and leftover contexts leave the provider"""
+    registry = ContextCacheRegistry(ttl=600, margin=60, max_entries=2)
+    backend = FakeBackend(latency_ms=0, tokens_per_second=0)
+    keys = [("fake", "fake", f"hash-{i}") for i in range(4)]
+
+    async def register(key):
+        return await registry.get_or_create(backend, key, lambda: key[2], run)
+
+    for key in keys[:3]:
+        asyncio.run(register(key))
+    registry.invalidate(keys[2])
+    registry.purge(keys[1][2])
+    asyncio.run(register(keys[3]))
+    drain(registry)
+    # Evicted by the LRU bound, invalidated and purged
+    assert list(backend.cached_contexts) == [registry.names.get(keys[3])]
+
+    registry.shutdown()
+    assert backend.cached_contexts == {}
+    assert registry.stats()["deleted"] == 4
+
+
+@pytest.fixture
+def cached_pdf(client, api_key_headers, test_pdf_content, monkeypatch):
+    """An uploaded PDF and a fake backend with context caching turned on"""
+    from app.main import app
+    from app.services import llm_service
+
+    monkeypatch.setattr(llm_service.settings, "CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_service.settings, "CONTEXT_CACHE_MIN_TOKENS", 0)
+    upload = client.post(
+        "/v1/pdf",
+        files={"file": ("test.pdf", test_pdf_content, "application/pdf")},
+        headers=api_key_headers,
+    )
+    services = app.state.services
+    backend = FakeBackend(latency_ms=0, tokens_per_second=0)
+    services.llm_service.backend = backend
+    services.llm_service.answer_cache = None
+    services.context_cache.names.clear()
+    return upload.json()["pdf_id"], services, backend
+
+
+def test_chat_reuses_cached_context(client, cached_pdf):
+    """Test that questions reference the registered document context"""
+    pdf_id, services, backend = cached_pdf
+    service = services.llm_service
+    created = services.context_cache.created
+
+    answers = [
+        client.post(f"/v1/chat/{pdf_id}", json={"message": q}).json()["response"]
+        for q in ("What is it?", "Who wrote it?")
+    ]
+    assert services.context_cache.created == created + 1
+    assert len(backend.cached_contexts) == 1
+
+    # The answer is the one the whole prompt would have produced
+    full_text = service.pdf_service.get_pdf_content(pdf_id)
+    full_prompt = service._create_prompt(full_text, "Who wrote it?")
+    assert answers[1] == "".join(backend.answer_tokens(full_prompt))
+
+    with client.stream(
+        "POST", f"/v1/chat/{pdf_id}/stream", json={"message": "Why?"}
+    ) as response:
+        body = response.read().decode()
+    done = json.loads(body.strip().split("\n\n")[-1].split("\n")[1][6:])
+    assert done["context_cached"] is True
+
+
+def test_expired_context_falls_back_to_full_prompt(client, cached_pdf):
+    """Test that a context the provider dropped is replaced transparently"""
+    pdf_id, services, backend = cached_pdf
+    client.post(f"/v1/chat/{pdf_id}", json={"message": "What is it?"})
+    backend.cached_contexts.clear()
+
+    response = client.post(f"/v1/chat/{pdf_id}", json={"message": "Who wrote it?"})
+    assert response.status_code == 200
+    assert services.context_cache.stats()["invalidations"] >= 1
+
+    # The next question registers the context again
+    client.post(f"/v1/chat/{pdf_id}", json={"message": "Why?"})
+    assert len(backend.cached_contexts) == 1
+
+
+def test_deleting_the_pdf_deletes_its_cached_context(
+    client, api_key_headers, cached_pdf
+):
+    """Test that purging a document drops its provider context"""
+    pdf_id, services, backend = cached_pdf
+    client.post(f"/v1/chat/{pdf_id}", json={"message": "What is it?"})
+    assert len(backend.cached_contexts) == 1
+
+    response = client.delete(f"/v1/pdf/{pdf_id}", headers=api_key_headers)
+    assert response.status_code == 200
+    drain(services.context_cache)
+    assert backend.cached_contexts == {}
@@ -0,0 +1,60 @@
+import json
+import pytest
+from app.services.document_store import (
+    BinaryDocumentStore,
+    DocumentStore,
+    JSONDocumentStore,
+)
+
+PAGES = ["First page text", "", "Third page with ünïcode"]
+METADATA = {"pdf_id": "doc-1", "filename": "test.pdf", "pages": 3}
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib", "zstd"])
+def test_binary_store_round_trip(tmp_path, codec):
+    """Test metadata, full text and single page reads from the binary format"""
+    store = BinaryDocumentStore(tmp_path, codec=codec)
+    store.save("doc-1", METADATA, PAGES)
+
+    assert store.exists("doc-1")
+    assert store.load_metadata("doc-1") == METADATA
+    assert store.load_text("doc-1") == "First page text\n\nThird page with ünïcode"
+    assert store.load_page("doc-1", 2) == PAGES[2]
+    with pytest.raises(IndexError):
+        store.load_page("doc-1", 3)
+
+    store.delete("doc-1")
+    assert not store.exists("doc-1")
+
+
+def test_binary_store_reads_legacy_json(tmp_path):
+    """Test that documents stored as JSON before the binary format stay readable"""
+    legacy = {**METADATA, "text_content": "Legacy text"}
+    (tmp_path / "doc-1.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    store = BinaryDocumentStore(tmp_path)
+    assert store.exists("doc-1")
+    assert store.load_text("doc-1") == "Legacy text"
+    assert store.load_metadata("doc-1") == METADATA
+
+
+def test_json_store_round_trip(tmp_path):
+    """Test the JSON storage backend"""
+    store = JSONDocumentStore(tmp_path)
+    store.save("doc-1", METADATA, PAGES)
+
+    assert store.load_metadata("doc-1") == METADATA
+    assert store.load_page("doc-1", 0) == PAGES[0]
+    with pytest.raises(FileNotFoundError):
+        store.load_text("missing")
+
+
+def test_incomplete_store_cannot_be_created():
+    """Test that a backend missing part of the interface fails at construction"""
+
+    class WriteOnlyStore(DocumentStore):
+        def save(self, doc_id, metadata, page_texts):
+            pass
+
+    with pytest.raises(TypeError):
+        WriteOnlyStore()
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+from app.services.chunk_store import ChunkStore
+from app.services.embedding_service import EmbeddingService
+from app.services.search_index import BM25Index, bm25_idf, tokenize
+from app.services.vectorizer import HashingVectorizer, top_k
+from app.utils.cache import LRUCache
+
+CHUNKS = [
+    "Shipping takes five business days within the country.",
+    "Refunds are issued within 30 days. The refund policy covers unused items.",
+    "Our refund desk is open on weekdays.",
+    "Gift cards cannot be exchanged for cash.",
+]
+
+
+def test_tokenize_normalizes_case_and_punctuation():
+    """Test that tokens are lowercased word characters"""
+    assert tokenize("The Refund-Policy, v2!") == ["the", "refund", "policy", "v2"]
+
+
+def test_bm25_ranks_most_relevant_chunk_first():
+    """Test BM25 ranking over the inverted index"""
+    index = BM25Index.build(CHUNKS)
+    results = index.search("What is the refund policy?", 3)
+
+    assert [chunk_id for _, chunk_id in results] == [1, 2, 0]
+    assert results[0][0] > results[1][0]
+    assert index.search("nonexistent", 3) == []
+
+
+def test_bm25_scores_with_shared_idf():
+    """Test that corpus-level IDF weights replace the document's own"""
+    index = BM25Index.build(CHUNKS)
+    doc_freqs = index.doc_freqs("refund policy")
+    # As if a second document of ten chunks mentioned "refund" in all of them
+    idf = {
+        "refund": bm25_idf(len(CHUNKS) + 10, doc_freqs["refund"] + 10),
+        "policy": bm25_idf(len(CHUNKS) + 10, doc_freqs["policy"]),
+    }
+    own = dict((chunk_id, score) for score, chunk_id in index.search("refund", 3))
+    shared = dict(
+        (chunk_id, score) for score, chunk_id in index.search("refund", 3, idf)
+    )
+    assert own.keys() == shared.keys()
+    for chunk_id in own:
+        assert shared[chunk_id] == pytest.approx(
+            own[chunk_id] * idf["refund"] / index.term_idf("refund")
+        )
+
+
+def test_query_document_returns_top_chunks():
+    """Test query_document returns ranked chunk text"""
+    service = EmbeddingService()
+    service.process_document("doc-1", " ".join(CHUNKS), max_tokens=20)
+
+    chunks = service.query_document("doc-1", "refund policy", n_results=1)
+    assert len(chunks) == 1
+    assert "refund policy" in chunks[0]
+    assert service.query_document("missing", "refund") == []
+
+
+def test_dense_retrieval_ranks_by_cosine_similarity():
+    """Test the local hashed TF-IDF retrieval mode"""
+    vectorizer = HashingVectorizer(dim=256)
+    vectors, idf = vectorizer.fit_transform(CHUNKS)
+
+    assert vectors.dtype == np.float32
+    assert vectors.shape == (len(CHUNKS), 256)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+    scores = vectors @ vectorizer.transform_query("refund policy", idf)
+    assert top_k(scores, 1)[0][1] == 1
+
+
+def test_query_document_retrieval_method_is_selectable():
+    """Test choosing the retrieval method per call"""
+    service = EmbeddingService()
+    service.process_document("doc-1", " ".join(CHUNKS), max_tokens=20)
+
+    dense = service.query_document("doc-1", "gift cards cash", 1, method="dense")
+    bm25 = service.query_document("doc-1", "gift cards cash", 1, method="bm25")
+    assert dense == bm25
+    assert "Gift cards" in dense[0]
+    assert service.query_document("doc-1", "refund", method="unknown") == []
+
+
+def test_persisted_document_is_memory_mapped(tmp_path):
+    """Test that a fresh service instance maps a document processed elsewhere"""
+    writer = EmbeddingService(cache=LRUCache(1 << 20))
+    writer.chunk_store = ChunkStore(tmp_path)
+    writer.process_document("doc-1", " ".join(CHUNKS), max_tokens=20)
+
+    reader = EmbeddingService(cache=LRUCache(1 << 20))
+    reader.chunk_store = ChunkStore(tmp_path)
+    chunks = reader.query_document("doc-1", "refund policy", 1, method="dense")
+    assert "refund policy" in chunks[0]
+    assert reader.query_document("doc-1", "refund policy", 1, method="bm25") == chunks
+
+    mapped = reader.embeddings_cache["doc-1"]["chunks"]
+    assert isinstance(mapped.vectors, np.memmap)
+    assert list(mapped) == list(writer.embeddings_cache["doc-1"]["chunks"])
+
+    reader.remove_document("doc-1")
+    assert ChunkStore(tmp_path).open("doc-1") is None
+
+
+def test_bm25_index_is_persisted_and_mapped(tmp_path, monkeypatch):
+    """Test that workers map the saved BM25 index instead of rebuilding it"""
+    writer = EmbeddingService(cache=LRUCache(1 << 20))
+    writer.chunk_store = ChunkStore(tmp_path)
+    writer.process_document("doc-1", " ".join(CHUNKS), max_tokens=20)
+    expected = writer.search_document("doc-1", "refund policy", 3, method="bm25")
+
+    build = BM25Index.build
+    monkeypatch.setattr(BM25Index, "build", None)
+    reader = EmbeddingService(cache=LRUCache(1 << 20))
+    reader.chunk_store = ChunkStore(tmp_path)
+    assert reader.search_document("doc-1", "refund policy", 3, "bm25") == expected
+    index = reader.embeddings_cache["doc-1"]["index"]
+    assert index.mapped and index.nbytes == 0
+
+    # A document saved without an index gets one built and saved once
+    (tmp_path / "doc-1" / "bm25.bin").unlink()
+    monkeypatch.setattr(BM25Index, "build", build)
+    reader = EmbeddingService(cache=LRUCache(1 << 20))
+    reader.chunk_store = ChunkStore(tmp_path)
+    assert reader.search_document("doc-1", "refund policy", 3, "bm25") == expected
+    assert ChunkStore(tmp_path).open("doc-1").bm25 is not None
+
+
+def test_excerpts_of_mapped_chunks_merge_overlaps(tmp_path):
+    """Test that excerpts sliced by byte offsets merge overlapping chunks"""
+    text = "Café refunds: the refund policy covers unused items and crème brûlée."
+    writer = EmbeddingService(cache=LRUCache(1 << 20))
+    writer.chunk_store = ChunkStore(tmp_path)
+    writer.overlap_tokens = 3
+    writer.process_document("doc-1", text, max_tokens=6)
+
+    reader = EmbeddingService(cache=LRUCache(1 << 20))
+    reader.chunk_store = ChunkStore(tmp_path)
+    assert reader.get_cache_stats()["total_documents"] == 0
+    # The three chunks holding "refund" or "policy" overlap into one excerpt
+    excerpts = reader.query_excerpts("doc-1", "refund policy", 100, n_results=10)
+    assert excerpts == ["Café refunds: the refund policy covers unused"]
+
+
+def test_evicted_document_is_reloaded_from_store(tmp_path):
+    """Test that the byte budget evicts documents and misses reload them"""
+    service = EmbeddingService(cache=LRUCache(max_bytes=1))
+    service.chunk_store = ChunkStore(tmp_path)
+    service.process_document("doc-1", " ".join(CHUNKS), max_tokens=20)
+    service.process_document("doc-2", "Warranty claims need a receipt.")
+
+    stats = service.get_cache_stats()
+    assert list(stats["documents"]) == ["doc-2"]
+    assert stats["cache"]["evictions"] == 1
+
+    chunks = service.query_document("doc-1", "refund policy", 1)
+    assert "refund policy" in chunks[0]
+    stats = service.get_cache_stats()["cache"]
+    assert stats["misses"] >= 1 and stats["loads"] == 1
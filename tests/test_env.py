@@ -8,6 +8,11 @@ TEST_SETTINGS = {
     "DEBUG": "True",
     "UPLOAD_DIR": "test_uploads",
     "MAX_FILE_SIZE": "10485760",  # 10MB in bytes
+    # Answer with the local stand-in model instead of calling Gemini
+    "LLM_BACKEND": "fake",
+    "FAKE_LLM_LATENCY_MS": "0",
+    "FAKE_LLM_TOKENS_PER_SECOND": "0",
+    "LLM_RETRY_BACKOFF": "0",
 }
 
 # Set environment variables
@@ -1,4 +1,5 @@
 import pytest
+from pathlib import Path
 
 
 def test_file_too_large(client):
@@ -26,3 +27,48 @@ def test_missing_file(client):
     """Test upload endpoint without file"""
     response = client.post("/v1/pdf", headers={"X-API-Key": "my-secure-api-key"})
     assert response.status_code == 422
+
+
+def test_file_too_large_leaves_no_partial_upload(client, settings):
+    """Test that an aborted streaming upload does not leave temp files behind"""
+    large_content = b"0" * (settings.MAX_PDF_SIZE + 1)
+    response = client.post(
+        "/v1/pdf",
+        files={"file": ("large.pdf", large_content, "application/pdf")},
+        headers={"X-API-Key": "my-secure-api-key"},
+    )
+    assert response.status_code == 400
+    assert not list(Path(settings.UPLOAD_DIR).glob("*.part"))
+    assert not list(Path(settings.UPLOAD_DIR).glob("*.pdf"))
+
+
+def test_upload_without_content_length_is_cut_off_at_the_limit():
+    """Test that a streamed body is rejected as soon as it crosses the limit"""
+    import asyncio
+    import json
+    from app.middleware.upload_limit import UploadSizeLimitMiddleware
+
+    read = []
+
+    async def app(scope, receive, send):
+        while True:
+            message = await receive()
+            read.append(len(message["body"]))
+            if not message.get("more_body"):
+                break
+
+    async def receive():
+        return {"type": "http.request", "body": b"0" * 100, "more_body": True}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = UploadSizeLimitMiddleware(app, max_body_size=250, detail="too big")
+    scope = {"type": "http", "method": "POST", "path": "/v1/pdf", "headers": []}
+    asyncio.run(middleware(scope, receive, send))
+
+    assert read == [100, 100]
+    assert sent[0]["status"] == 400
+    assert json.loads(sent[1]["body"]) == {"detail": "too big"}
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import pytest
+from app.services.llm_backends import FakeBackend, LLMBackend, LLMBackendError
+
+
+def test_fake_answers_are_deterministic():
+    """Test that the same prompt always gets the same answer"""
+    backend = FakeBackend(latency_ms=0, tokens_per_second=0, response_tokens=8)
+    answer = backend.generate("What is the refund policy?")
+    assert answer == backend.generate("What is the refund policy?")
+    assert answer != backend.generate("What is the shipping policy?")
+    assert len(answer.split()) == 8
+
+
+def test_fake_stream_matches_generate_and_paces_tokens():
+    """Test streaming at the configured token rate"""
+    backend = FakeBackend(
+        latency_ms=20, distribution="fixed", tokens_per_second=200, response_tokens=5
+    )
+
+    async def collect():
+        return [piece async for piece in backend.stream("prompt text")]
+
+    started = time.perf_counter()
+    pieces = asyncio.run(collect())
+    elapsed = time.perf_counter() - started
+
+    assert len(pieces) == 5
+    assert "".join(pieces) == backend.generate("prompt text")
+    assert elapsed >= 0.02 + 4 / 200
+
+
+@pytest.mark.parametrize("distribution", ["fixed", "uniform", "lognormal"])
+def test_fake_latency_distributions(distribution):
+    """Test that sampled latencies follow the configured distribution"""
+    backend = FakeBackend(latency_ms=100, distribution=distribution, spread=0.5, seed=1)
+    samples = [backend.sample_latency() for _ in range(500)]
+    assert all(sample >= 0 for sample in samples)
+    if distribution == "fixed":
+        assert set(samples) == {0.1}
+    elif distribution == "uniform":
+        assert 0.05 <= min(samples) and max(samples) <= 0.15
+    else:
+        assert 0.08 < sorted(samples)[250] < 0.12
+
+
+def test_fake_error_injection():
+    """Test that the error rate makes calls fail with a retryable error"""
+    backend = FakeBackend(latency_ms=0, error_rate=0.5, seed=3)
+    failures = 0
+    for _ in range(200):
+        try:
+            backend.generate("prompt")
+        except LLMBackendError as e:
+            assert e.retryable
+            failures += 1
+    assert 60 < failures < 140
+    with pytest.raises(ValueError):
+        FakeBackend(distribution="pareto")
+
+
+def test_backend_without_streaming_cannot_be_created():
+    """Test that backends must implement both generate and stream"""
+
+    class BlockingOnlyBackend(LLMBackend):
+        def generate(self, prompt, cached_context=None):
+            return "answer"
+
+    with pytest.raises(TypeError):
+        BlockingOnlyBackend()
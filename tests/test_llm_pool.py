@@ -0,0 +1,98 @@
+import asyncio
+import gc
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from app.services.llm_pool import LLMCallPool
+
+
+def test_blocking_calls_do_not_block_the_event_loop():
+    """Test that blocking calls run on the pool's threads"""
+    pool = LLMCallPool(max_concurrent=2, max_waiting=0)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await pool.run(lambda: time.sleep(0.2) or threading.current_thread())
+        task.cancel()
+        return ticks, result
+
+    ticks, thread = asyncio.run(main())
+    assert ticks >= 5
+    assert thread.name.startswith("llm")
+    pool.shutdown()
+
+
+def test_calls_beyond_the_wait_queue_get_503():
+    """Test the concurrency cap and bounded wait queue"""
+    pool = LLMCallPool(max_concurrent=1, max_waiting=1, queue_timeout=5)
+    gate = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(pool.run(gate.wait))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(pool.run(lambda: "second"))
+        await asyncio.sleep(0.05)
+        assert pool.get_stats()["in_flight"] == 1
+        assert pool.get_stats()["waiting"] == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            await pool.run(lambda: "third")
+        gate.set()
+        return exc_info.value, await running, await waiting
+
+    error, first, second = asyncio.run(main())
+    assert error.status_code == 503
+    assert "Retry-After" in error.headers
+    assert (first, second) == (True, "second")
+    assert pool.get_stats()["rejected"] == 1
+    pool.shutdown()
+
+
+def test_waiting_too_long_gets_503():
+    """Test that a call waiting past the queue timeout is rejected"""
+    pool = LLMCallPool(max_concurrent=1, max_waiting=5, queue_timeout=0.05)
+    gate = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(pool.run(gate.wait))
+        await asyncio.sleep(0.02)
+        with pytest.raises(HTTPException) as exc_info:
+            await pool.run(lambda: None)
+        gate.set()
+        await running
+        return exc_info.value
+
+    assert asyncio.run(main()).status_code == 503
+    pool.shutdown()
+
+
+def test_stream_holds_a_slot_until_closed_or_dropped():
+    """Test that streams count against the cap and release their slot"""
+    pool = LLMCallPool(max_concurrent=1, max_waiting=0)
+
+    async def pieces():
+        yield "a"
+        yield "b"
+
+    async def main():
+        stream = await pool.open_stream(pieces())
+        assert pool.in_flight == 1
+        assert [piece async for piece in stream] == ["a", "b"]
+        assert pool.in_flight == 0
+
+        # Never iterated, e.g. the client went away before the response
+        stream = await pool.open_stream(pieces())
+        del stream
+        gc.collect()
+        assert pool.in_flight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,180 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+from app.services.llm_backends import LLMBackendError
+from app.services.llm_pool import LLMCallPool
+from app.services.llm_resilience import (
+    CircuitBreaker,
+    ResilientLLMCaller,
+    is_retryable,
+)
+
+
+def make_caller(**kwargs):
+    options = {
+        "pool": LLMCallPool(max_concurrent=4, max_waiting=4),
+        "breaker": CircuitBreaker(failure_threshold=3, reset_timeout=60),
+        "attempt_timeout": 1,
+        "max_retries": 2,
+        "backoff": 0,
+        "hedge": False,
+    }
+    options.update(kwargs)
+    return ResilientLLMCaller(**options)
+
+
+def flaky(failures, error):
+    """A call failing ``failures`` times before it succeeds"""
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return call, calls
+
+
+def test_retryable_errors():
+    """Test which failures are worth another attempt"""
+    assert is_retryable(LLMBackendError("busy"))
+    assert not is_retryable(LLMBackendError("bad request", retryable=False))
+    assert is_retryable(google_exceptions.TooManyRequests("slow down"))
+    assert is_retryable(google_exceptions.ServiceUnavailable("down"))
+    assert not is_retryable(google_exceptions.InvalidArgument("bad"))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(HTTPException(status_code=503))
+    assert not is_retryable(ValueError())
+
+
+def test_transient_failures_are_retried():
+    """Test that retryable failures are retried and then succeed"""
+    caller = make_caller()
+    call, calls = flaky(2, google_exceptions.ServiceUnavailable("down"))
+    assert asyncio.run(caller.run(call)) == "ok"
+    assert len(calls) == 3
+    stats = caller.get_stats()
+    assert (stats["retries"], stats["failures"]) == (2, 0)
+    assert stats["breaker"]["state"] == "closed"
+
+    call, calls = flaky(1, LLMBackendError("bad prompt", retryable=False))
+    with pytest.raises(LLMBackendError):
+        asyncio.run(caller.run(call))
+    assert len(calls) == 1
+
+
+def test_slow_attempts_hit_their_deadline():
+    """Test the per-attempt deadline and the 504 once retries run out"""
+    caller = make_caller(attempt_timeout=0.05, max_retries=1)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(caller.run(time.sleep, 0.3))
+    assert exc_info.value.status_code == 504
+    assert caller.get_stats()["timeouts"] == 2
+
+
+def test_breaker_opens_and_recovers():
+    """Test failing fast while open and closing after a good trial call"""
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    caller = make_caller(breaker=breaker, max_retries=0)
+    call, calls = flaky(3, LLMBackendError("upstream error"))
+
+    for _ in range(3):
+        with pytest.raises(LLMBackendError):
+            asyncio.run(caller.run(call))
+    assert breaker.state == "open"
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(caller.run(call))
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+    assert len(calls) == 3  # Rejected without reaching the upstream
+
+    time.sleep(0.15)
+    assert asyncio.run(caller.run(call)) == "ok"
+    assert breaker.get_stats() == {
+        "state": "closed",
+        "consecutive_failures": 0,
+        "opened": 1,
+        "rejected": 1,
+    }
+
+
+def test_slow_calls_are_hedged():
+    """Test that a call past the latency percentile gets a second request"""
+    caller = make_caller(hedge=True, hedge_percentile=95, hedge_min_samples=5)
+    for _ in range(5):
+        caller.latencies.record(0.01)
+    delays = iter([1.0, 0.0])
+
+    def call():
+        time.sleep(next(delays))
+        return "ok"
+
+    started = time.perf_counter()
+    assert asyncio.run(caller.run(call)) == "ok"
+    assert time.perf_counter() - started < 0.5
+    stats = caller.get_stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_streams_retry_until_the_first_token():
+    """Test that a stream failing before any token is opened again"""
+    caller = make_caller()
+    attempts = []
+
+    async def stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise LLMBackendError("upstream error")
+        yield "a"
+        yield "b"
+
+    async def main():
+        tokens = await caller.open_stream(stream)
+        return [text async for text in tokens]
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert len(attempts) == 2
+    assert caller.get_stats()["retries"] == 1
+
+
+def test_timed_out_calls_free_their_slots():
+    """Test that a backend given the deadline returns and frees its slot"""
+    from app.services.llm_backends import FakeBackend
+
+    pool = LLMCallPool(max_concurrent=3, max_waiting=0)
+    caller = make_caller(pool=pool, attempt_timeout=1)
+    backend = FakeBackend(
+        latency_ms=5000, distribution="fixed", tokens_per_second=0, request_timeout=0.05
+    )
+
+    async def main():
+        with pytest.raises(LLMBackendError):
+            await caller.run(backend.generate, "prompt")
+        return pool.get_stats()
+
+    stats = asyncio.run(main())
+    assert (stats["in_flight"], stats["abandoned"]) == (0, 0)
+    assert caller.get_stats()["attempts"] == 3
+
+
+def test_no_retries_while_abandoned_calls_hold_slots():
+    """Test that a hung call is not retried into a full pool"""
+    pool = LLMCallPool(max_concurrent=3, max_waiting=0)
+    caller = make_caller(pool=pool, attempt_timeout=0.05, abandoned_wait=0.01)
+
+    async def main():
+        with pytest.raises(HTTPException) as exc_info:
+            await caller.run(time.sleep, 0.3)
+        assert exc_info.value.status_code == 504
+        during = pool.get_stats()
+        await asyncio.sleep(0.4)
+        return during, pool.get_stats()
+
+    during, after = asyncio.run(main())
+    assert (during["in_flight"], during["abandoned"]) == (1, 1)
+    assert (after["in_flight"], after["abandoned"]) == (0, 0)
+    assert caller.get_stats()["retries"] == 0
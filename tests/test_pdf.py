@@ -1,4 +1,8 @@
+import asyncio
 import pytest
+import time
+from fastapi.testclient import TestClient
+from app.main import app
 
 
 def test_pdf_upload_success(client, test_pdf_content):
@@ -23,3 +27,108 @@ def test_pdf_content_extraction(client, test_pdf_content):
     )
     assert "text_content" in response.json()
     assert len(response.json()["text_content"]) > 0
+
+
+def test_duplicate_upload_is_deduplicated(client, test_pdf_content):
+    """Test that re-uploading identical bytes reuses the extracted document"""
+    headers = {"X-API-Key": "my-secure-api-key"}
+    files = {"file": ("test.pdf", test_pdf_content, "application/pdf")}
+
+    first = client.post("/v1/pdf", files=files, headers=headers)
+    second = client.post("/v1/pdf", files=files, headers=headers)
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert first.json()["pdf_id"] != second.json()["pdf_id"]
+    assert second.json()["pages"] == first.json()["pages"]
+    assert "reusing" in second.json()["message"]
+
+    # Deleting one alias keeps the shared document for the other
+    delete_response = client.delete(
+        f"/v1/pdf/{first.json()['pdf_id']}", headers=headers
+    )
+    assert delete_response.status_code == 200
+    assert delete_response.json()["references_remaining"] == 1
+
+    delete_response = client.delete(
+        f"/v1/pdf/{second.json()['pdf_id']}", headers=headers
+    )
+    assert delete_response.json()["references_remaining"] == 0
+
+    missing = client.delete(f"/v1/pdf/{second.json()['pdf_id']}", headers=headers)
+    assert missing.status_code == 404
+
+
+def test_indexing_runs_off_the_event_loop(client, test_pdf_content, monkeypatch):
+    """Test that chunking and indexing an upload do not block the event loop"""
+    from app.services.embedding_service import EmbeddingService
+
+    on_loop = []
+    process_document = EmbeddingService.process_document
+
+    def recording_process_document(self, *args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return process_document(self, *args, **kwargs)
+
+    monkeypatch.setattr(
+        EmbeddingService, "process_document", recording_process_document
+    )
+    response = client.post(
+        "/v1/pdf",
+        files={"file": ("indexed.pdf", test_pdf_content + b"\n", "application/pdf")},
+        headers={"X-API-Key": "my-secure-api-key"},
+    )
+    assert response.status_code == 200
+    assert on_loop == [False]
+
+
+def test_deleting_the_owner_twice_keeps_the_alias(client, test_pdf_content):
+    """Test that a deleted owner can neither be used nor purge shared content"""
+    headers = {"X-API-Key": "my-secure-api-key"}
+    files = {"file": ("test.pdf", test_pdf_content, "application/pdf")}
+    owner = client.post("/v1/pdf", files=files, headers=headers).json()["pdf_id"]
+    alias = client.post("/v1/pdf", files=files, headers=headers).json()["pdf_id"]
+
+    response = client.delete(f"/v1/pdf/{owner}", headers=headers)
+    assert response.json()["references_remaining"] == 1
+    assert client.post(f"/v1/chat/{owner}", json={"message": "hi"}).status_code == 404
+    assert client.delete(f"/v1/pdf/{owner}", headers=headers).status_code == 404
+
+    assert client.post(f"/v1/chat/{alias}", json={"message": "hi"}).status_code == 200
+    response = client.delete(f"/v1/pdf/{alias}", headers=headers)
+    assert response.json()["references_remaining"] == 0
+    assert client.post(f"/v1/chat/{alias}", json={"message": "hi"}).status_code == 404
+
+
+def test_async_upload_reports_status(test_pdf_content):
+    """Test background ingestion returns 202 and finishes as ready"""
+    headers = {"X-API-Key": "my-secure-api-key"}
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/pdf?async_mode=true",
+            files={"file": ("async.pdf", test_pdf_content, "application/pdf")},
+            headers=headers,
+        )
+        assert response.status_code == 202
+        assert response.json()["status"] == "queued"
+        pdf_id = response.json()["job_id"]
+
+        for _ in range(100):
+            status = client.get(f"/v1/pdf/{pdf_id}/status", headers=headers).json()
+            if status["status"] in ("ready", "failed"):
+                break
+            time.sleep(0.05)
+
+        assert status["status"] == "ready"
+        assert {"queued", "extracting", "indexing", "total"} <= set(status["timings"])
+
+
+def test_status_of_unknown_pdf(client):
+    """Test status endpoint for a PDF that was never uploaded"""
+    response = client.get(
+        "/v1/pdf/unknown-id/status", headers={"X-API-Key": "my-secure-api-key"}
+    )
+    assert response.status_code == 404
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+import pytest
+from fpdf import FPDF
+from fastapi import HTTPException
+from app.services.pdf_extraction import ExtractionPool, extract_pdf_pages
+
+
+@pytest.fixture
+def pdf_path(tmp_path, test_pdf_content):
+    path = tmp_path / "test.pdf"
+    path.write_bytes(test_pdf_content)
+    return path
+
+
+def test_extraction_runs_in_pool(pdf_path):
+    """Test text extraction through the process pool"""
+    pool = ExtractionPool(max_workers=1)
+    try:
+        pages = asyncio.run(pool.run(extract_pdf_pages, str(pdf_path)))
+    finally:
+        pool.shutdown()
+
+    assert len(pages) == 1
+    assert "Test PDF Content" in pages[0]
+    assert pool.pending == 0
+
+
+def test_extraction_queue_full(pdf_path):
+    """Test that a full extraction queue is rejected with 503"""
+    pool = ExtractionPool(max_workers=1, max_queued=1)
+    pool._pending = 1
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(pool.run(extract_pdf_pages, str(pdf_path)))
+
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+
+def test_timed_out_job_keeps_its_slot_until_the_worker_returns(pdf_path):
+    """Test that an abandoned job still counts against the queue"""
+    pool = ExtractionPool(max_workers=1, timeout=0.2, max_queued=1)
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(pool.run(time.sleep, 1))
+        assert exc_info.value.status_code == 504
+        assert pool.pending == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(pool.run(extract_pdf_pages, str(pdf_path)))
+        assert exc_info.value.status_code == 503
+
+        deadline = time.monotonic() + 5
+        while pool.pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+
+def test_crashed_worker_is_busy_and_the_pool_restarts(pdf_path):
+    """Test that a dead worker process is a 503, not an invalid PDF"""
+    pool = ExtractionPool(max_workers=1)
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(pool.run(os._exit, 1))
+        assert exc_info.value.status_code == 503
+        assert pool._executor is None
+
+        pages = asyncio.run(pool.run(extract_pdf_pages, str(pdf_path)))
+        assert "Test PDF Content" in pages[0]
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+
+def test_page_ranges_merged_in_order(tmp_path):
+    """Test parallel page-range extraction keeps page order and reports progress"""
+    pdf = FPDF()
+    pdf.set_font("Arial", size=12)
+    for page_num in range(7):
+        pdf.add_page()
+        pdf.cell(200, 10, txt=f"Page number {page_num}", ln=1)
+    path = tmp_path / "multi.pdf"
+    path.write_bytes(pdf.output(dest="S").encode("latin-1"))
+
+    progress = []
+    pool = ExtractionPool(max_workers=2)
+    try:
+        total_pages, range_texts = asyncio.run(
+            pool.extract_page_ranges(
+                str(path), 3, lambda done, total: progress.append((done, total))
+            )
+        )
+    finally:
+        pool.shutdown()
+
+    assert total_pages == 7
+    assert [len(texts) for texts in range_texts] == [3, 3, 1]
+    page_texts = [text for texts in range_texts for text in texts]
+    assert page_texts == [f"Page number {i}" for i in range(7)]
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_page_ranges_of_one_document_take_one_queue_slot(tmp_path):
+    """Test that a document with more ranges than queue slots is not rejected"""
+    pdf = FPDF()
+    pdf.set_font("Arial", size=12)
+    for page_num in range(12):
+        pdf.add_page()
+        pdf.cell(200, 10, txt=f"Page number {page_num}", ln=1)
+    path = tmp_path / "multi.pdf"
+    path.write_bytes(pdf.output(dest="S").encode("latin-1"))
+
+    pool = ExtractionPool(max_workers=4, max_queued=1)
+    try:
+        total_pages, range_texts = asyncio.run(pool.extract_page_ranges(str(path), 1))
+    finally:
+        pool.shutdown()
+
+    assert total_pages == 12 and len(range_texts) == 12
+    assert pool.pending == 0
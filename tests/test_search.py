@@ -0,0 +1,134 @@
+import pytest
+from fpdf import FPDF
+
+
+def make_pdf(text):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.multi_cell(0, 10, txt=text)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+@pytest.fixture
+def uploaded_pdfs(client, api_key_headers):
+    texts = {
+        "refunds": "Refunds are issued within 30 days under the refund policy.",
+        "shipping": "Shipping takes five business days for all orders.",
+    }
+    pdf_ids = {}
+    for name, text in texts.items():
+        response = client.post(
+            "/v1/pdf",
+            files={"file": (f"{name}.pdf", make_pdf(text), "application/pdf")},
+            headers=api_key_headers,
+        )
+        pdf_ids[name] = response.json()["pdf_id"]
+    return pdf_ids
+
+
+@pytest.mark.parametrize("method", ["bm25", "dense"])
+def test_search_across_documents(client, api_key_headers, uploaded_pdfs, method):
+    """Test that cross-document search ranks the matching PDF first"""
+    response = client.post(
+        "/v1/search",
+        json={"query": "refund policy", "top_k": 2, "method": method},
+        headers=api_key_headers,
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["pdf_id"] == uploaded_pdfs["refunds"]
+    assert "refund policy" in results[0]["text"]
+    assert results == sorted(results, key=lambda r: r["score"], reverse=True)
+
+
+def test_search_selected_documents(client, api_key_headers, uploaded_pdfs):
+    """Test restricting search to a list of PDFs"""
+    response = client.post(
+        "/v1/search",
+        json={"query": "refund policy", "pdf_ids": [uploaded_pdfs["shipping"]]},
+        headers=api_key_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["documents_searched"] == 1
+    assert response.json()["results"] == []
+
+
+def test_search_unknown_documents(client, api_key_headers, uploaded_pdfs):
+    """Test that unknown pdf_ids are reported instead of silently skipped"""
+    response = client.post(
+        "/v1/search",
+        json={"query": "refund", "pdf_ids": [uploaded_pdfs["refunds"], "missing"]},
+        headers=api_key_headers,
+    )
+    assert response.status_code == 404
+    assert "missing" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("method", ["bm25", "dense"])
+def test_search_all_reports_live_pdf_ids(client, api_key_headers, method):
+    """Test that results of a shared document name an upload that still exists"""
+    content = make_pdf("Refunds are issued within 30 days under the refund policy.")
+    owner, copy = (
+        client.post(
+            "/v1/pdf",
+            files={"file": ("refunds.pdf", content, "application/pdf")},
+            headers=api_key_headers,
+        ).json()["pdf_id"]
+        for _ in range(2)
+    )
+    client.delete(f"/v1/pdf/{owner}", headers=api_key_headers)
+
+    response = client.post(
+        "/v1/search",
+        json={"query": "refund policy", "method": method},
+        headers=api_key_headers,
+    )
+    assert response.status_code == 200
+    assert {result["pdf_id"] for result in response.json()["results"]} == {copy}
+
+
+def test_search_skips_documents_deleted_mid_search(
+    client, api_key_headers, uploaded_pdfs, monkeypatch
+):
+    """Test that a chunk vanishing before it is read does not fail the search"""
+    from app.main import app
+
+    client.get("/v1/metrics", headers=api_key_headers)
+    embedding_service = app.state.services.search_service.embedding_service
+
+    def get_chunk(pdf_id, chunk_id):
+        raise KeyError(pdf_id)
+
+    monkeypatch.setattr(embedding_service, "get_chunk", get_chunk)
+    response = client.post(
+        "/v1/search",
+        json={"query": "refund policy", "method": "bm25"},
+        headers=api_key_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["results"] == []
+
+
+def test_search_past_the_document_limit_is_refused(
+    client, api_key_headers, uploaded_pdfs, monkeypatch
+):
+    """Test that a fan-out over too many documents is a 400, not a slow scan"""
+    from app.services import search_service
+
+    monkeypatch.setattr(search_service.settings, "SEARCH_MAX_DOCUMENTS", 1)
+    response = client.post(
+        "/v1/search",
+        json={"query": "refund policy", "method": "bm25"},
+        headers=api_key_headers,
+    )
+    assert response.status_code == 400
+    assert "limit of 1" in response.json()["detail"]
+
+    response = client.post(
+        "/v1/search",
+        json={"query": "refund", "pdf_ids": [uploaded_pdfs["refunds"]]},
+        headers=api_key_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["results"][0]["pdf_id"] == uploaded_pdfs["refunds"]
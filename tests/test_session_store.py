@@ -0,0 +1,152 @@
+import asyncio
+import re
+import time
+import pytest
+from fastapi import HTTPException
+from app.services.llm_backends import LLMBackend
+from app.services.llm_service import LLMService
+from app.services.session_store import ChatSession, SessionStore
+
+
+def test_turns_over_budget_are_handed_back_oldest_first():
+    """Test that recent turns stay verbatim within the token budget"""
+    session = ChatSession("pdf-1", history_max_tokens=30)
+    assert session.is_empty
+    assert session.add_turn("first question", "a" * 40) == []
+    overflow = session.add_turn("second question", "b" * 40)
+    assert overflow == [("first question", "a" * 40)]
+    assert session.turns == [("second question", "b" * 40)]
+    assert session.last_question == "second question"
+
+    # A single huge answer is truncated rather than kept whole
+    session.add_turn("third", "c" * 10_000)
+    assert session.history_tokens() <= 30 + 10
+
+
+def test_store_lookup_and_delete():
+    """Test that sessions are found only for their own PDF"""
+    store = SessionStore(max_bytes=1024 * 1024, ttl=60, history_max_tokens=100)
+    session = store.create("pdf-1")
+    assert store.get(session.session_id) is session
+    assert store.get(session.session_id, "pdf-1") is session
+    with pytest.raises(HTTPException) as exc_info:
+        store.get(session.session_id, "pdf-2")
+    assert exc_info.value.status_code == 404
+
+    assert store.delete(session.session_id)
+    assert not store.delete(session.session_id)
+    assert store.stats()["sessions"] == 0
+
+
+class SummarizingBackend(LLMBackend):
+    """Answers questions at length and summarizes conversations briefly"""
+
+    name = model_name = "summarizing"
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        if "Summarize the conversation" in prompt:
+            return "The user asked several questions."
+        return "A long answer. " * 20
+
+    async def stream(self, prompt):
+        yield self.generate(prompt)
+
+
+def test_long_conversation_keeps_prompt_size_flat(
+    client, api_key_headers, test_pdf_content, monkeypatch
+):
+    """Test that older turns are compacted so prompts stop growing"""
+    from app.main import app
+
+    upload = client.post(
+        "/v1/pdf",
+        files={"file": ("test.pdf", test_pdf_content, "application/pdf")},
+        headers=api_key_headers,
+    )
+    pdf_id = upload.json()["pdf_id"]
+    model = SummarizingBackend()
+    app.state.services.llm_service.backend = model
+    # About three turns of this backend's answers stay verbatim
+    monkeypatch.setattr(app.state.services.session_store, "history_max_tokens", 300)
+
+    session = client.post(f"/v1/chat/{pdf_id}/sessions").json()
+    session_id = session["session_id"]
+    assert session["turns"] == 0
+
+    for i in range(12):
+        response = client.post(
+            f"/v1/chat/{pdf_id}",
+            json={"message": f"question {i}", "session_id": session_id},
+        )
+        assert response.status_code == 200
+        assert response.json()["session_id"] == session_id
+
+    answer_prompts = [p for p in model.prompts if "User Question:" in p]
+    assert "question 10" in answer_prompts[-1]
+    assert "The user asked several questions." in answer_prompts[-1]
+    # Once compaction kicks in the prompt stops growing
+    assert len(answer_prompts[-1]) <= len(answer_prompts[6]) + 100
+
+    details = client.get(f"/v1/chat/sessions/{session_id}").json()
+    assert details["compactions"] > 0
+    metrics = client.get("/v1/metrics", headers=api_key_headers).json()
+    assert metrics["sessions"]["compactions"] == details["compactions"]
+
+    # Streamed answers are recorded in the session too
+    client.post(
+        f"/v1/chat/{pdf_id}/stream",
+        json={"message": "streamed question", "session_id": session_id},
+    )
+    client.post(
+        f"/v1/chat/{pdf_id}",
+        json={"message": "last question", "session_id": session_id},
+    )
+    answer_prompts = [p for p in model.prompts if "User Question:" in p]
+    assert "User: streamed question" in answer_prompts[-1]
+
+    assert client.delete(f"/v1/chat/sessions/{session_id}").status_code == 200
+    response = client.post(
+        f"/v1/chat/{pdf_id}", json={"message": "hi", "session_id": session_id}
+    )
+    assert response.status_code == 404
+
+
+class ListingBackend(LLMBackend):
+    """Summarizes slowly by listing every question it has been shown"""
+
+    name = model_name = "listing"
+
+    def generate(self, prompt):
+        time.sleep(0.05)
+        return " ".join(re.findall(r"question \d+", prompt))
+
+    async def stream(self, prompt):
+        yield self.generate(prompt)
+
+
+def test_concurrent_turns_do_not_lose_summaries():
+    """Test that overlapping compactions of one session both reach the summary"""
+    store = SessionStore(max_bytes=1024 * 1024, ttl=60, history_max_tokens=10)
+    service = LLMService(backend=ListingBackend(), session_store=store)
+    session = store.create("pdf-1")
+
+    async def main():
+        await service.record_turn(session, "question 0", "answer")
+        await asyncio.gather(
+            service.record_turn(session, "question 1", "answer"),
+            service.record_turn(session, "question 2", "answer"),
+        )
+
+    asyncio.run(main())
+    assert session.summary.split() == ["question", "0", "question", "1"]
+    assert session.compactions == 2
+
+
+def test_session_for_unknown_pdf(client):
+    """Test that sessions can only be started for existing PDFs"""
+    assert client.post("/v1/chat/missing/sessions").status_code == 404
+    assert client.get("/v1/chat/sessions/missing").status_code == 404
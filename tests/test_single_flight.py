@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from app.services.single_flight import SingleFlight, StreamCancelled
+
+
+def test_identical_calls_share_one_result():
+    """Test that concurrent calls with one key run the function once"""
+    flight = SingleFlight()
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do("q", answer) for _ in range(5)), flight.do("other", answer)
+        )
+
+    assert asyncio.run(main()) == ["answer"] * 6
+    assert len(calls) == 2
+    stats = flight.get_stats()
+    assert (stats["calls"], stats["coalesced"], stats["in_flight"]) == (2, 4, 0)
+
+
+def test_errors_reach_every_caller_and_are_not_remembered():
+    """Test that a failed call fails its followers but not later callers"""
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        results = await asyncio.gather(
+            flight.do("q", fail), flight.do("q", fail), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+        with pytest.raises(ValueError):
+            await flight.do("q", fail)
+
+    asyncio.run(main())
+    assert flight.get_stats()["calls"] == 2
+
+
+def test_streams_are_shared_and_replayed():
+    """Test that joined streams see every piece from one upstream"""
+    flight = SingleFlight()
+    opened = []
+
+    async def upstream():
+        for piece in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield piece
+
+    async def open_stream():
+        opened.append(1)
+        return upstream(), {"prompt_tokens": 3}
+
+    async def consume():
+        stream, info, coalesced = await flight.stream("q", open_stream)
+        return [piece async for piece in stream], info, coalesced
+
+    async def main():
+        first = asyncio.create_task(consume())
+        await asyncio.sleep(0.015)
+        return await asyncio.gather(first, consume())
+
+    (first, info, led), (second, _, joined) = asyncio.run(main())
+    assert first == second == ["a", "b", "c"]
+    assert info == {"prompt_tokens": 3}
+    assert (led, joined) == (False, True)
+    assert len(opened) == 1
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_stream_upstream_is_cancelled_when_everyone_leaves():
+    """Test that the shared upstream stops once no subscriber is left"""
+    flight = SingleFlight()
+
+    async def main():
+        finished = asyncio.Event()
+
+        async def upstream():
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield "x"
+            finally:
+                finished.set()
+
+        async def open_stream():
+            return upstream(), {}
+
+        stream, _, _ = await flight.stream("q", open_stream)
+        assert await stream.__anext__() == "x"
+        await stream.aclose()
+        await asyncio.wait_for(finished.wait(), 1)
+
+    asyncio.run(main())
+
+
+def test_stream_follower_is_counted_before_it_iterates():
+    """Test that a leader leaving before the follower iterates keeps the upstream"""
+    flight = SingleFlight()
+
+    async def upstream():
+        for piece in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield piece
+
+    async def open_stream():
+        return upstream(), {}
+
+    async def main():
+        leader, _, _ = await flight.stream("q", open_stream)
+        follower, _, coalesced = await flight.stream("q", open_stream)
+        assert coalesced
+        assert await leader.__anext__() == "a"
+        await leader.aclose()
+        await asyncio.sleep(0.05)
+        return [piece async for piece in follower]
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
+
+
+def test_cancelled_upstream_is_an_error_for_subscribers():
+    """Test that subscribers of a cancelled stream do not see a clean end"""
+    flight = SingleFlight()
+
+    async def upstream():
+        yield "a"
+        await asyncio.sleep(10)
+        yield "b"
+
+    async def open_stream():
+        return upstream(), {}
+
+    async def main():
+        stream, _, _ = await flight.stream("q", open_stream)
+        assert await stream.__anext__() == "a"
+        stream._broadcast.task.cancel()
+        with pytest.raises(StreamCancelled):
+            await stream.__anext__()
+
+    asyncio.run(main())